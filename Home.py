@@ -1,4 +1,5 @@
 import streamlit as st
+from core.resources import warm_up
 
 # 페이지 설정 - 아이콘과 제목 설정
 st.set_page_config(
@@ -6,6 +7,9 @@ st.set_page_config(
     page_icon="🤖",  # 브라우저 탭에 표시될 아이콘 (이모지 또는 이미지 파일 경로)
 )
 
+# 서버가 뜬 뒤 첫 접속에서 secrets, AI 클라이언트, Notion 색인, 메일 작업자를 미리 준비
+warm_up()
+
 # Streamlit의 기본 메뉴와 푸터 숨기기
 hide_menu_style = """
     <style>
@@ -0,0 +1,262 @@
+# 한 반의 학생 N명이 동시에 페이지를 사용하는 상황을 흉내 내는 부하 테스트
+#
+# Notion, OpenAI, Gemini, SMTP를 모두 로컬 대역 서버(benchmarks/fakes.py)로 바꾸고,
+# 학생마다 streamlit.testing.v1.AppTest 세션을 하나씩 만들어 실제 페이지 스크립트를 실행합니다.
+# 단계별(page_load, notion_lookup, model, email_delivery) p50/p95/p99, 처리량, 오류율을 출력합니다.
+#
+# 사용법:
+#   python benchmarks/classroom_loadtest.py --students 30 --page text
+#   python benchmarks/classroom_loadtest.py --students 30 --page all --openai-latency 1.5 --error-rate 0.05
+import argparse
+import concurrent.futures
+import io
+import os
+import pathlib
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from PIL import Image
+from streamlit.runtime.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+from fakes import FakeGemini, FakeNotion, FakeOpenAI, FakeRedis, FakeSMTP, Injector
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+PAGES = {
+    "vision": "pages/1 vision(new).py",
+    "text": "pages/2 text gen(new).py",
+    "image": "pages/3 image gen(new).py",
+}
+ACTIVITY_CODE = "LOADTEST"
+STAGES = ["page_load", "notion_lookup", "model", "email_delivery"]
+
+# Python 3.11의 ast.parse는 여러 스레드에서 동시에 호출되면 실패할 수 있어(SystemError),
+# AppTest 세션들이 스크립트를 컴파일하는 부분만 한 번에 하나씩 실행합니다.
+_compile_lock = threading.Lock()
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def _locked_get_bytecode(self, script_path):
+    with _compile_lock:
+        return _get_bytecode(self, script_path)
+
+
+ScriptCache.get_bytecode = _locked_get_bytecode
+
+# AppTest는 실행할 때마다 전역 Runtime._instance를 가짜 런타임으로 바꾸고, 끝나면 None으로 되돌립니다.
+# 여러 학생 세션을 동시에 실행하면 다른 세션이 실행 중인데 런타임이 사라지므로, 마지막 가짜 런타임을 계속 쓰게 합니다.
+_last_runtime = []
+
+
+def _shared_instance(cls):
+    if cls._instance is not None:
+        _last_runtime[:] = [cls._instance]
+    if not _last_runtime:
+        raise RuntimeError("Runtime hasn't been created!")
+    return _last_runtime[0]
+
+
+Runtime.instance = classmethod(_shared_instance)
+Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(_last_runtime))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, ok=True):
+        with self._lock:
+            self.timings[stage].append(seconds)
+            if not ok:
+                self.errors[stage] += 1
+
+
+def _failed(at):
+    return bool(at.exception) or any("⚠️" in e.value or "❌" in e.value for e in at.error)
+
+
+def _timed_run(at, recorder, stage):
+    started = time.perf_counter()
+    at.run()
+    ok = not _failed(at)
+    recorder.record(stage, time.perf_counter() - started, ok)
+    return ok
+
+
+def _photo(student):
+    buffer = io.BytesIO()
+    random.seed(student)
+    Image.new("RGB", (2400, 1800), tuple(random.randrange(256) for _ in range(3))).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+# 학생 한 명의 흐름: 페이지 열기 → 이름/코드 입력 후 프롬프트 가져오기 → AI 실행(+ 이메일 대기열)
+def run_student(student, page, recorder, same_input):
+    at = AppTest.from_file(str(ROOT / PAGES[page]), default_timeout=300)
+    if not _timed_run(at, recorder, "page_load"):
+        return False
+
+    at.text_input[0].input(f"학생{student}")
+    at.text_input[1].input(ACTIVITY_CODE)
+    at.button(key="get_prompt").click()
+    if not _timed_run(at, recorder, "notion_lookup"):
+        return False
+
+    if page == "text":
+        at.text_area[0].input("바다" if same_input else f"바다에서 놀았던 이야기 {student}")
+        at.button(key="generate_answer").click()
+    elif page == "image":
+        adjectives = at.multiselect[0].options
+        at.multiselect[0].select(adjectives[0] if same_input else adjectives[student % len(adjectives)])
+        at.multiselect[1].select(at.multiselect[1].options[student % len(at.multiselect[1].options)])
+        at.button(key="generate_image").click()
+    else:
+        at.file_uploader[0].set_value(("photo.jpg", _photo(0 if same_input else student), "image/jpeg"))
+    return _timed_run(at, recorder, "model")
+
+
+def build_secrets(args, notion, openai, gemini, smtp, data_dir, redis=None):
+    return {
+        "api": {"keys": [f"sk-fake-{i}" for i in range(args.keys)], "base_url": f"{openai.url}/v1"},
+        "google": {**{f"gemini_api_key{i + 1}": f"gemini-fake-{i}" for i in range(args.keys)}, "api_endpoint": gemini.url},
+        "notion": {"api_key": "secret_fake", "database_id": "fake", "api_url": f"{notion.url}/v1"},
+        "email": {
+            "address": "tools@example.com",
+            "password": "",
+            "smtp_host": "127.0.0.1",
+            "smtp_port": smtp.port,
+            "use_ssl": False,
+            "outbox_path": str(data_dir / "outbox.sqlite3"),
+        },
+        "cache": {
+            "response_cache_path": str(data_dir / "responses.sqlite3"),
+            "backend": getattr(args, "cache_backend", "memory"),
+            "shared_cache_path": str(data_dir / "shared_cache.sqlite3"),
+            **({"redis_url": redis.url} if redis is not None else {}),
+        },
+        "images": {"path": str(data_dir / "images")},
+        "metrics": {"log_path": str(data_dir / "metrics.jsonl"), "prometheus_path": str(data_dir / "metrics.prom")},
+        "submissions": {"enabled": True, "database_id": "submissions", "path": str(data_dir / "submissions.sqlite3"),
+                        "max_wait_seconds": 1},
+        "limits": {} if args.limit is None else {
+            "openai": {"gpt-4o-mini": args.limit, "dall-e-3": args.limit},
+            "gemini": {"gemini-1.5-flash": args.limit},
+        },
+    }
+
+
+def delivery_latencies(outbox_path, timeout):
+    deadline = time.time() + timeout
+    with sqlite3.connect(outbox_path) as db:
+        while time.time() < deadline:
+            pending = db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+            if not pending:
+                break
+            time.sleep(0.2)
+        rows = db.execute("SELECT status, sent_at - created_at FROM outbox").fetchall()
+    return [latency for status, latency in rows if status == "sent"], sum(1 for status, _ in rows if status != "sent")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="교실 단위 동시 접속 부하 테스트")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--page", choices=["vision", "text", "image", "all"], default="all")
+    parser.add_argument("--keys", type=int, default=2, help="가짜 OpenAI/Gemini 키 수")
+    parser.add_argument("--ramp", type=float, default=0.0, help="학생 접속을 이 시간(초)에 걸쳐 나눔")
+    parser.add_argument("--same-input", action="store_true", help="모든 학생이 같은 답/형용사/사진을 사용")
+    parser.add_argument("--notion-latency", type=float, default=0.3)
+    parser.add_argument("--openai-latency", type=float, default=0.8)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--smtp-latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="모든 대역 서버에 주입할 오류 비율")
+    parser.add_argument("--delivery-timeout", type=float, default=120)
+    parser.add_argument("--limit", type=int, help="모든 모델의 동시 호출 수 제한 (기본: core.admission의 기본값)")
+    parser.add_argument("--cache-backend", choices=["memory", "sqlite", "redis"], default="memory",
+                        help="공유 캐시 저장소 (redis는 로컬 Redis 대역 서버 사용)")
+    args = parser.parse_args()
+
+    def injector(latency):
+        return Injector(latency, args.jitter, args.error_rate)
+
+    notion = FakeNotion([ACTIVITY_CODE], injector=injector(args.notion_latency)).start()
+    openai = FakeOpenAI(injector=injector(args.openai_latency)).start()
+    gemini = FakeGemini(injector=injector(args.gemini_latency)).start()
+    smtp = FakeSMTP(injector=injector(args.smtp_latency)).start()
+    redis = FakeRedis().start() if args.cache_backend == "redis" else None
+    data_dir = pathlib.Path(tempfile.mkdtemp(prefix="loadtest-"))
+
+    # 페이지가 core 패키지를 찾을 수 있도록 앱 루트에서 실행하고, secrets는 대역 서버를 가리키게 합니다
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    from core import resources
+
+    secrets = build_secrets(args, notion, openai, gemini, smtp, data_dir, redis)
+    resources.use_secrets(secrets)
+    resources.warm_up(background=False)
+
+    pages = list(PAGES) if args.page == "all" else [args.page]
+    recorder = Recorder()
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.students) as pool:
+        futures = []
+        for student in range(args.students):
+            if args.ramp:
+                time.sleep(args.ramp / args.students)
+            futures.append(pool.submit(run_student, student, pages[student % len(pages)], recorder, args.same_input))
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"학생 실행 중 예외: {e!r}")
+                results.append(False)
+    elapsed = time.perf_counter() - started
+
+    latencies, undelivered = delivery_latencies(secrets["email"]["outbox_path"], args.delivery_timeout)
+    for latency in latencies:
+        recorder.record("email_delivery", latency)
+    recorder.errors["email_delivery"] += undelivered
+
+    completed = sum(results)
+    print(f"\n학생 {args.students}명, 페이지 {', '.join(pages)}, {elapsed:.1f}초")
+    print(f"처리량 {completed / elapsed:.2f}명/초, 오류율 {(args.students - completed) / args.students:.1%}\n")
+    print(f"{'stage':<16}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+    for stage in STAGES:
+        values = recorder.timings[stage]
+        cells = [percentile(values, q) for q in (50, 95, 99)] + [max(values) if values else None]
+        text = "".join(f"{v * 1000:>8.0f}ms" if v is not None else f"{'-':>10}" for v in cells)
+        print(f"{stage:<16}{len(values):>6}{text}{recorder.errors[stage]:>8}")
+
+    from core.admission import admission_stats
+    from core.cache import activity_cache
+    from core.singleflight import flight_stats
+
+    print("\n대역 서버 요청:", {"notion": notion.stats(), "openai": openai.stats(), "gemini": gemini.stats(), "smtp": smtp.stats()})
+    print("활동 코드 캐시:", activity_cache.stats())
+    print("공유 캐시 저장소:", resources.get_cache_backend().stats(), redis.stats() if redis is not None else "")
+    print("요청 합치기:", flight_stats())
+    print("동시 호출 제한:", admission_stats())
+    print("OpenAI 키:", resources.get_openai_pool().stats())
+    print("Gemini 키:", resources.get_gemini_pool().stats())
+    time.sleep(2)
+    print("Notion 제출 기록:", resources.get_submission_sink().stats(), f"만든 페이지 {len(notion.pages)}개")
+    print("계측 로그:", secrets["metrics"]["log_path"])
+
+
+if __name__ == "__main__":
+    main()
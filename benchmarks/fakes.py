@@ -0,0 +1,388 @@
+# 부하 테스트용 로컬 대역 서버: Notion 쿼리 API, OpenAI(chat, images), Gemini generate_content, SMTP
+# 각 서버는 지연 시간(latency, jitter)과 오류 비율(error_rate)을 설정할 수 있습니다.
+import base64
+import io
+import json
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+# 지연 시간과 오류를 주입하는 설정
+class Injector:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=429):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self, scale=1.0):
+        wait = max(0.0, random.gauss(self.latency, self.jitter)) * scale
+        if wait:
+            time.sleep(wait)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self):
+        server = self.server.fake
+        with server.lock:
+            server.requests += 1
+        server.injector.delay()
+        if server.injector.should_fail():
+            with server.lock:
+                server.errors += 1
+            self._send_json(server.injector.error_status, {"error": {"message": "injected error"}}, {"Retry-After": "0.2"})
+            return True
+        return False
+
+    def do_POST(self):
+        # 실패를 흉내 낼 때도 본문을 먼저 읽어야 keep-alive 연결의 다음 요청이 깨지지 않습니다
+        payload = self._read_json()
+        if self._maybe_fail():
+            return
+        self.server.fake.handle_post(self, self.path, payload)
+
+
+class FakeHTTPServer:
+    def __init__(self, injector=None):
+        self.injector = injector or Injector()
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors}
+
+    def handle_post(self, handler, path, payload):
+        handler._send_json(404, {"error": "not found"})
+
+
+def _rich_text(value):
+    return {"rich_text": [{"type": "text", "text": {"content": value}, "plain_text": value}]}
+
+
+# Notion databases/{id}/query 대역: 활동 코드마다 vision, text, image 세 행을 돌려줍니다
+# POST /v1/pages로 만든 제출 페이지는 pages 목록에 쌓입니다.
+class FakeNotion(FakeHTTPServer):
+    def __init__(self, activity_codes, teacher_email="teacher@example.com", injector=None):
+        super().__init__(injector)
+        self.rows = []
+        for code in activity_codes:
+            for kind in ("vision", "text", "image"):
+                self.rows.append({
+                    "id": f"{code}-{kind}",
+                    "last_edited_time": "2024-01-01T00:00:00.000Z",
+                    "properties": {
+                        "setting_name": _rich_text(code),
+                        "page": _rich_text(kind),
+                        "prompt": _rich_text(f"{code} {kind} 활동 프롬프트입니다."),
+                        "email": _rich_text(teacher_email),
+                    },
+                })
+        self.pages = []
+
+    def handle_post(self, handler, path, payload):
+        if path == "/v1/pages":
+            self.pages.append(payload)
+            return handler._send_json(200, {"object": "page", "id": f"page-{len(self.pages)}"})
+        if not re.match(r"^/v1/databases/[^/]+/query$", path):
+            return super().handle_post(handler, path, payload)
+        rows = self.rows
+        equals = payload.get("filter", {}).get("rich_text", {}).get("equals")
+        if equals is not None:
+            rows = [row for row in rows if row["properties"]["setting_name"]["rich_text"][0]["plain_text"] == equals]
+        handler._send_json(200, {"object": "list", "results": rows, "has_more": False, "next_cursor": None})
+
+
+def _png(size=64):
+    buffer = io.BytesIO()
+    color = tuple(random.randrange(256) for _ in range(3))
+    Image.new("RGB", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# OpenAI chat.completions(스트리밍 포함)와 images.generate 대역
+class FakeOpenAI(FakeHTTPServer):
+    def __init__(self, injector=None, words=40, word_delay=0.01):
+        super().__init__(injector)
+        self.words = words
+        self.word_delay = word_delay
+
+    def _rate_headers(self):
+        return {"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "1000000"}
+
+    def handle_post(self, handler, path, payload):
+        if path == "/v1/images/generations":
+            return handler._send_json(200, {"created": int(time.time()), "data": [{"b64_json": base64.b64encode(_png()).decode()}]},
+                                      self._rate_headers())
+        if path != "/v1/chat/completions":
+            return super().handle_post(handler, path, payload)
+
+        words = [f"단어{i}" for i in range(self.words)]
+        usage = {"prompt_tokens": 50, "completion_tokens": self.words, "total_tokens": 50 + self.words}
+        if not payload.get("stream"):
+            return handler._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }, self._rate_headers())
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        for name, value in self._rate_headers().items():
+            handler.send_header(name, value)
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+            time.sleep(self.word_delay)
+        last = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": payload.get("model"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage}
+        handler.wfile.write(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode())
+        handler.wfile.flush()
+        handler.close_connection = True
+
+
+# Gemini REST generateContent / streamGenerateContent 대역
+class FakeGemini(FakeHTTPServer):
+    def __init__(self, injector=None, chunks=5):
+        super().__init__(injector)
+        self.chunks = chunks
+
+    def _response(self, text, last):
+        payload = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+        if last:
+            payload["candidates"][0]["finishReason"] = 1
+            payload["usageMetadata"] = {"promptTokenCount": 300, "candidatesTokenCount": 20 * self.chunks,
+                                        "totalTokenCount": 300 + 20 * self.chunks}
+        return payload
+
+    def handle_post(self, handler, path, payload):
+        match = re.match(r"^/v1beta/models/[^/:]+:(generateContent|streamGenerateContent)", path)
+        if not match:
+            return super().handle_post(handler, path, payload)
+        parts = [self._response(f"이미지 분석 결과 {i}. ", i == self.chunks - 1) for i in range(self.chunks)]
+        if match.group(1) == "generateContent":
+            merged = self._response("".join(p["candidates"][0]["content"]["parts"][0]["text"] for p in parts), True)
+            return handler._send_json(200, merged)
+        handler._send_json(200, parts)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        fake = self.server.fake
+
+        def reply(line):
+            self.wfile.write((line + "\r\n").encode())
+
+        reply("220 fake smtp ready")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            text = line.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if text == ".":
+                    in_data = False
+                    fake.injector.delay()
+                    if fake.injector.should_fail():
+                        with fake.lock:
+                            fake.errors += 1
+                        reply("451 injected temporary failure")
+                    else:
+                        with fake.lock:
+                            fake.messages += 1
+                            fake.received_at.append(time.time())
+                        reply("250 queued")
+                continue
+            command = text.split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                reply("250 fake")
+            elif command == "DATA":
+                reply("354 end with .")
+                in_data = True
+            elif command == "QUIT":
+                reply("221 bye")
+                return
+            else:
+                reply("250 ok")
+
+
+# 인증 없이 메일을 받아 개수만 세는 SMTP 대역 (use_ssl = false로 연결)
+class FakeSMTP:
+    def __init__(self, injector=None):
+        self.injector = injector or Injector()
+        self.messages = 0
+        self.errors = 0
+        self.received_at = []
+        self.lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def stats(self):
+        return {"messages": self.messages, "errors": self.errors}
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        fake = self.server.fake
+        with fake.lock:
+            fake.connections.add(self.connection)
+        try:
+            self._serve(fake)
+        except (OSError, ValueError):
+            pass  # drop_connections()로 끊은 연결
+        finally:
+            with fake.lock:
+                fake.connections.discard(self.connection)
+
+    def _serve(self, fake):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].decode().upper()
+            fake.injector.delay()
+            with fake.lock:
+                fake.commands += 1
+                if command == "GET":
+                    entry = fake.data.get(args[1])
+                    if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                        del fake.data[args[1]]
+                        entry = None
+                    reply = b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[1]), entry[1])
+                elif command == "SET":
+                    expires_at = None
+                    if len(args) >= 5 and args[3].upper() == b"PX":
+                        expires_at = time.monotonic() + int(args[4]) / 1000
+                    elif len(args) >= 5 and args[3].upper() == b"EX":
+                        expires_at = time.monotonic() + int(args[4])
+                    fake.data[args[1]] = (expires_at, args[2])
+                    reply = b"+OK\r\n"
+                elif command == "MGET":
+                    values = [fake.data.get(key) for key in args[1:]]
+                    reply = b"*%d\r\n" % len(values) + b"".join(
+                        b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[1]), entry[1]) for entry in values
+                    )
+                elif command == "DEL":
+                    reply = b":%d\r\n" % sum(1 for key in args[1:] if fake.data.pop(key, None) is not None)
+                elif command == "FLUSHDB":
+                    fake.data.clear()
+                    reply = b"+OK\r\n"
+                elif command in ("PING", "AUTH", "SELECT"):
+                    reply = b"+PONG\r\n" if command == "PING" else b"+OK\r\n"
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+# GET/SET(PX, EX)/MGET/DEL만 아는 메모리 Redis 대역 (여러 서버가 함께 쓰는 캐시 저장소 시험용)
+class FakeRedis:
+    def __init__(self, injector=None):
+        self.injector = injector or Injector()
+        self.data = {}
+        self.commands = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RedisHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    # 서버 재시작이나 유휴 연결 정리처럼 열려 있는 클라이언트 연결을 모두 끊습니다 (데이터는 그대로)
+    def drop_connections(self):
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"commands": self.commands, "keys": len(self.data), "connections": len(self.connections)}
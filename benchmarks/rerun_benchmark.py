@@ -0,0 +1,90 @@
+# 페이지 스크립트 한 번의 rerun에 걸리는 시간을 측정합니다.
+#
+# Streamlit은 위젯을 건드릴 때마다 페이지 스크립트를 처음부터 다시 실행하므로,
+# 스크립트 맨 위에서 하는 준비 작업(secrets 읽기, SDK import, 클라이언트 생성)이 모든 rerun에 더해집니다.
+#
+# 사용법:
+#   python benchmarks/rerun_benchmark.py                  # 현재 코드
+#   git worktree add /tmp/before <이전 커밋>
+#   python benchmarks/rerun_benchmark.py --root /tmp/before   # 비교할 이전 코드
+#
+# .streamlit/secrets.toml이 없으면 측정 동안만 가짜 값으로 만들어 두었다가 지웁니다.
+import argparse
+import os
+import pathlib
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+PAGES = ["Home.py", "pages/1 vision(new).py", "pages/2 text gen(new).py", "pages/3 image gen(new).py"]
+
+DUMMY_SECRETS = """
+[api]
+keys = ["sk-benchmark"]
+
+[google]
+gemini_api_key1 = "benchmark"
+
+[notion]
+api_key = "secret_benchmark"
+database_id = "benchmark"
+
+[email]
+address = "benchmark@example.com"
+password = "benchmark"
+"""
+
+
+def measure(root, page, runs):
+    at = AppTest.from_file(str(root / page), default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - started
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "cold": cold,
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "exceptions": len(at.exception),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="페이지별 rerun 시간 측정")
+    parser.add_argument("--root", type=pathlib.Path, default=pathlib.Path(__file__).resolve().parent.parent)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+    root = args.root.resolve()
+
+    # 페이지가 core 패키지와 .streamlit/secrets.toml을 찾을 수 있도록 앱 루트에서 실행
+    os.chdir(root)
+    sys.path.insert(0, str(root))
+    secrets_path = root / ".streamlit/secrets.toml"
+    created_secrets = not secrets_path.exists()
+    if created_secrets:
+        secrets_path.parent.mkdir(exist_ok=True)
+        secrets_path.write_text(DUMMY_SECRETS)
+
+    try:
+        print(f"{'page':<28}{'cold':>10}{'median':>10}{'mean':>10}{'p95':>10}")
+        for page in PAGES:
+            result = measure(root, page, args.runs)
+            note = f"  (예외 {result['exceptions']}개)" if result["exceptions"] else ""
+            print(f"{page:<28}{result['cold'] * 1000:>8.1f}ms{result['median'] * 1000:>8.1f}ms"
+                  f"{result['mean'] * 1000:>8.1f}ms{result['p95'] * 1000:>8.1f}ms{note}")
+    finally:
+        if created_secrets:
+            secrets_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
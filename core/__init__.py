@@ -0,0 +1,5 @@
+# 여러 페이지가 함께 사용하는 공용 모듈 모음
+import pathlib
+
+# 발송 대기열, 캐시, 생성 이미지, 지표 등 실행 중에 만들어지는 파일을 두는 폴더
+DATA_DIR = pathlib.Path(__file__).parent.parent / ".data"
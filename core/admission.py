@@ -0,0 +1,165 @@
+import collections
+import contextlib
+import math
+import threading
+import time
+
+from core.metrics import get_metrics
+
+# 제공자/모델별 동시 호출 수 기본값 (secrets.toml의 [limits.제공자] 아래 "모델 이름" = 숫자로 변경)
+DEFAULT_LIMITS = {
+    "openai": {"gpt-4o-mini": 8, "dall-e-3": 2},
+    "gemini": {"gemini-1.5-flash": 6},
+}
+DEFAULT_LIMIT = 4
+MAX_WAIT = 300  # 초 단위, 이보다 오래 기다리면 포기하고 다시 시도하라고 안내
+SERVICE_TIME = 10  # 초 단위, 실제 호출 시간을 재기 전까지 쓰는 예상 처리 시간
+POLL_INTERVAL = 0.5  # 초 단위, 기다리는 동안 대기 순서를 다시 알려 주는 주기
+
+
+class AdmissionTimeout(Exception):
+    pass
+
+
+class _Ticket:
+    def __init__(self, activity):
+        self.activity = activity
+        self.admitted = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+# 한 모델에 대한 동시 호출 수를 제한하는 대기열
+# 빈자리가 없으면 활동 코드별 대기줄에 세우고, 자리가 나면 활동 코드를 돌아가며(같은 코드 안에서는 온 순서대로) 들여보냅니다.
+# 한 반이 한꺼번에 눌러도 다른 반 학생이 그 뒤에 오래 묶이지 않습니다.
+class AdmissionQueue:
+    def __init__(self, name, limit, max_wait=MAX_WAIT):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.max_wait = max_wait
+        self.running = 0
+        self.admitted_count = 0
+        self.queued_count = 0
+        self.timeouts = 0
+        self.service_time = SERVICE_TIME
+        self._queues = collections.OrderedDict()  # 활동 코드 -> 대기 중인 표 (다음에 들어갈 코드가 맨 앞)
+        self._lock = threading.Lock()
+
+    def _admit_waiting(self):
+        while self.running < self.limit and self._queues:
+            activity, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            del self._queues[activity]
+            if queue:
+                # 같은 코드의 다음 학생은 다른 코드들 뒤로 보냅니다
+                self._queues[activity] = queue
+            self.running += 1
+            self.admitted_count += 1
+            ticket.admitted.set()
+
+    def enter(self, activity):
+        ticket = _Ticket(activity or "")
+        with self._lock:
+            if self.running < self.limit and not self._queues:
+                self.running += 1
+                self.admitted_count += 1
+                ticket.admitted.set()
+            else:
+                self._queues.setdefault(ticket.activity, collections.deque()).append(ticket)
+                self.queued_count += 1
+        return ticket
+
+    # 실제 호출에 걸린 시간으로 예상 처리 시간을 갱신하고 다음 학생을 들여보냅니다
+    def leave(self, ticket, held=None):
+        with self._lock:
+            if ticket.admitted.is_set():
+                self.running -= 1
+                if held is not None:
+                    self.service_time = 0.8 * self.service_time + 0.2 * held
+            else:
+                queue = self._queues.get(ticket.activity)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[ticket.activity]
+            self._admit_waiting()
+
+    # 이 표 앞에 먼저 들어갈 학생 수 + 1 (이미 들어갔으면 0)
+    def position(self, ticket):
+        with self._lock:
+            if ticket.admitted.is_set():
+                return 0
+            queue = self._queues.get(ticket.activity)
+            if queue is None or ticket not in queue:
+                return 0
+            index = queue.index(ticket)
+            position = index + 1
+            ahead = True
+            for activity, other in self._queues.items():
+                if activity == ticket.activity:
+                    ahead = False
+                    continue
+                # 돌아가며 들여보내므로 다른 코드에서는 같은 차례까지(앞 순번 코드는 한 명 더) 먼저 들어갑니다
+                position += min(len(other), index + (1 if ahead else 0))
+            return position
+
+    def estimated_wait(self, position):
+        if position <= 0:
+            return 0.0
+        return math.ceil(position / self.limit) * self.service_time
+
+    # with queue.slot(setting_name, on_wait) 안에서 모델을 호출합니다
+    # 자리가 날 때까지 기다리는 동안 on_wait(대기 순서, 예상 대기 초)를 주기적으로 호출합니다.
+    @contextlib.contextmanager
+    def slot(self, activity=None, on_wait=None, provider=None, model=None):
+        ticket = self.enter(activity)
+        admitted_at = None
+        try:
+            while not ticket.admitted.wait(POLL_INTERVAL if on_wait else self.max_wait):
+                if time.monotonic() - ticket.enqueued_at >= self.max_wait:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise AdmissionTimeout(f"{self.name} 대기 시간이 {self.max_wait}초를 넘었습니다.")
+                if on_wait is not None:
+                    position = self.position(ticket)
+                    on_wait(position, self.estimated_wait(position))
+            admitted_at = time.monotonic()
+            waited = admitted_at - ticket.enqueued_at
+            if waited >= POLL_INTERVAL:
+                get_metrics().record_stage("queue_wait", activity, waited, provider=provider, model=model)
+            yield
+        finally:
+            self.leave(ticket, time.monotonic() - admitted_at if admitted_at is not None else None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "running": self.running,
+                "waiting": sum(len(queue) for queue in self._queues.values()),
+                "waiting_by_activity": {activity: len(queue) for activity, queue in self._queues.items()},
+                "admitted": self.admitted_count,
+                "queued": self.queued_count,
+                "timeouts": self.timeouts,
+                "service_time": round(self.service_time, 2),
+            }
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+# secrets.toml의 [limits] 설정으로 제공자/모델마다 하나씩 만들어 모든 세션이 공유합니다
+# 예) [limits] max_wait = 300 / [limits.openai] "dall-e-3" = 2
+def get_admission_queue(limit_settings, provider, model):
+    name = f"{provider}:{model}"
+    with _queues_lock:
+        queue = _queues.get(name)
+        if queue is None:
+            limit = limit_settings.get(provider, {}).get(model, DEFAULT_LIMITS.get(provider, {}).get(model, DEFAULT_LIMIT))
+            queue = _queues[name] = AdmissionQueue(name, limit, float(limit_settings.get("max_wait", MAX_WAIT)))
+        return queue
+
+
+def admission_stats():
+    with _queues_lock:
+        return {name: queue.stats() for name, queue in _queues.items()}
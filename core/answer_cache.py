@@ -0,0 +1,202 @@
+import collections
+import hashlib
+import random
+import threading
+import time
+import unicodedata
+
+MAXSIZE = 5000  # 모든 활동을 합친 최대 항목 수
+TTL = 3600  # 초 단위, 활동 설정에 answer_cache_minutes가 없을 때
+THRESHOLD = 0.85  # 이 이상 비슷하면(자카드 유사도 추정) 같은 답으로 봅니다
+SHINGLE = 3  # 글자 조각 길이
+NUM_PERM = 64  # MinHash 서명 길이
+BANDS = 16  # LSH 띠 수 (띠 하나 = NUM_PERM // BANDS 개 값)
+_PRIME = (1 << 61) - 1
+
+
+# 학생 답을 비교용으로 정규화합니다
+# 자모로 친 글자를 완성형으로 합치고(NFC), 대소문자를 맞춘 뒤 띄어쓰기와 문장 부호, 기호를 모두 뺍니다.
+# "바다 에서!" 와 "바다에서" 는 같은 글이 됩니다.
+def normalize_answer(text):
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    return "".join(ch for ch in text if not ch.isspace() and unicodedata.category(ch)[0] not in "PSC")
+
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+# 글자 3개씩 끊은 조각들의 MinHash 서명 (두 서명에서 같은 값의 비율이 자카드 유사도의 추정치)
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text):
+        shingles = {text[i:i + SHINGLE] for i in range(max(1, len(text) - SHINGLE + 1))}
+        hashes = [_shingle_hash(shingle) for shingle in shingles]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self.params)
+
+
+def similarity(a, b):
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+# 같은 프롬프트에 거의 같은 답을 낸 학생들에게 AI 답을 다시 쓰는 캐시 (활동 코드별로 켜고 끔)
+# 정규화한 답이 같으면 바로 쓰고, minhash를 켜면 LSH 띠로 후보를 찾아 유사도가 threshold 이상인 답도 씁니다.
+# 모든 세션이 함께 쓰는 메모리 캐시이며, 가장 오래된 항목부터 지웁니다.
+# shared가 여러 프로세스가 함께 쓰는 저장소면 정규화한 답이 같은 경우만 그곳에서도 찾습니다 (비슷한 답 찾기는 프로세스 안에서만).
+class AnswerCache:
+    def __init__(self, maxsize=MAXSIZE, threshold=THRESHOLD, minhash=False, num_perm=NUM_PERM, bands=BANDS, shared=None):
+        self.shared = shared if shared is not None and shared.wider_than("process") else None
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm) if minhash else None
+        self.bands = bands
+        self.hits = {"exact": 0, "similar": 0}
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # (활동 키, 정규화한 답) -> (만료 시각, AI 답, 서명)
+        self._buckets = collections.defaultdict(set)  # (활동 키, 띠 번호, 띠 값) -> 정규화한 답 집합
+        self._lock = threading.Lock()
+
+    # 활동 코드와 프롬프트가 같아야 같은 공간에서 찾습니다 (교사가 프롬프트를 고치면 자연히 새로 시작)
+    def _scope(self, activity, prompt):
+        return activity or "", hashlib.sha256((prompt or "").encode()).hexdigest()
+
+    def _shared_key(self, scope, normalized):
+        return f"answer:{scope[0]}:{scope[1]}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def _bands(self, signature):
+        rows = len(signature) // self.bands
+        return [(i, signature[i * rows:(i + 1) * rows]) for i in range(self.bands)]
+
+    def _remove(self, key):
+        _, _, signature = self._entries.pop(key)
+        if signature is not None:
+            for band in self._bands(signature):
+                bucket = self._buckets.get((key[0], *band))
+                if bucket is not None:
+                    bucket.discard(key[1])
+                    if not bucket:
+                        del self._buckets[(key[0], *band)]
+
+    # (AI 답, "exact" 또는 "similar")을 반환하고, 없으면 None
+    def get(self, activity, prompt, answer):
+        normalized = normalize_answer(answer)
+        if not normalized:
+            return None
+        scope = self._scope(activity, prompt)
+        signature = self.hasher.signature(normalized) if self.hasher and len(normalized) >= SHINGLE else None
+        now = time.monotonic()
+        with self._lock:
+            found = self._lookup(scope, normalized, now)
+            if found is not None:
+                self.hits["exact"] += 1
+                return found, "exact"
+            if signature is not None:
+                candidates = set()
+                for band in self._bands(signature):
+                    candidates |= self._buckets.get((scope, *band), set())
+                best, best_score = None, self.threshold
+                for candidate in candidates:
+                    entry = self._entries.get((scope, candidate))
+                    if entry is None or entry[0] <= now:
+                        continue
+                    score = similarity(signature, entry[2])
+                    if score >= best_score:
+                        best, best_score = candidate, score
+                if best is not None:
+                    self.hits["similar"] += 1
+                    return self._lookup(scope, best, now), "similar"
+        if self.shared is not None:
+            found = self.shared.get_text(self._shared_key(scope, normalized))
+            if found is not None:
+                with self._lock:
+                    self.hits["exact"] += 1
+                return found, "exact"
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _lookup(self, scope, normalized, now):
+        entry = self._entries.get((scope, normalized))
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._remove((scope, normalized))
+            return None
+        self._entries.move_to_end((scope, normalized))
+        return entry[1]
+
+    def set(self, activity, prompt, answer, text, ttl=TTL):
+        normalized = normalize_answer(answer)
+        if not normalized or not text:
+            return
+        scope = self._scope(activity, prompt)
+        signature = self.hasher.signature(normalized) if self.hasher and len(normalized) >= SHINGLE else None
+        with self._lock:
+            if (scope, normalized) in self._entries:
+                self._remove((scope, normalized))
+            self._entries[(scope, normalized)] = (time.monotonic() + ttl, text, signature)
+            if signature is not None:
+                for band in self._bands(signature):
+                    self._buckets[(scope, *band)].add(normalized)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+        if self.shared is not None:
+            self.shared.set_text(self._shared_key(scope, normalized), text, ttl)
+
+    # 한 활동 코드의 항목을 모두 지우고 지운 개수를 반환합니다
+    def invalidate(self, activity):
+        with self._lock:
+            keys = [key for key in self._entries if key[0][0] == (activity or "")]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.hits.values()) + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "minhash": self.hasher is not None,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round(sum(self.hits.values()) / total, 3) if total else 0.0,
+            }
+
+
+# 이 활동에서 캐시를 쓸지와 보관 시간(초)
+# [answer_cache] enabled가 켜져 있어야 하고(기본 꺼짐), 교사는 Notion 설정 행의 answer_cache 체크박스를 꺼서
+# 다양한 답이 필요한 활동만 끌 수 있습니다. answer_cache_minutes 열이 있으면 그 활동의 보관 시간으로 씁니다.
+def cache_policy(answer_cache_settings, activity_options):
+    if not answer_cache_settings.get("enabled", False) or activity_options.get("enabled") is False:
+        return False, 0
+    minutes = activity_options.get("ttl_minutes")
+    ttl = float(minutes) * 60 if minutes else float(answer_cache_settings.get("ttl_minutes", TTL / 60)) * 60
+    return ttl > 0, ttl
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# secrets.toml의 [answer_cache] 설정으로 모든 세션이 함께 쓰는 캐시를 만듭니다
+#   [answer_cache]
+#   enabled = true      # 기본은 꺼짐
+#   ttl_minutes = 60
+#   minhash = true      # 띄어쓰기/문장 부호 차이를 넘어 거의 같은 답까지 묶을 때
+#   threshold = 0.85
+#   maxsize = 5000
+def get_answer_cache(answer_cache_settings, shared=None):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(
+                maxsize=int(answer_cache_settings.get("maxsize", MAXSIZE)),
+                threshold=float(answer_cache_settings.get("threshold", THRESHOLD)),
+                minhash=bool(answer_cache_settings.get("minhash", False)),
+                shared=shared,
+            )
+        return _cache
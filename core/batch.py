@@ -0,0 +1,146 @@
+import concurrent.futures
+import csv
+import io
+import pathlib
+import random
+import time
+import zipfile
+
+WORKERS = 4  # 동시에 분석할 이미지 수 (Gemini 동시 호출 제한과 함께 적용)
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 2  # 초 단위
+MAX_FILES = 200
+MAX_TOTAL_BYTES = 300 * 1024 * 1024  # 압축을 푼 전체 크기 한도
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+
+# Windows에서 만든 압축 파일은 한글 파일 이름이 CP949로 들어 있어 zipfile이 CP437로 잘못 읽습니다
+def _zip_name(info):
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("cp949")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _unique(name, used):
+    path = pathlib.PurePath(name)
+    candidate, number = path.name, 2
+    while candidate in used:
+        candidate = f"{path.stem}_{number}{path.suffix}"
+        number += 1
+    used.add(candidate)
+    return candidate
+
+
+# 업로드된 파일 목록((파일 이름, 바이트))에서 분석할 이미지를 꺼냅니다
+# zip 파일은 안의 이미지를 모두 꺼내고, 이미지가 아닌 파일과 한도를 넘는 파일은 skipped에 이유와 함께 담습니다.
+def read_uploads(files, max_files=MAX_FILES, max_total_bytes=MAX_TOTAL_BYTES):
+    images, skipped, used = [], [], set()
+    total = 0
+
+    def add(name, size, read):
+        nonlocal total
+        if pathlib.PurePath(name).suffix.lower() not in IMAGE_EXTENSIONS:
+            skipped.append((name, "이미지 파일이 아님"))
+        elif len(images) >= max_files:
+            skipped.append((name, f"최대 {max_files}개 초과"))
+        elif total + size > max_total_bytes:
+            skipped.append((name, "전체 크기 한도 초과"))
+        else:
+            total += size
+            images.append((_unique(name, used), read()))
+
+    for filename, data in files:
+        if pathlib.PurePath(filename).suffix.lower() != ".zip":
+            add(filename, len(data), lambda data=data: data)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            skipped.append((filename, "압축 파일을 열 수 없음"))
+            continue
+        with archive:
+            for info in archive.infolist():
+                name = _zip_name(info)
+                base = pathlib.PurePath(name).name
+                if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+                    continue
+                add(base, info.file_size, lambda info=info: archive.read(info))
+    return images, skipped
+
+
+# 파일 이름에서 학생 이름을 짐작합니다 ("3반_홍길동.jpg" -> "3반_홍길동")
+def student_name_from(filename):
+    return pathlib.PurePath(filename).stem
+
+
+def _run_one(filename, data, analyze, max_attempts, no_retry):
+    started = time.perf_counter()
+    result = {"filename": filename, "student_name": student_name_from(filename), "status": "ok", "text": "", "error": ""}
+    for attempt in range(1, max_attempts + 1):
+        result["attempts"] = attempt
+        try:
+            result.update(analyze(filename, data), status="ok", error="")
+            break
+        except no_retry as e:
+            result.update(status="error", error=str(e) or type(e).__name__)
+            break
+        except Exception as e:
+            result.update(status="error", error=str(e) or type(e).__name__)
+            if attempt < max_attempts:
+                time.sleep(BACKOFF_BASE * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+# 이미지 목록을 스레드 풀에서 동시에 분석합니다
+# analyze(파일 이름, 바이트)는 결과 항목(text 등)을 담은 사전을 반환하고, 실패하면 예외를 냅니다.
+# no_retry에 든 예외는 다시 시도하지 않습니다. on_progress(끝난 수, 전체 수, 결과)는 호출한 스레드에서 불리므로
+# Streamlit 화면을 바로 갱신해도 됩니다. 결과는 입력 순서대로 반환합니다.
+def run_batch(images, analyze, workers=WORKERS, max_attempts=MAX_ATTEMPTS, no_retry=(), on_progress=None):
+    results = [None] * len(images)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = {
+            pool.submit(_run_one, filename, data, analyze, max_attempts, tuple(no_retry)): i
+            for i, (filename, data) in enumerate(images)
+        }
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if on_progress is not None:
+                on_progress(done, len(images), results[futures[future]])
+    return results
+
+
+REPORT_COLUMNS = [
+    ("filename", "파일 이름"),
+    ("student_name", "학생 이름"),
+    ("status", "상태"),
+    ("text", "AI 분석 결과"),
+    ("error", "오류"),
+    ("attempts", "시도 횟수"),
+    ("seconds", "소요 시간(초)"),
+]
+
+
+# 엑셀에서 한글이 깨지지 않도록 BOM을 붙인 UTF-8 CSV
+def report_csv(results):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([label for _, label in REPORT_COLUMNS])
+    for result in results:
+        writer.writerow([result.get(field, "") for field, _ in REPORT_COLUMNS])
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+# CSV 보고서와 학생별 분석 결과 텍스트 파일을 묶은 zip
+def report_zip(results):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("report.csv", report_csv(results))
+        for result in results:
+            if result["status"] == "ok":
+                name = pathlib.PurePath(result["filename"]).stem
+                archive.writestr(f"results/{name}.txt", result["text"])
+    return buffer.getvalue()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from core.singleflight import get_flight
+
+# 활동 코드 조회 결과를 보관하는 기본값
+ACTIVITY_CACHE_MAXSIZE = 512
+ACTIVITY_CACHE_TTL = 300  # 초 단위 (교사가 프롬프트를 수정하면 최대 5분 뒤 반영)
+
+
+# 프로세스 전체에서 공유하는 TTL + LRU 캐시
+# Streamlit은 페이지 스크립트를 매번 다시 실행하지만, import된 모듈은 프로세스에 남아 있으므로
+# 여기에 만든 캐시는 모든 학생 세션이 함께 사용합니다.
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (만료 시각, 값)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            # 가장 오래 사용하지 않은 항목부터 제거
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    # 조건에 맞는 항목을 모두 제거하고 제거한 개수를 반환
+    def invalidate_where(self, predicate):
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# 세 페이지가 함께 쓰는 활동 코드 캐시: (setting_name, 페이지 종류) -> (프롬프트, 교사 이메일)
+activity_cache = TTLCache(maxsize=ACTIVITY_CACHE_MAXSIZE, ttl=ACTIVITY_CACHE_TTL)
+
+
+# 캐시에 있으면 바로 반환하고, 없으면 fetch(setting_name)으로 Notion을 조회합니다.
+# 같은 코드를 여러 세션이 동시에 조회하면 Notion 요청 하나의 결과를 함께 받습니다.
+# 프롬프트를 찾지 못한 경우는 캐시하지 않으므로 교사가 새로 만든 코드는 바로 조회됩니다.
+def cached_activity_lookup(setting_name, page_kind, fetch, shared=None):
+    key = (setting_name, page_kind)
+    cached = activity_cache.get(key)
+    if cached is not None:
+        return cached
+    # 여러 프로세스가 함께 쓰는 캐시 저장소가 있으면, 다른 프로세스가 이미 조회한 결과를 씁니다
+    if shared is not None and not shared.wider_than("process"):
+        shared = None
+    shared_key = f"activity:{page_kind}:{setting_name}"
+
+    def load():
+        if shared is not None:
+            found = shared.get_json(shared_key)
+            if found:
+                activity_cache.set(key, tuple(found))
+                return tuple(found)
+        prompt, teacher_email = fetch(setting_name)
+        if prompt:
+            activity_cache.set(key, (prompt, teacher_email))
+            if shared is not None:
+                shared.set_json(shared_key, [prompt, teacher_email], activity_cache.ttl)
+        return prompt, teacher_email
+
+    return get_flight("notion").do(key, load)
+
+
+# 특정 활동 코드(또는 전체)의 캐시를 비웁니다. 교사가 프롬프트를 수정했을 때 사용합니다.
+def invalidate_activity(setting_name=None, page_kind=None):
+    return activity_cache.invalidate_where(
+        lambda key: (setting_name is None or key[0] == setting_name)
+        and (page_kind is None or key[1] == page_kind)
+    )
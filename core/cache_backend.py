@@ -0,0 +1,340 @@
+import abc
+import contextlib
+import json
+import pathlib
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from core import DATA_DIR
+from core.cache import TTLCache
+
+DEFAULT_TTL = 24 * 3600  # 초 단위, ttl을 주지 않았을 때
+DEFAULT_SHARED_CACHE_PATH = DATA_DIR / "shared_cache.sqlite3"
+MEMORY_MAXSIZE = 4096
+MAX_BYTES = 500 * 1024 * 1024  # 디스크 캐시 전체 크기 한도
+PRUNE_EVERY = 200  # 이만큼 쓸 때마다 만료되거나 한도를 넘은 항목을 정리
+REDIS_TIMEOUT = 2  # 초 단위, 이보다 오래 걸리면 캐시에 없는 것으로 봅니다
+REDIS_POOL_SIZE = 16
+REDIS_RETRY_AFTER = 5  # 초 단위, 연결에 실패하면 이 시간 동안은 Redis를 건너뜁니다
+
+# 저장소를 함께 쓰는 범위: 프로세스 하나 < 한 서버의 여러 프로세스 < 여러 서버
+SCOPES = ("process", "host", "cluster")
+
+
+# 여러 페이지가 함께 쓰는 캐시 저장소의 공통 인터페이스
+# 키는 "종류:..." 형태의 문자열, 값은 바이트입니다. 캐시는 보조 수단이므로 저장소에 문제가 생겨도
+# 예외를 내지 않고 없는 것(None)으로 처리하며, 오류 수는 stats()에 남깁니다.
+class CacheBackend(abc.ABC):
+    name = "base"
+    scope = "process"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    # 이미 scope 범위에서 공유되는 캐시(예: 서버의 SQLite 파일) 뒤에 둘 가치가 있는지
+    def wider_than(self, scope):
+        return SCOPES.index(self.scope) > SCOPES.index(scope)
+
+    @abc.abstractmethod
+    def get(self, key):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, key):
+        raise NotImplementedError
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_text(self, key):
+        value = self.get(key)
+        return value.decode() if value is not None else None
+
+    def set_text(self, key, value, ttl=None):
+        self.set(key, value.encode(), ttl)
+
+    def get_json(self, key):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key, value, ttl=None):
+        self.set(key, json.dumps(value, ensure_ascii=False).encode(), ttl)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# 프로세스 안의 메모리 캐시 (서버 프로세스가 하나일 때의 기본값)
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, maxsize=MEMORY_MAXSIZE):
+        super().__init__()
+        self._cache = TTLCache(maxsize=maxsize, ttl=DEFAULT_TTL)
+
+    def get(self, key):
+        return self._count(self._cache.get(key))
+
+    def set(self, key, value, ttl=None):
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self._cache.invalidate(key)
+
+    def stats(self):
+        return {**super().stats(), "size": self._cache.stats()["size"]}
+
+
+# 한 서버에서 여러 Streamlit 프로세스가 함께 쓰는 SQLite(WAL) 캐시
+# 만료 시각을 행마다 저장하고, 전체 크기가 max_bytes를 넘으면 가장 오래 읽지 않은 항목부터 지웁니다.
+class SQLiteBackend(CacheBackend):
+    name = "sqlite"
+    scope = "host"
+
+    def __init__(self, path=DEFAULT_SHARED_CACHE_PATH, max_bytes=MAX_BYTES):
+        super().__init__()
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS cache_lru ON cache (last_access);
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            self.errors += 1
+            return self._count(None)
+        return self._count(row[0] if row else None)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + (DEFAULT_TTL if ttl is None else ttl), now),
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(db, now)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _prune(self, db, now):
+        db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        for key, size in db.execute("SELECT key, size FROM cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+
+    def delete(self, key):
+        try:
+            with self._connect() as db:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self):
+        try:
+            with self._connect() as db:
+                count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        except sqlite3.Error:
+            count, total = None, None
+        return {**super().stats(), "entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+# Redis 오류 응답
+class RedisError(Exception):
+    pass
+
+
+# Redis 프로토콜(RESP)로 말하는 작은 클라이언트 연결 (GET/SET/DEL만 쓰므로 redis 패키지 없이 동작)
+class _RedisConnection:
+    def __init__(self, host, port, password=None, db=0, timeout=REDIS_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        try:
+            if password:
+                self.command("AUTH", password)
+            if db:
+                self.command("SELECT", str(db))
+        except BaseException:
+            # 비밀번호가 틀리거나 응답이 없으면 열어 둔 소켓을 닫고 알립니다
+            self.close()
+            raise
+
+    def command(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self.sock.sendall(b"".join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis 연결이 끊어졌습니다")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._reply() for _ in range(count)]
+        raise RedisError(f"알 수 없는 응답: {line!r}")
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            self.reader.close()
+            self.sock.close()
+
+
+# 여러 서버(호스트)의 Streamlit 프로세스가 함께 쓰는 Redis 캐시 (redis://[:비밀번호@]호스트:포트/DB번호)
+# 연결은 풀에 모아 재사용하고, 연결이나 응답에 문제가 생기면 그 연결을 버리고 캐시에 없는 것으로 처리합니다.
+# 새로 맺은 연결마저 실패해 Redis가 내려가 있으면 요청마다 연결 시간 제한만큼 기다리지 않도록 잠시 동안 아예 건너뜁니다.
+class RedisBackend(CacheBackend):
+    name = "redis"
+    scope = "cluster"
+
+    def __init__(self, url, prefix="students:", pool_size=REDIS_POOL_SIZE, timeout=REDIS_TIMEOUT):
+        super().__init__()
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool = []
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+
+    def _execute(self, *args):
+        if time.monotonic() < self._down_until:
+            return None
+        with self._lock:
+            connection = self._pool.pop() if self._pool else None
+        pooled = connection is not None
+        while True:
+            try:
+                if connection is None:
+                    connection = _RedisConnection(self.host, self.port, self.password, self.db, self.timeout)
+                result = connection.command(*args)
+                break
+            except (OSError, RedisError, ValueError) as e:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                # 풀에서 꺼낸 연결은 서버가 먼저 닫았을 수 있으므로(재시작, 유휴 시간 제한) 새 연결로 한 번 더 시도합니다
+                if pooled and isinstance(e, OSError) and not isinstance(e, TimeoutError):
+                    pooled = False
+                    continue
+                self.errors += 1
+                if isinstance(e, OSError):
+                    self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+                return None
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+        return result
+
+    def get(self, key):
+        return self._count(self._execute("GET", self.prefix + key))
+
+    def set(self, key, value, ttl=None):
+        self._execute("SET", self.prefix + key, value, "PX", int((DEFAULT_TTL if ttl is None else ttl) * 1000))
+
+    def delete(self, key):
+        self._execute("DEL", self.prefix + key)
+
+    def stats(self):
+        return {**super().stats(), "server": f"{self.host}:{self.port}/{self.db}", "pooled_connections": len(self._pool)}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# secrets.toml의 [cache] 설정으로 모든 페이지가 함께 쓰는 캐시 저장소를 만듭니다
+#   [cache]
+#   backend = "memory"        # 프로세스 하나 (기본값)
+#   backend = "sqlite"        # 한 서버의 여러 프로세스: shared_cache_path, shared_cache_mb
+#   backend = "redis"         # 여러 서버: redis_url = "redis://:비밀번호@10.0.0.5:6379/0", redis_prefix
+def get_cache_backend(cache_settings):
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = cache_settings.get("backend", "memory")
+            if kind == "memory":
+                _backend = MemoryBackend()
+            elif kind == "sqlite":
+                _backend = SQLiteBackend(
+                    path=cache_settings.get("shared_cache_path", DEFAULT_SHARED_CACHE_PATH),
+                    max_bytes=int(float(cache_settings.get("shared_cache_mb", MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+                )
+            elif kind == "redis":
+                _backend = RedisBackend(cache_settings["redis_url"], prefix=cache_settings.get("redis_prefix", "students:"))
+            else:
+                raise ValueError(f"알 수 없는 캐시 저장소: {kind}")
+        return _backend
@@ -0,0 +1,101 @@
+import threading
+
+CONTEXT_TOKENS = 3000  # 시스템 프롬프트 + 이전 대화 + 새 질문에 쓸 최대 토큰 수
+REPLY_TOKENS = 800  # 답 하나의 최대 토큰 수 (max_tokens)
+SUMMARY_TOKENS = 400  # 잘려 나간 이전 대화를 줄여 담을 최대 토큰 수
+SUMMARY_LINE_CHARS = 80  # 요약에 남길 한 턴의 앞부분 글자 수
+MAX_TURNS = 40  # 한 대화에서 학생이 보낼 수 있는 최대 질문 수
+MESSAGE_OVERHEAD = 4  # 메시지마다 역할 표시 등으로 더해지는 토큰 수
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+# tiktoken이 설치되어 있으면 모델의 토크나이저를, 없거나 불러오지 못하면 None을 돌려줍니다
+def _encoder(model):
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                import tiktoken
+
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except Exception:
+                _encoders[model] = None  # 미설치이거나 인코딩 파일을 받을 수 없는 환경
+        return _encoders[model]
+
+
+# 글의 토큰 수를 셉니다 (tiktoken이 없으면 한글 한 글자 1토큰, 그 밖의 글자 4개 1토큰으로 넉넉히 어림)
+def count_tokens(text, model="gpt-4o-mini"):
+    encoder = _encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    wide = sum(1 for ch in text if ord(ch) > 0x7F)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def message_tokens(message, model="gpt-4o-mini"):
+    return count_tokens(message["content"], model) + MESSAGE_OVERHEAD
+
+
+# 잘려 나간 턴들을 앞부분만 남긴 줄 목록으로 줄여 시스템 메시지 하나로 만듭니다 (추가 모델 호출 없음)
+def _summary_message(turns, budget, model):
+    lines = []
+    for turn in turns:
+        speaker = "학생" if turn["role"] == "user" else "AI"
+        content = " ".join(turn["content"].split())
+        if len(content) > SUMMARY_LINE_CHARS:
+            content = content[:SUMMARY_LINE_CHARS] + "…"
+        lines.append(f"- {speaker}: {content}")
+    # 예산을 넘으면 오래된 줄부터 버립니다
+    header = f"(앞선 대화 {len(turns)}개 메시지를 줄인 기록)"
+    while lines and count_tokens("\n".join([header] + lines), model) + MESSAGE_OVERHEAD > budget:
+        lines.pop(0)
+    if not lines:
+        return None
+    return {"role": "system", "content": "\n".join([header] + lines)}
+
+
+# 시스템 프롬프트와 대화 기록(turns: {"role", "content"} 목록, 마지막이 새 질문)을 토큰 예산에 맞춰 메시지로 만듭니다
+# 최근 턴부터 예산이 허락하는 만큼 그대로 담고, 그보다 오래된 턴은 짧게 줄인 기록 하나로 대신합니다.
+# 대화가 길어져도 요청 크기가 일정하므로 지연 시간과 비용이 늘지 않습니다. (메시지 목록, 줄인 턴 수)를 반환합니다.
+def fit_messages(system_prompt, turns, budget=CONTEXT_TOKENS, summary_budget=SUMMARY_TOKENS, model="gpt-4o-mini"):
+    system = {"role": "system", "content": system_prompt}
+    remaining = budget - message_tokens(system, model)
+    kept = []
+    for turn in reversed(turns):
+        cost = message_tokens(turn, model)
+        # 새 질문은 예산을 넘더라도 항상 보냅니다
+        if kept and cost > remaining - min(summary_budget, remaining // 2):
+            break
+        kept.append(turn)
+        remaining -= cost
+    kept.reverse()
+    dropped = turns[:len(turns) - len(kept)]
+    # 맨 앞이 AI 답이면 질문 없이 답만 남으므로 함께 줄입니다
+    while kept[:-1] and kept[0]["role"] != "user":
+        dropped.append(kept.pop(0))
+    messages = [system]
+    if dropped:
+        summary = _summary_message(dropped, min(summary_budget, max(0, remaining)), model)
+        if summary is not None:
+            messages.append(summary)
+    return messages + kept, len(dropped)
+
+
+# 교사에게 보낼 대화 전문
+def transcript_text(turns, student_name):
+    lines = []
+    for turn in turns:
+        speaker = student_name if turn["role"] == "user" else "AI"
+        lines.append(f"[{speaker}]\n{turn['content']}")
+    return "\n\n".join(lines)
+
+
+# secrets.toml의 [chat] 설정 (context_tokens, reply_tokens, summary_tokens, max_turns)
+def chat_options(chat_settings):
+    return {
+        "budget": int(chat_settings.get("context_tokens", CONTEXT_TOKENS)),
+        "summary_budget": int(chat_settings.get("summary_tokens", SUMMARY_TOKENS)),
+        "reply_tokens": int(chat_settings.get("reply_tokens", REPLY_TOKENS)),
+        "max_turns": int(chat_settings.get("max_turns", MAX_TURNS)),
+    }
@@ -0,0 +1,168 @@
+import contextlib
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+from core.messages import build_digest_message
+from core import DATA_DIR
+
+DEFAULT_DIGEST_PATH = DATA_DIR / "digest.sqlite3"
+MAX_ITEMS = 30  # 한 요약 메일에 담을 최대 결과 수
+MAX_WAIT = 600  # 초 단위, 첫 결과가 들어온 뒤 이 시간이 지나면 모인 만큼 보냅니다
+MAX_ATTACHMENT_BYTES = 15 * 1024 * 1024  # Gmail 첨부 한도(25MB)보다 여유 있게
+CHECK_INTERVAL = 15  # 초 단위
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    teacher_email TEXT NOT NULL,
+    setting_name TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    attachment_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS digest_group ON digest_items (teacher_email, setting_name);
+CREATE TABLE IF NOT EXISTS digest_attachments (
+    item_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS digest_attachment_item ON digest_attachments (item_id);
+"""
+
+
+# 교사 이메일과 활동 코드별로 학생 결과를 모아 두었다가 요약 메일 한 통으로 보내는 버퍼
+# 모인 결과 수나 첨부 크기가 기준을 넘거나, 첫 결과 이후 일정 시간이 지나면 발송 대기열로 넘깁니다.
+# 모으는 중인 결과도 SQLite에 저장되므로 서버를 다시 시작해도 사라지지 않습니다.
+# 묶음을 읽고 지우는 일은 한 쓰기 트랜잭션(BEGIN IMMEDIATE) 안에서 하므로, 여러 프로세스가 같은 파일을 써도 요약 메일은 한 통만 나갑니다.
+class DigestBuffer:
+    def __init__(self, outbox, sender, path=DEFAULT_DIGEST_PATH, max_items=MAX_ITEMS, max_wait=MAX_WAIT,
+                 max_attachment_bytes=MAX_ATTACHMENT_BYTES):
+        self.outbox = outbox
+        self.sender = sender
+        self.path = pathlib.Path(path)
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.max_attachment_bytes = max_attachment_bytes
+        self.flush_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # 결과 하나를 버퍼에 넣고, 기준을 넘으면 바로 요약 메일을 만듭니다
+    def add(self, teacher_email, setting_name, student_name, fields, attachments=()):
+        attachment_bytes = sum(len(data) for _, data, _ in attachments)
+        with self._lock, self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cursor = db.execute(
+                "INSERT INTO digest_items (created_at, teacher_email, setting_name, student_name, fields, attachment_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), teacher_email, setting_name, student_name, json.dumps(fields, ensure_ascii=False), attachment_bytes),
+            )
+            db.executemany(
+                "INSERT INTO digest_attachments (item_id, filename, mime_type, data) VALUES (?, ?, ?, ?)",
+                [(cursor.lastrowid, filename, mime_type, data) for filename, data, mime_type in attachments],
+            )
+            count, total_bytes = db.execute(
+                "SELECT COUNT(*), SUM(attachment_bytes) FROM digest_items WHERE teacher_email = ? AND setting_name = ?",
+                (teacher_email, setting_name),
+            ).fetchone()
+            if count >= self.max_items or total_bytes >= self.max_attachment_bytes:
+                self._flush_group(db, teacher_email, setting_name)
+
+    def _flush_group(self, db, teacher_email, setting_name):
+        rows = db.execute(
+            "SELECT id, student_name, fields FROM digest_items WHERE teacher_email = ? AND setting_name = ? ORDER BY id",
+            (teacher_email, setting_name),
+        ).fetchall()
+        if not rows:
+            return
+        items = []
+        for item_id, student_name, fields in rows:
+            attachments = db.execute(
+                "SELECT filename, data, mime_type FROM digest_attachments WHERE item_id = ?", (item_id,)
+            ).fetchall()
+            items.append({"student_name": student_name, "fields": json.loads(fields), "attachments": attachments})
+
+        # 같은 트랜잭션 안에서 먼저 지우고 발송 대기열에 넣습니다 (대기열에 넣다가 실패하면 함께 되돌아감)
+        ids = [(row[0],) for row in rows]
+        db.executemany("DELETE FROM digest_attachments WHERE item_id = ?", ids)
+        db.executemany("DELETE FROM digest_items WHERE id = ?", ids)
+        self.outbox.enqueue(build_digest_message(self.sender, teacher_email, setting_name, items))
+        self.flush_count += 1
+
+    # 첫 결과가 max_wait보다 오래된 묶음을 보냅니다 (all_groups=True면 모두 보냄)
+    def flush(self, all_groups=False):
+        deadline = time.time() if all_groups else time.time() - self.max_wait
+        with self._lock, self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            groups = db.execute(
+                "SELECT teacher_email, setting_name FROM digest_items GROUP BY teacher_email, setting_name "
+                "HAVING MIN(created_at) <= ?",
+                (deadline,),
+            ).fetchall()
+            for teacher_email, setting_name in groups:
+                self._flush_group(db, teacher_email, setting_name)
+        return len(groups)
+
+    def pending(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM digest_items").fetchone()[0]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="email-digest", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+
+
+_digest = None
+_digest_lock = threading.Lock()
+
+
+# secrets.toml의 [email.digest] 설정으로 요약 메일 버퍼를 만듭니다 (enabled가 아니면 None)
+#   [email.digest]
+#   enabled = true
+#   max_items = 30            # 이 수만큼 모이면 바로 발송
+#   max_wait_minutes = 10     # 첫 결과 이후 이 시간이 지나면 발송
+#   max_attachment_mb = 15    # 첨부 합계가 이 크기를 넘으면 바로 발송
+def get_digest(email_settings, outbox):
+    global _digest
+    digest_settings = email_settings.get("digest") or {}
+    if not digest_settings.get("enabled", False):
+        return None
+    with _digest_lock:
+        if _digest is None:
+            _digest = DigestBuffer(
+                outbox,
+                email_settings["address"],
+                path=digest_settings.get("path", DEFAULT_DIGEST_PATH),
+                max_items=int(digest_settings.get("max_items", MAX_ITEMS)),
+                max_wait=float(digest_settings.get("max_wait_minutes", MAX_WAIT / 60)) * 60,
+                max_attachment_bytes=int(float(digest_settings.get("max_attachment_mb", MAX_ATTACHMENT_BYTES / 1024 / 1024)) * 1024 * 1024),
+            ).start()
+        return _digest
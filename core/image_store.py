@@ -0,0 +1,259 @@
+import contextlib
+import hashlib
+import io
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from core import DATA_DIR
+
+DEFAULT_IMAGE_DIR = DATA_DIR / "images"
+RETENTION_DAYS = 30
+MAX_BYTES = 2 * 1024 * 1024 * 1024
+THUMBNAIL_EDGE = 256
+PIN_TTL = 3 * 3600  # 초 단위, 세션이 고정한 이미지를 지우지 않고 두는 시간 (다시 고정하면 연장)
+PRUNE_INTERVAL = 3600  # 초 단위, 보관 기간이 지난 이미지를 정리하는 간격
+PRUNE_BATCH = 100  # 크기 한도를 넘었을 때 한 번에 살펴볼 오래된 이미지 수
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_lru ON images (last_access);
+CREATE TABLE IF NOT EXISTS generations (
+    request_key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_digest ON generations (digest);
+-- 전체 크기를 트리거로 따로 들고 있어, 저장할 때마다 표 전체를 훑지 않고 한도를 확인합니다 (여러 프로세스가 써도 정확)
+CREATE TABLE IF NOT EXISTS images_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS images_total_insert AFTER INSERT ON images
+BEGIN UPDATE images_total SET bytes = bytes + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS images_total_delete AFTER DELETE ON images
+BEGIN UPDATE images_total SET bytes = bytes - OLD.size WHERE id = 0; END;
+INSERT OR IGNORE INTO images_total (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM images;
+"""
+
+
+# 같은 모델, 프롬프트(주제 + 형용사), 크기, 품질 조합을 가리키는 키
+# variant는 같은 조합을 여러 장 만들 때의 순번으로, 0이면 기존 키와 같습니다.
+def generation_key(model, prompt, size, quality, variant=0):
+    parts = [model, prompt, size, quality] + ([str(variant)] if variant else [])
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+
+# 생성된 이미지를 내용 해시(sha256)로 저장하는 로컬 저장소
+# OpenAI가 주는 URL은 한 시간쯤 뒤 만료되므로 이미지를 한 번만 받아 두고, 화면, 다운로드, 이메일에 모두 이 파일을 씁니다.
+# 전체 크기가 한도를 넘으면 저장할 때 바로, 보관 기간이 지난 이미지는 백그라운드 작업자가 주기적으로 오래 쓰지 않은 것부터 지웁니다.
+# shared가 여러 서버가 함께 쓰는 저장소(Redis)면 조합 -> 해시 기록과 이미지도 함께 올려, 다른 서버가 같은 조합을 다시 만들지 않게 합니다.
+class ImageStore:
+    def __init__(self, root=DEFAULT_IMAGE_DIR, retention_days=RETENTION_DAYS, max_bytes=MAX_BYTES, shared=None):
+        self.root = pathlib.Path(root)
+        self.retention = retention_days * 24 * 3600
+        self.max_bytes = max_bytes
+        self.shared = shared if shared is not None and shared.wider_than("host") else None
+        self.dedup_hits = 0
+        self._pins = {}  # 세션 id -> (만료 시각, 고정한 digest 집합)
+        self._pins_lock = threading.Lock()
+        self._thread = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.root / "index.sqlite3", timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _path(self, digest, suffix=".png"):
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def _thumb_path(self, digest):
+        return self._path(digest, "_thumb.jpg")
+
+    # 다른 프로세스가 반쯤 쓴 파일을 읽지 않도록 임시 파일에 쓴 뒤 이름을 바꿉니다
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    # 이미지를 저장하고 내용 해시를 반환 (이미 있으면 다시 쓰지 않음)
+    def put(self, data, share=True):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            if share and self.shared is not None:
+                self.shared.set(f"image:{digest}", data, self.retention)
+            self._write(path, data)
+            img = Image.open(io.BytesIO(data))
+            img.thumbnail((THUMBNAIL_EDGE, THUMBNAIL_EDGE))
+            buffer = io.BytesIO()
+            img.convert("RGB").save(buffer, format="JPEG", quality=80)
+            self._write(self._thumb_path(digest), buffer.getvalue())
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO images (digest, size, created_at, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET last_access = excluded.last_access",
+                (digest, len(data), now, now),
+            )
+            over_limit = self._total(db) > self.max_bytes
+        if over_limit:
+            self.prune()
+        return digest
+
+    def get(self, digest):
+        try:
+            data = self._path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+        with self._connect() as db:
+            db.execute("UPDATE images SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        return data
+
+    def thumbnail(self, digest):
+        try:
+            return self._thumb_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    # 같은 조합으로 이미 만든 이미지가 있으면 그 해시를 반환
+    def lookup(self, request_key):
+        with self._connect() as db:
+            row = db.execute("SELECT digest FROM generations WHERE request_key = ?", (request_key,)).fetchone()
+        if row is None or not self._path(row[0]).exists():
+            row = self._fetch_shared(request_key)
+            if row is None:
+                return None
+        self.dedup_hits += 1
+        return row[0]
+
+    # 다른 서버가 만든 이미지면 받아서 이 서버의 저장소에 넣습니다
+    def _fetch_shared(self, request_key):
+        if self.shared is None:
+            return None
+        digest = self.shared.get_text(f"generation:{request_key}")
+        if digest is None:
+            return None
+        if not self._path(digest).exists():
+            data = self.shared.get(f"image:{digest}")
+            if data is None or hashlib.sha256(data).hexdigest() != digest:
+                return None
+            self.put(data, share=False)
+        self.remember(request_key, digest, share=False)
+        return (digest,)
+
+    def remember(self, request_key, digest, share=True):
+        if share and self.shared is not None:
+            self.shared.set_text(f"generation:{request_key}", digest, self.retention)
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO generations (request_key, digest, created_at) VALUES (?, ?, ?)",
+                (request_key, digest, time.time()),
+            )
+
+    # 세션 화면에 걸려 있는 이미지(보고 있는 이미지, 고를 이미지, 만든 이미지 목록)는 정리할 때 지우지 않습니다
+    # 세션마다 마지막으로 고정한 목록만 유지하고, ttl 동안 다시 고정하지 않으면 풀립니다.
+    def pin(self, owner, digests, ttl=PIN_TTL):
+        with self._pins_lock:
+            if digests:
+                self._pins[owner] = (time.monotonic() + ttl, frozenset(digests))
+            else:
+                self._pins.pop(owner, None)
+
+    def _pinned(self):
+        now = time.monotonic()
+        with self._pins_lock:
+            for owner in [owner for owner, (expires_at, _) in self._pins.items() if expires_at <= now]:
+                del self._pins[owner]
+            return frozenset().union(*(digests for _, digests in self._pins.values()))
+
+    def _total(self, db):
+        return db.execute("SELECT bytes FROM images_total WHERE id = 0").fetchone()[0]
+
+    def _delete(self, db, digest):
+        for path in (self._path(digest), self._thumb_path(digest)):
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+        db.execute("DELETE FROM images WHERE digest = ?", (digest,))
+        db.execute("DELETE FROM generations WHERE digest = ?", (digest,))
+
+    # 보관 기간이 지난 이미지와 크기 한도를 넘는 오래된 이미지를 지웁니다 (세션이 고정한 이미지는 제외)
+    def prune(self):
+        pinned = self._pinned()
+        with self._connect() as db:
+            expired = db.execute("SELECT digest FROM images WHERE last_access < ?",
+                                 (time.time() - self.retention,)).fetchall()
+            for (digest,) in expired:
+                if digest not in pinned:
+                    self._delete(db, digest)
+            # 한도를 넘었을 때만 가장 오래 쓰지 않은 이미지부터 조금씩 읽어 지웁니다 (고정된 이미지는 건너뛰고 다음 쪽으로)
+            total = self._total(db)
+            after = (-1.0, "")
+            while total > self.max_bytes:
+                rows = db.execute(
+                    "SELECT digest, size, last_access FROM images WHERE (last_access, digest) > (?, ?) "
+                    "ORDER BY last_access, digest LIMIT ?",
+                    (*after, PRUNE_BATCH),
+                ).fetchall()
+                if not rows:
+                    break
+                for digest, size, last_access in rows:
+                    after = (last_access, digest)
+                    if total <= self.max_bytes:
+                        break
+                    if digest in pinned:
+                        continue
+                    self._delete(db, digest)
+                    total -= size
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="image-store-prune", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.prune()
+            except (sqlite3.Error, OSError):
+                pass
+            time.sleep(PRUNE_INTERVAL)
+
+    def stats(self):
+        with self._connect() as db:
+            count, total = db.execute("SELECT COUNT(*) FROM images").fetchone()[0], self._total(db)
+        return {"images": count, "bytes": total, "max_bytes": self.max_bytes, "dedup_hits": self.dedup_hits}
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+# secrets.toml의 [images] 설정(retention_days, max_store_mb, path)으로 공용 이미지 저장소를 만듭니다
+def get_image_store(image_settings, shared=None):
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            _image_store = ImageStore(
+                root=image_settings.get("path", DEFAULT_IMAGE_DIR),
+                retention_days=float(image_settings.get("retention_days", RETENTION_DAYS)),
+                max_bytes=int(float(image_settings.get("max_store_mb", MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+                shared=shared,
+            ).start()
+        return _image_store
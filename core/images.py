@@ -0,0 +1,82 @@
+import collections
+import concurrent.futures
+import hashlib
+import io
+import time
+
+from PIL import Image, ImageOps
+
+from core.cache import TTLCache
+
+MAX_EDGE = 1600  # 픽셀, 긴 변 기준 (Gemini 분석과 교사 확인에 충분한 크기)
+FORMAT = "JPEG"  # "JPEG" 또는 "WEBP"
+QUALITY = 85
+MAX_IMAGES = 4  # 한 번에 함께 분석할 수 있는 최대 이미지 수
+
+# 전처리된 이미지: data는 Gemini 호출, 화면 미리보기, 이메일 첨부에 함께 쓰는 바이트
+PreparedImage = collections.namedtuple(
+    "PreparedImage", ["data", "mime_type", "width", "height", "original_bytes", "elapsed"]
+)
+
+# 같은 업로드가 다시 실행(rerun)될 때 다시 변환하지 않도록 결과를 잠시 보관
+_prepared_cache = TTLCache(maxsize=64, ttl=1800)
+
+
+# 업로드된 이미지를 EXIF 방향대로 돌리고, 긴 변을 max_edge 이하로 줄인 뒤 JPEG/WebP로 다시 인코딩합니다
+# 유효한 이미지가 아니면 PIL.UnidentifiedImageError가 발생합니다.
+def prepare_image(raw, max_edge=MAX_EDGE, fmt=FORMAT, quality=QUALITY):
+    fmt = fmt.upper()
+    key = (hashlib.sha256(raw).hexdigest(), max_edge, fmt, quality)
+    cached = _prepared_cache.get(key)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    img = Image.open(io.BytesIO(raw))
+    source_format = img.format
+    source_size = img.size
+    orientation = img.getexif().get(0x0112, 1)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    # JPEG는 투명도를 지원하지 않으므로 흰 배경 위에 합칩니다
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        if fmt == "JPEG":
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=quality, optimize=True)
+    data = buffer.getvalue()
+    mime_type = f"image/{fmt.lower()}"
+
+    # 이미 작고 바로 선 원본을 다시 인코딩해서 오히려 커지면 원본을 그대로 사용
+    unchanged = source_format == fmt and source_size == img.size and orientation == 1
+    if unchanged and len(data) >= len(raw):
+        data = raw
+
+    prepared = PreparedImage(data, mime_type, img.width, img.height, len(raw), time.perf_counter() - started)
+    _prepared_cache.set(key, prepared)
+    return prepared
+
+
+# 여러 장을 동시에 전처리합니다 (PIL은 디코딩과 축소 중에 GIL을 풀어 주므로 스레드로 충분)
+# 결과는 업로드한 순서대로 반환하고, 한 장이라도 유효하지 않으면 PIL.UnidentifiedImageError가 발생합니다.
+def prepare_images(raws, max_edge=MAX_EDGE, fmt=FORMAT, quality=QUALITY):
+    if len(raws) <= 1:
+        return [prepare_image(raw, max_edge, fmt, quality) for raw in raws]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(raws), MAX_IMAGES), thread_name_prefix="prepare") as pool:
+        return list(pool.map(lambda raw: prepare_image(raw, max_edge, fmt, quality), raws))
+
+
+# secrets.toml의 [vision] 설정(max_edge, format, quality)으로 prepare_image 인자를 만듭니다
+def image_options(vision_settings):
+    return {
+        "max_edge": int(vision_settings.get("max_edge", MAX_EDGE)),
+        "fmt": vision_settings.get("format", FORMAT),
+        "quality": int(vision_settings.get("quality", QUALITY)),
+    }
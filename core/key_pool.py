@@ -0,0 +1,144 @@
+import contextlib
+import re
+import threading
+import time
+
+COOLDOWN = 60  # 초 단위, 429를 받은 키를 쉬게 하는 기본 시간
+
+
+# OpenAI의 x-ratelimit-reset-* 값("1s", "6m0s", "20ms")을 초로 변환
+def _parse_reset(value):
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value or ""):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+def _status(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_rate_limited(error):
+    return _status(error) == 429
+
+
+# 다른 키로 다시 보내 볼 만한 오류 (한도 초과, 서버 쪽 일시 오류)
+def _is_retryable(error):
+    status = _status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# 여러 API 키에 요청을 나눠 보내는 키 묶음
+# 진행 중인 요청이 가장 적은 키를 고르고(같으면 가장 오래 쉰 키), 429를 받거나 남은 한도가 0인 키는 잠시 쉬게 합니다.
+class KeyPool:
+    def __init__(self, provider, keys, cooldown=COOLDOWN):
+        if not keys:
+            raise ValueError(f"{provider} API 키가 없습니다.")
+        self.provider = provider
+        self.cooldown = cooldown
+        self._keys = {
+            key: {
+                "in_flight": 0,
+                "requests": 0,
+                "errors": 0,
+                "rate_limited": 0,
+                "cooldown_until": 0.0,
+                "remaining_requests": None,
+                "remaining_tokens": None,
+                "last_used": 0.0,
+            }
+            for key in keys
+        }
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            ready = [key for key, entry in self._keys.items() if entry["cooldown_until"] <= now]
+            if ready:
+                key = min(ready, key=lambda k: (self._keys[k]["in_flight"], self._keys[k]["last_used"]))
+            else:
+                # 모든 키가 쉬는 중이면 가장 먼저 풀리는 키를 사용
+                key = min(self._keys, key=lambda k: self._keys[k]["cooldown_until"])
+            entry = self._keys[key]
+            entry["in_flight"] += 1
+            entry["requests"] += 1
+            entry["last_used"] = now
+            return key
+
+    def release(self, key, error=None, headers=None):
+        with self._lock:
+            entry = self._keys[key]
+            entry["in_flight"] -= 1
+            if error is not None:
+                entry["errors"] += 1
+                if _is_rate_limited(error):
+                    entry["rate_limited"] += 1
+                    wait = _retry_after(error) or self.cooldown
+                    entry["cooldown_until"] = max(entry["cooldown_until"], time.monotonic() + wait)
+            if headers:
+                self._update_quota(entry, headers)
+
+    # 응답 헤더의 남은 한도를 기록하고, 다 쓴 키는 초기화 시각까지 쉬게 합니다
+    def _update_quota(self, entry, headers):
+        for name, field in (("requests", "remaining_requests"), ("tokens", "remaining_tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            if remaining is None:
+                continue
+            entry[field] = int(remaining)
+            if entry[field] <= 0:
+                reset = _parse_reset(headers.get(f"x-ratelimit-reset-{name}")) or self.cooldown
+                entry["cooldown_until"] = max(entry["cooldown_until"], time.monotonic() + reset)
+
+    @contextlib.contextmanager
+    def lease(self):
+        key = self.acquire()
+        lease = {"key": key, "headers": None}
+        try:
+            yield lease
+        except Exception as e:
+            self.release(key, error=e)
+            raise
+        self.release(key, headers=lease["headers"])
+
+    # fn(key)를 실행하고, 429나 서버 오류(5xx)를 받으면 다른 키로 다시 시도합니다 (키 수만큼)
+    # SDK 자체 재시도는 꺼 두어야 429를 받은 키가 바로 쉬고 다음 요청이 다른 키로 갑니다.
+    def call(self, fn):
+        for attempt in range(len(self._keys)):
+            try:
+                with self.lease() as lease:
+                    return fn(lease)
+            except Exception as e:
+                if not _is_retryable(e) or attempt == len(self._keys) - 1:
+                    raise
+
+    # 키별 사용량 (키는 끝 네 글자만 표시)
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": f"…{key[-4:]}",
+                    "in_flight": entry["in_flight"],
+                    "requests": entry["requests"],
+                    "errors": entry["errors"],
+                    "rate_limited": entry["rate_limited"],
+                    "cooling_down": max(0.0, entry["cooldown_until"] - now),
+                    "remaining_requests": entry["remaining_requests"],
+                    "remaining_tokens": entry["remaining_tokens"],
+                }
+                for key, entry in self._keys.items()
+            ]
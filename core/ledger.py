@@ -0,0 +1,83 @@
+import hashlib
+import threading
+
+from core.cache import TTLCache
+from core.metrics import get_metrics
+
+LEDGER_MAXSIZE = 20000
+LEDGER_TTL = 3 * 3600  # 초 단위, 한 수업 시간보다 넉넉하게
+
+
+# 지금 실행 중인 Streamlit 세션의 id (세션 밖에서 부르면 빈 문자열)
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else ""
+
+
+# 학생 제출 기록부: (세션, 활동 코드, 입력 내용 해시)마다 분석 결과와 교사에게 보냈는지를 기억합니다
+# Streamlit은 위젯을 건드릴 때마다 페이지를 처음부터 다시 실행하므로, 같은 제출이면 유료 호출과 이메일을 건너뛰고
+# 기록된 결과를 다시 보여 줍니다. 건너뛴 횟수는 종류별로 셉니다.
+class SubmissionLedger:
+    def __init__(self, maxsize=LEDGER_MAXSIZE, ttl=LEDGER_TTL):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.suppressed = {"analysis": 0, "delivery": 0}
+
+    # 입력 내용(문자열이나 바이트)을 해시해 기록부 키를 만듭니다
+    def key(self, session_id, setting_name, *parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            part = part if isinstance(part, bytes) else str(part).encode()
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return (session_id, setting_name or "", digest.hexdigest())
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {"result": None, "delivered": False}
+            self._entries.set(key, entry)
+        return entry
+
+    # 이미 분석한 제출이면 결과를 돌려주고 건너뛴 횟수를 셉니다 (처음이면 None)
+    def result(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["result"] is None:
+                return None
+            self.suppressed["analysis"] += 1
+        get_metrics().increment("duplicates_suppressed_total", kind="analysis", activity=key[1])
+        return entry["result"]
+
+    def record(self, key, result):
+        with self._lock:
+            self._entry(key)["result"] = result
+
+    # 이 제출을 교사에게 아직 보내지 않았으면 True (이미 보냈으면 건너뛴 횟수를 세고 False)
+    def should_deliver(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry["delivered"]:
+                return True
+            self.suppressed["delivery"] += 1
+        get_metrics().increment("duplicates_suppressed_total", kind="delivery", activity=key[1])
+        return False
+
+    def mark_delivered(self, key):
+        with self._lock:
+            self._entry(key)["delivered"] = True
+
+    # 기록된 결과를 더 쓸 수 없을 때(예: 저장소에서 지워진 이미지) 기록을 지워 다음에 다시 처리하게 합니다
+    def forget(self, key):
+        with self._lock:
+            self._entries.invalidate(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": self._entries.stats()["size"], "suppressed": dict(self.suppressed)}
+
+
+# 모든 페이지와 세션이 함께 쓰는 제출 기록부 (키에 세션 id가 들어 있으므로 세션끼리 섞이지 않습니다)
+ledger = SubmissionLedger()
@@ -0,0 +1,17 @@
+from core.digest import get_digest
+from core.messages import build_result_message
+from core.outbox import get_outbox
+
+
+# 학생 결과를 교사에게 전달합니다
+# 요약 메일 모드([email.digest] enabled)면 버퍼에 모으고, 아니면 결과 메일 한 통을 발송 대기열에 넣습니다.
+# attachments는 (파일 이름, 바이트, MIME 형식) 목록입니다.
+def deliver_result(email_settings, teacher_email, setting_name, student_name, subject, fields, attachments=()):
+    outbox = get_outbox(email_settings)
+    digest = get_digest(email_settings, outbox)
+    if digest is not None:
+        digest.add(teacher_email, setting_name, student_name, fields, attachments)
+        return
+    outbox.enqueue(build_result_message(
+        email_settings["address"], teacher_email, subject, student_name, fields, attachments,
+    ))
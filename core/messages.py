@@ -0,0 +1,90 @@
+import html
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+# 첨부 파일 (파일 이름, 바이트, MIME 형식)을 이메일 파트로 변환
+def attachment_part(filename, data, mime_type="application/octet-stream"):
+    maintype, _, subtype = mime_type.partition("/")
+    if maintype == "image":
+        part = MIMEImage(data, _subtype=subtype)
+    else:
+        part = MIMEApplication(data, _subtype=subtype or "octet-stream")
+    part.add_header("Content-Disposition", "attachment", filename=filename)
+    return part
+
+
+# 학생 한 명의 결과 메일 (fields는 (항목 이름, 내용) 목록)
+def build_result_message(sender, teacher_email, subject, student_name, fields, attachments=()):
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = teacher_email
+    msg["Subject"] = subject
+
+    body = f"학생 이름: {student_name}\n\n"
+    body += "".join(f"{label}:\n{value}\n\n" for label, value in fields)
+    msg.attach(MIMEText(body, "plain"))
+
+    for filename, data, mime_type in attachments:
+        msg.attach(attachment_part(filename, data, mime_type))
+    return msg
+
+
+# 여러 학생의 결과를 표 하나로 묶은 요약 메일 (items는 DigestBuffer가 모은 항목 목록)
+def build_digest_message(sender, teacher_email, setting_name, items):
+    msg = MIMEMultipart("mixed")
+    msg["From"] = sender
+    msg["To"] = teacher_email
+    msg["Subject"] = f"[{setting_name}] 학생 활동 결과 모음 ({len(items)}건)"
+
+    labels = []
+    for item in items:
+        for label, _ in item["fields"]:
+            if label not in labels:
+                labels.append(label)
+
+    def cell(value):
+        return html.escape(str(value)).replace("\n", "<br>")
+
+    header = "".join(f"<th>{cell(label)}</th>" for label in ["학생 이름"] + labels + ["첨부"])
+    rows = []
+    plain = []
+    for item in items:
+        values = dict(item["fields"])
+        files = ", ".join(filename for filename, _, _ in item["attachments"])
+        cells = [item["student_name"]] + [values.get(label, "") for label in labels] + [files]
+        rows.append("<tr>" + "".join(f"<td>{cell(value)}</td>" for value in cells) + "</tr>")
+        plain.append(f"학생 이름: {item['student_name']}\n" + "".join(f"{label}: {value}\n" for label, value in item["fields"]))
+
+    body = MIMEMultipart("alternative")
+    body.attach(MIMEText("\n".join(plain), "plain"))
+    body.attach(MIMEText(
+        f"<p>활동 코드 <b>{cell(setting_name)}</b>의 결과 {len(items)}건입니다.</p>"
+        f'<table border="1" cellspacing="0" cellpadding="4"><tr>{header}</tr>{"".join(rows)}</table>',
+        "html",
+    ))
+    msg.attach(body)
+
+    for item in items:
+        for filename, data, mime_type in item["attachments"]:
+            msg.attach(attachment_part(f"{item['student_name']}_{filename}", data, mime_type))
+    return msg
+
+
+# 교사 일괄 분석 결과 메일: 학생별 결과 표와 CSV 보고서 첨부 (results는 core.batch.run_batch의 결과)
+def build_batch_message(sender, teacher_email, setting_name, results, report_csv):
+    items = [
+        {
+            "student_name": result["student_name"],
+            "fields": [("파일 이름", result["filename"]), ("AI 분석 결과", result["text"] or f"오류: {result['error']}")],
+            "attachments": [],
+        }
+        for result in results
+    ]
+    msg = build_digest_message(sender, teacher_email, setting_name, items)
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    msg.replace_header("Subject", f"[{setting_name}] 이미지 일괄 분석 결과 ({succeeded}/{len(results)}건 완료)")
+    msg.attach(attachment_part(f"{setting_name}_report.csv", report_csv, "text/csv"))
+    return msg
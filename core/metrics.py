@@ -0,0 +1,304 @@
+import contextlib
+import copy
+import json
+import os
+import pathlib
+import threading
+import time
+
+from core import DATA_DIR
+
+DEFAULT_LOG_PATH = DATA_DIR / "metrics.jsonl"
+DEFAULT_PROMETHEUS_PATH = DATA_DIR / "metrics.prom"
+LOG_MAX_BYTES = 50 * 1024 * 1024  # 넘으면 metrics.jsonl.1로 옮기고 새 파일에 기록
+EXPORT_INTERVAL = 15  # 초 단위, Prometheus 파일을 다시 쓰는 주기
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # 초 단위 구간
+
+# 예상 비용 계산용 기본 단가 (USD, 토큰은 100만 개당, 이미지는 한 장당)
+# 단가가 바뀌면 secrets.toml의 [metrics.prices."모델 이름"]에서 input, output, image로 덮어씁니다.
+PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gemini-1.5-flash": {"input": 0.075, "output": 0.30},
+    "dall-e-3": {"image": 0.04},
+}
+
+
+def _label_text(labels):
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# 단계별 시간, 횟수, 토큰 사용량을 모으는 계측기
+# 모든 기록은 JSONL 로그에 한 줄씩 남기고, 누적 값은 Prometheus 텍스트 형식 파일로 주기적으로 내보냅니다.
+# (Streamlit은 별도 HTTP 경로를 열 수 없으므로 node_exporter의 textfile collector가 이 파일을 읽게 합니다.)
+class Metrics:
+    def __init__(self, log_path=DEFAULT_LOG_PATH, prometheus_path=DEFAULT_PROMETHEUS_PATH,
+                 log_max_bytes=LOG_MAX_BYTES, export_interval=EXPORT_INTERVAL):
+        self.log_path = pathlib.Path(log_path)
+        self.prometheus_path = pathlib.Path(prometheus_path) if prometheus_path else None
+        self.log_max_bytes = log_max_bytes
+        self.export_interval = export_interval
+        self._counters = {}  # (이름, 라벨) -> 값
+        self._histograms = {}  # (이름, 라벨) -> [구간별 개수..., 합계, 개수]
+        self._gauges = {}  # 이름 -> 현재 값을 돌려주는 함수
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._thread = None
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    # 내보낼 때마다 fn()을 호출해 현재 값을 기록합니다 (예: 발송 대기 중인 메일 수)
+    def register_gauge(self, name, fn):
+        with self._lock:
+            self._gauges[name] = fn
+
+    def log(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._log_lock:
+            try:
+                if self.log_path.exists() and self.log_path.stat().st_size > self.log_max_bytes:
+                    os.replace(self.log_path, self.log_path.with_name(self.log_path.name + ".1"))
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    # 한 단계(Notion 조회, 모델 호출, 메일 발송 등)의 소요 시간과 결과를 기록합니다
+    # usage에는 input_tokens, output_tokens, images 같은 사용량과 ttft, cached 같은 부가 정보를 넣습니다.
+    def record_stage(self, stage, activity, seconds, ok=True, provider=None, model=None, usage=None):
+        activity = activity or ""
+        usage = usage or {}
+        labels = {"stage": stage, "activity": activity}
+        if model:
+            labels["model"] = model
+        self.observe("stage_duration_seconds", seconds, **labels)
+        self.increment("stage_total", outcome="ok" if ok else "error", **labels)
+        for field in ("input_tokens", "output_tokens"):
+            if usage.get(field):
+                self.increment("tokens_total", usage[field], activity=activity, model=model or "",
+                               direction=field.split("_")[0])
+        if usage.get("images"):
+            self.increment("images_total", usage["images"], activity=activity, model=model or "")
+        self.log({
+            "ts": time.time(), "type": "stage", "stage": stage, "activity": activity,
+            "provider": provider, "model": model, "seconds": round(seconds, 4), "ok": ok, **usage,
+        })
+
+    # with metrics.stage("model", setting_name, "openai", "gpt-4o-mini") as usage: ...
+    # 블록 안에서 usage 사전에 사용량을 채우면 블록이 끝날 때 시간과 함께 기록됩니다.
+    @contextlib.contextmanager
+    def stage(self, stage, activity=None, provider=None, model=None):
+        usage = {}
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield usage
+            ok = True
+        finally:
+            self.record_stage(stage, activity, time.perf_counter() - started, ok, provider, model, usage)
+
+    def prometheus_text(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            gauges = dict(self._gauges)
+        lines = []
+        for metric in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE students_{metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"students_{name}{_label_text(labels)} {value}")
+        for metric in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE students_{metric} histogram")
+            for (name, labels), histogram in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                for bound, count in zip(BUCKETS, histogram):
+                    lines.append(f"students_{name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+                lines.append(f"students_{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"students_{name}_sum{_label_text(labels)} {histogram[-2]:.6f}")
+                lines.append(f"students_{name}_count{_label_text(labels)} {histogram[-1]}")
+        for name, fn in sorted(gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is not None:
+                lines.append(f"# TYPE students_{name} gauge")
+                lines.append(f"students_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # 읽는 쪽이 반쯤 쓰인 파일을 보지 않도록 임시 파일에 쓴 뒤 바꿔치기합니다
+    def export(self):
+        if self.prometheus_path is None:
+            return
+        temp_path = self.prometheus_path.with_name(self.prometheus_path.name + ".tmp")
+        try:
+            temp_path.write_text(self.prometheus_text(), encoding="utf-8")
+            os.replace(temp_path, self.prometheus_path)
+        except OSError:
+            pass
+
+    def start(self):
+        if self._thread is None and self.prometheus_path is not None:
+            self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.export_interval)
+            self.export()
+
+
+# 로그 파일별로 이미 읽은 위치와 단계 기록(필요한 값만 담은 튜플)을 보관합니다
+# 교사용 대시보드는 위젯을 누를 때마다 다시 실행되므로, 그 사이 새로 붙은 줄만 읽습니다.
+# 파일이 회전되었거나(다른 inode) 줄어들었으면 처음부터 다시 읽습니다.
+class _LogTail:
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.events = []  # (ts, activity, stage, seconds, ok, cached, ttft, model, input_tokens, output_tokens, images)
+        self.summaries = {}  # (inode, offset, since, 단가표) -> 요약
+        self.lock = threading.Lock()
+
+    def read(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self.inode, self.offset, self.events = None, 0, []
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode, self.offset, self.events = stat.st_ino, 0, []
+        if stat.st_size == self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        # 아직 쓰는 중인 마지막 줄은 다음에 읽습니다
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("type") != "stage":
+                continue
+            self.events.append((
+                event.get("ts", 0), event.get("activity", ""), event["stage"], event["seconds"], event.get("ok", True),
+                bool(event.get("cached")), event.get("ttft"), event.get("model") or "", event.get("input_tokens") or 0,
+                event.get("output_tokens") or 0, event.get("images") or 0,
+            ))
+        self.offset += end
+
+
+_tails = {}
+_tails_lock = threading.Lock()
+
+
+def _summarize(events, since, prices):
+    activities = {}
+    for ts, activity, stage, seconds, ok, cached, ttft, model, input_tokens, output_tokens, images in events:
+        if since and ts < since:
+            continue
+        summary = activities.setdefault(activity, {
+            "stages": {}, "errors": 0, "cached": 0, "input_tokens": 0, "output_tokens": 0, "images": 0,
+            "cost": 0.0, "ttft": [],
+        })
+        summary["stages"].setdefault(stage, []).append(seconds)
+        if not ok:
+            summary["errors"] += 1
+        if cached:
+            summary["cached"] += 1
+        if ttft is not None:
+            summary["ttft"].append(ttft)
+        price = prices.get(model, {})
+        summary["input_tokens"] += input_tokens
+        summary["output_tokens"] += output_tokens
+        summary["images"] += images
+        summary["cost"] += (input_tokens * price.get("input", 0) + output_tokens * price.get("output", 0)) / 1_000_000
+        summary["cost"] += images * price.get("image", 0)
+
+    for summary in activities.values():
+        summary["stages"] = {
+            stage: {"count": len(values), "avg": sum(values) / len(values), "p95": _percentile(values, 0.95)}
+            for stage, values in summary["stages"].items()
+        }
+        ttft = summary.pop("ttft")
+        summary["ttft_avg"] = sum(ttft) / len(ttft) if ttft else None
+    return activities
+
+
+# JSONL 로그를 읽어 활동 코드별로 단계 시간, 토큰, 이미지 수, 예상 비용을 요약합니다
+# since(유닉스 시각) 이후의 기록만 사용하고, prices는 PRICES 형식의 단가표입니다.
+# 지난번 호출 뒤에 새로 붙은 줄만 읽고, 로그와 조건이 그대로면 지난 요약을 그대로 돌려줍니다.
+def summarize_log(path=DEFAULT_LOG_PATH, since=None, prices=None):
+    prices = prices or PRICES
+    path = pathlib.Path(path)
+    with _tails_lock:
+        tail = _tails.get(path)
+        if tail is None:
+            tail = _tails[path] = _LogTail(path)
+    with tail.lock:
+        tail.read()
+        key = (tail.inode, tail.offset, since, json.dumps(prices, sort_keys=True))
+        summary = tail.summaries.get(key)
+        if summary is None:
+            summary = _summarize(tail.events, since, prices)
+            tail.summaries = {key: summary}
+        return copy.deepcopy(summary)
+
+
+# secrets.toml의 [metrics.prices]를 기본 단가표에 덮어씁니다
+def price_table(metrics_settings):
+    prices = {model: dict(price) for model, price in PRICES.items()}
+    for model, price in metrics_settings.get("prices", {}).items():
+        prices.setdefault(model, {}).update(price)
+    return prices
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+# secrets.toml의 [metrics] 설정(log_path, prometheus_path, export_interval)으로 프로세스 전체가 공유하는 계측기를 만듭니다
+# 설정 없이 호출하면(예: 백그라운드 작업자) 이미 만든 계측기나 기본값을 사용합니다.
+# prometheus_path를 빈 문자열로 두면 Prometheus 파일을 쓰지 않습니다.
+def get_metrics(metrics_settings=None):
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            metrics_settings = metrics_settings or {}
+            _metrics = Metrics(
+                log_path=metrics_settings.get("log_path", DEFAULT_LOG_PATH),
+                prometheus_path=metrics_settings.get("prometheus_path", DEFAULT_PROMETHEUS_PATH),
+                export_interval=float(metrics_settings.get("export_interval", EXPORT_INTERVAL)),
+            ).start()
+        return _metrics
@@ -0,0 +1,214 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+PAGE_KINDS = ("vision", "text", "image")
+QUOTA_FIELDS = ("token_quota", "image_quota", "student_token_quota", "student_image_quota")
+
+# Notion은 통합(API 키)마다 평균 초당 약 3회 요청을 허용합니다
+RATE_PER_SECOND = 3
+BURST = 3
+CONNECT_TIMEOUT = 3.05  # 초 단위
+READ_TIMEOUT = 10  # 초 단위
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # 초 단위
+BACKOFF_MAX = 8  # 초 단위
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# API 키나 데이터베이스 id가 잘못되어 기다려도 해결되지 않을 때 보여 줄 안내
+NOTION_CONFIG_ERROR = "⚠️ 활동 설정을 불러올 수 없습니다. Notion 연결 설정(API 키, 데이터베이스)을 확인해 주세요."
+
+
+# 재시도 후에도 Notion 요청이 실패했을 때 발생하는 예외
+# status_code는 HTTP 응답 코드이며, 연결 자체가 안 됐으면 None입니다.
+class NotionError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    # 요청이 몰렸거나 서버/네트워크 문제라 잠시 뒤 다시 시도하면 될 수 있으면 True (400/401/404 같은 설정 문제는 False)
+    @property
+    def retryable(self):
+        return self.status_code is None or self.status_code in RETRY_STATUS
+
+
+# 토큰 버킷 방식의 요청 속도 제한기 (여러 스레드가 함께 사용)
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # 토큰을 하나 얻을 때까지 기다리고, 기다린 시간을 반환
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - started
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# rich_text 속성의 글자를 모두 이어 붙여 반환 (비어 있으면 None)
+def _rich_text(properties, name):
+    prop = properties.get(name) or {}
+    parts = prop.get("rich_text") or []
+    text = "".join(part.get("plain_text", "") for part in parts)
+    return text or None
+
+
+# number 속성 값 (글자로 적은 숫자도 허용, 비어 있거나 숫자가 아니면 None)
+def _number(properties, name):
+    prop = properties.get(name) or {}
+    if prop.get("number") is not None:
+        return prop["number"]
+    text = _rich_text(properties, name)
+    try:
+        return int(text.replace(",", "")) if text else None
+    except ValueError:
+        return None
+
+
+# checkbox 속성 값 (속성이 없으면 None)
+def _checkbox(properties, name):
+    prop = properties.get(name) or {}
+    return prop.get("checkbox")
+
+
+# Notion 설정 행 하나를 (setting_name, 페이지 종류) 키와 간단한 레코드로 변환
+# 한 행의 page 값에 여러 종류가 들어 있으면 종류마다 키를 만듭니다.
+def parse_setting_row(result):
+    properties = result.get("properties", {})
+    setting_name = _rich_text(properties, "setting_name")
+    page_text = (_rich_text(properties, "page") or "").lower()
+    if not setting_name or not page_text:
+        return []
+
+    record = {
+        "page_id": result.get("id"),
+        "prompt": _rich_text(properties, "prompt"),
+        "teacher_email": _rich_text(properties, "email"),
+        # 하루 사용량 한도 (token_quota, image_quota, student_token_quota, student_image_quota 열, 없으면 제한 없음)
+        "quotas": {name: _number(properties, name) for name in QUOTA_FIELDS if _number(properties, name) is not None},
+        # 비슷한 답 재사용 (answer_cache 체크박스를 끄면 이 활동은 항상 새로 생성, answer_cache_minutes는 보관 시간)
+        "answer_cache": {"enabled": _checkbox(properties, "answer_cache"), "ttl_minutes": _number(properties, "answer_cache_minutes")},
+        "last_edited_time": result.get("last_edited_time"),
+    }
+    return [((setting_name, kind), record) for kind in PAGE_KINDS if kind in page_text]
+
+
+# 연결을 재사용하고 요청 속도를 제한하는 공용 Notion 클라이언트
+class NotionClient:
+    def __init__(self, api_key, base_url=NOTION_API_URL, rate=RATE_PER_SECOND, burst=BURST,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, pool_size=20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.limiter = TokenBucket(rate, burst)
+        self.request_count = 0
+        self.retry_count = 0
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION,
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    # 재시도 전에 기다릴 시간: Retry-After가 있으면 따르고, 없으면 지수 백오프에 무작위 지터를 더합니다
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, BACKOFF_BASE)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method, path, payload=None):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self.request_count += 1
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self._session.request(method, url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise NotionError(f"Notion 서버에 연결하지 못했습니다: {e}") from e
+                self.retry_count += 1
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS and not last_attempt:
+                self.retry_count += 1
+                time.sleep(self._backoff(attempt, response))
+                continue
+            if response.status_code != 200:
+                raise NotionError(f"Notion 요청이 실패했습니다 ({response.status_code})", response.status_code)
+            return response.json()
+
+    def query_database(self, database_id, payload):
+        return self.request("POST", f"databases/{database_id}/query", payload)
+
+    # 페이지네이션을 따라가며 조건에 맞는 행을 모두 가져옵니다
+    def iter_database(self, database_id, query_filter=None):
+        payload = {"page_size": 100}
+        if query_filter:
+            payload["filter"] = query_filter
+        while True:
+            data = self.query_database(database_id, payload)
+            yield from data.get("results", [])
+            if not data.get("has_more"):
+                break
+            payload["start_cursor"] = data["next_cursor"]
+
+    # 데이터베이스에 새 행(페이지)을 만듭니다
+    def create_page(self, database_id, properties):
+        return self.request("POST", "pages", {"parent": {"database_id": database_id}, "properties": properties})
+
+    # 활동 코드와 페이지 종류("vision", "text", "image")에 맞는 프롬프트와 교사 이메일을 찾습니다
+    def find_activity(self, database_id, setting_name, page_kind):
+        data = self.query_database(database_id, {
+            "filter": {
+                "property": "setting_name",
+                "rich_text": {
+                    "equals": setting_name
+                }
+            }
+        })
+        for result in data.get("results", []):
+            for (_, kind), record in parse_setting_row(result):
+                if kind == page_kind and record["prompt"]:
+                    return record["prompt"], record["teacher_email"]
+        return None, None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# API 키마다 하나의 클라이언트를 만들어 모든 세션이 연결과 속도 제한을 공유합니다
+# base_url은 부하 테스트 등에서 로컬 대역 서버를 쓸 때만 바꿉니다.
+def get_notion_client(api_key, base_url=None):
+    base_url = base_url or NOTION_API_URL
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _clients[(api_key, base_url)] = NotionClient(api_key, base_url)
+        return client
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from core.cache import cached_activity_lookup
+from core.notion_client import get_notion_client, parse_setting_row
+
+POLL_INTERVAL = 5  # 초 단위, 변경된 행만 다시 가져오는 주기
+FULL_SYNC_INTERVAL = 600  # 초 단위, 삭제된 행까지 반영하기 위한 전체 동기화 주기
+
+
+# Notion 설정 데이터베이스 전체를 메모리에 보관하는 색인
+# 처음 한 번 전체를 가져온 뒤에는 last_edited_time이 마지막 동기화 이후인 행만 다시 가져옵니다.
+class NotionSettingsIndex:
+    def __init__(self, client, database_id, poll_interval=POLL_INTERVAL, full_sync_interval=FULL_SYNC_INTERVAL):
+        self.client = client
+        self.database_id = database_id
+        self.poll_interval = poll_interval
+        self.full_sync_interval = full_sync_interval
+        self.ready = threading.Event()
+        self.last_sync_at = None
+        self.sync_count = 0
+        self.error_count = 0
+        self._records = {}  # (setting_name, 페이지 종류) -> 레코드
+        self._keys_by_page = {}  # Notion 페이지 id -> 그 행이 만든 키 목록
+        self._watermark = None  # 지금까지 본 가장 최근 last_edited_time
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, setting_name, page_kind):
+        with self._lock:
+            return self._records.get((setting_name, page_kind))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    def _apply(self, results, records, keys_by_page, watermark):
+        for result in results:
+            page_id = result.get("id")
+            # 설정 이름이나 종류가 바뀐 행은 예전 키를 먼저 지웁니다
+            for key in keys_by_page.pop(page_id, []):
+                records.pop(key, None)
+            entries = parse_setting_row(result)
+            for key, record in entries:
+                records[key] = record
+            keys_by_page[page_id] = [key for key, _ in entries]
+            edited = result.get("last_edited_time")
+            if edited and (watermark is None or edited > watermark):
+                watermark = edited
+        return watermark
+
+    def full_sync(self):
+        records, keys_by_page = {}, {}
+        results = list(self.client.iter_database(self.database_id))
+        watermark = self._apply(results, records, keys_by_page, None)
+        with self._lock:
+            self._records = records
+            self._keys_by_page = keys_by_page
+            self._watermark = watermark
+        self._mark_synced()
+
+    def delta_sync(self):
+        if self._watermark is None:
+            return self.full_sync()
+        # Notion의 last_edited_time은 분 단위로 기록되므로 같은 분에 수정된 행도 다시 가져옵니다
+        results = list(self.client.iter_database(self.database_id, {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": self._watermark},
+        }))
+        with self._lock:
+            self._watermark = self._apply(results, self._records, self._keys_by_page, self._watermark)
+        self._mark_synced()
+
+    def _mark_synced(self):
+        self.last_sync_at = time.time()
+        self.sync_count += 1
+        self.ready.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notion-settings-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        last_full_sync = 0
+        while True:
+            try:
+                if time.monotonic() - last_full_sync >= self.full_sync_interval:
+                    self.full_sync()
+                    last_full_sync = time.monotonic()
+                else:
+                    self.delta_sync()
+            except Exception:
+                # 네트워크 오류가 나도 기존 색인은 그대로 두고 다음 주기에 다시 시도합니다
+                self.error_count += 1
+            time.sleep(self.poll_interval)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# 데이터베이스마다 하나의 색인을 만들어 모든 세션이 공유합니다
+def get_settings_index(api_key, database_id, base_url=None):
+    with _indexes_lock:
+        index = _indexes.get(database_id)
+        if index is None:
+            client = get_notion_client(api_key, base_url)
+            index = _indexes[database_id] = NotionSettingsIndex(client, database_id).start()
+        return index
+
+
+# 설정 행에 적힌 하루 사용량 한도 (색인이 아직 준비되지 않았거나 한도가 없으면 빈 사전)
+def activity_quotas(index, setting_name, page_kind):
+    if not index.ready.is_set():
+        return {}
+    record = index.get(setting_name, page_kind)
+    return record.get("quotas", {}) if record else {}
+
+
+# 설정 행의 비슷한 답 재사용 설정 (색인이 아직 준비되지 않았거나 행이 없으면 빈 사전)
+def activity_answer_cache(index, setting_name, page_kind):
+    if not index.ready.is_set():
+        return {}
+    record = index.get(setting_name, page_kind)
+    return record.get("answer_cache", {}) if record else {}
+
+
+# 색인에서 먼저 찾고, 아직 동기화 전이거나 방금 만들어진 코드라면 기존 방식(캐시 + 직접 조회)으로 찾습니다
+# shared는 여러 프로세스가 함께 쓰는 캐시 저장소로, 다른 프로세스가 방금 조회한 코드를 다시 조회하지 않게 합니다.
+def lookup_activity(index, setting_name, page_kind, shared=None):
+    if index.ready.is_set():
+        record = index.get(setting_name, page_kind)
+        if record and record["prompt"]:
+            return record["prompt"], record["teacher_email"]
+    return cached_activity_lookup(
+        setting_name, page_kind,
+        lambda name: index.client.find_activity(index.database_id, name, page_kind),
+        shared,
+    )
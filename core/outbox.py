@@ -0,0 +1,221 @@
+import contextlib
+import pathlib
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+
+from core import DATA_DIR
+from core.metrics import get_metrics
+
+DEFAULT_OUTBOX_PATH = DATA_DIR / "outbox.sqlite3"
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2  # 초 단위
+BACKOFF_MAX = 300  # 초 단위
+IDLE_DISCONNECT = 60  # 초 단위, 보낼 메일이 없으면 이 시간 뒤에 SMTP 연결을 닫습니다
+KEEP_SENT_FOR = 7 * 24 * 3600  # 초 단위, 보낸 메일 기록 보관 기간
+BATCH_SIZE = 20
+CLAIM_LEASE = 15 * 60  # 초 단위, 'sending'으로 가져간 프로세스가 이 시간 안에 끝내지 못하면(종료 등) 다시 대기열로 돌립니다
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    message BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+# SQLite에 저장되는 이메일 발송 대기열
+# 학생 요청 처리 중에는 메일을 대기열에 넣기만 하고, 백그라운드 작업자가 하나의 SMTP 연결로 차례로 보냅니다.
+# 서버가 다시 시작되어도 보내지 못한 메일은 파일에 남아 있다가 이어서 발송됩니다.
+# 여러 프로세스가 같은 파일을 함께 써도 한 메일은 먼저 가져간(claim) 작업자 하나만 보냅니다.
+class EmailOutbox:
+    def __init__(self, address, password, path=DEFAULT_OUTBOX_PATH, smtp_host="smtp.gmail.com",
+                 smtp_port=465, use_ssl=True, max_attempts=MAX_ATTEMPTS):
+        self.address = address
+        self.password = password
+        self.path = pathlib.Path(path)
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.use_ssl = use_ssl
+        self.max_attempts = max_attempts
+        self.connect_count = 0
+        self._server = None
+        self._last_used = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            # claimed_at이 없던 이전 파일에 열을 더합니다
+            if "claimed_at" not in [row[1] for row in db.execute("PRAGMA table_info(outbox)")]:
+                db.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # 메일을 대기열에 넣고 id를 반환합니다 (네트워크를 기다리지 않음)
+    def enqueue(self, msg):
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO outbox (created_at, sender, recipient, message, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (now, msg["From"] or self.address, msg["To"], msg.as_bytes(), now),
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    # 대기열 깊이와 발송 지연 시간(대기열에 넣은 뒤 실제로 보낼 때까지)을 반환
+    def stats(self, recent=200):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            latencies = sorted(row[0] for row in db.execute(
+                "SELECT sent_at - created_at FROM outbox WHERE status = 'sent' ORDER BY id DESC LIMIT ?",
+                (recent,),
+            ))
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            "smtp_connections": self.connect_count,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def _smtp(self):
+        if self._server is not None:
+            return self._server
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, timeout=30)
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        if self.password:
+            server.login(self.address, self.password)
+        self.connect_count += 1
+        self._server = server
+        return server
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    # 보낼 때가 된 메일을 한 쓰기 트랜잭션 안에서 골라 'sending'으로 바꾸고 반환합니다
+    # BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡으므로 다른 프로세스가 같은 행을 함께 가져가지 못합니다.
+    def _claim(self, db):
+        now = time.time()
+        db.commit()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("UPDATE outbox SET status = 'pending', claimed_at = NULL WHERE status = 'sending' AND claimed_at <= ?",
+                   (now - CLAIM_LEASE,))
+        rows = db.execute(
+            "SELECT id, sender, recipient, message, attempts FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, BATCH_SIZE),
+        ).fetchall()
+        db.executemany("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+        db.commit()
+        return rows
+
+    def _send(self, db, row):
+        message_id, sender, recipient, message, attempts = row
+        started = time.perf_counter()
+        try:
+            self._smtp().sendmail(sender, [recipient], message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+            get_metrics().record_stage("email_send", None, time.perf_counter() - started, ok=False)
+            # 주소 문제는 다시 보내도 실패하므로 바로 실패 처리
+            db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, claimed_at = NULL WHERE id = ?",
+                       (attempts + 1, str(e), message_id))
+            return
+        except (smtplib.SMTPException, OSError) as e:
+            # 연결이 끊겼거나 서버가 일시적으로 거부한 경우: 연결을 새로 만들고 나중에 다시 시도
+            get_metrics().record_stage("email_send", None, time.perf_counter() - started, ok=False)
+            self._disconnect()
+            attempts += 1
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.0)
+            db.execute("UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, claimed_at = NULL "
+                       "WHERE id = ?", (status, attempts, time.time() + delay, str(e), message_id))
+            return
+        get_metrics().record_stage("email_send", None, time.perf_counter() - started)
+        self._last_used = time.monotonic()
+        db.execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL, claimed_at = NULL "
+                   "WHERE id = ?", (attempts + 1, time.time(), message_id))
+
+    def _next_wait(self, db):
+        row = db.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return IDLE_DISCONNECT
+        return max(0.0, min(IDLE_DISCONNECT, row[0] - time.time()))
+
+    def _run(self):
+        while True:
+            try:
+                with self._connect() as db:
+                    rows = self._claim(db)
+                    for row in rows:
+                        self._send(db, row)
+                        db.commit()
+                    if rows:
+                        continue
+                    db.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                               (time.time() - KEEP_SENT_FOR,))
+                    wait = self._next_wait(db)
+            except sqlite3.Error:
+                wait = BACKOFF_BASE
+            if self._server is not None and time.monotonic() - self._last_used >= IDLE_DISCONNECT:
+                self._disconnect()
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+# secrets.toml의 [email] 설정으로 프로세스 전체가 공유하는 발송 대기열을 만듭니다
+# address, password 외에 smtp_host, smtp_port, use_ssl, outbox_path를 선택적으로 지정할 수 있습니다.
+def get_outbox(email_settings):
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox(
+                email_settings["address"],
+                email_settings["password"],
+                path=email_settings.get("outbox_path", DEFAULT_OUTBOX_PATH),
+                smtp_host=email_settings.get("smtp_host", "smtp.gmail.com"),
+                smtp_port=int(email_settings.get("smtp_port", 465)),
+                use_ssl=bool(email_settings.get("use_ssl", True)),
+            ).start()
+            get_metrics().register_gauge("email_outbox_pending", lambda: _outbox.stats()["pending"])
+        return _outbox
@@ -0,0 +1,228 @@
+import pathlib
+import threading
+
+SECRETS_PATH = pathlib.Path(__file__).parent.parent / ".streamlit/secrets.toml"
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_SDK_MISMATCH = "google-generativeai 내부 구조가 예상과 다릅니다. requirements.txt에 고정한 버전(0.8.6)을 설치하세요."
+
+# Streamlit은 매 rerun마다 페이지 스크립트를 처음부터 다시 실행하므로,
+# 비용이 큰 준비 작업(secrets 읽기, SDK import, 클라이언트 생성)은 여기서 프로세스당 한 번만 합니다.
+_resources = {}
+_resources_lock = threading.RLock()
+_warm_up_started = False
+
+
+def _cached(name, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        with _resources_lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = _resources[name] = factory()
+    return resource
+
+
+def _load_secrets():
+    import streamlit as st
+
+    try:
+        return st.secrets.to_dict()
+    except FileNotFoundError:
+        import toml
+
+        with open(SECRETS_PATH, "r") as f:
+            return toml.load(f)
+
+
+# .streamlit/secrets.toml 내용 (프로세스당 한 번만 읽음)
+def get_secrets():
+    return _cached("secrets", _load_secrets)
+
+
+# secrets.toml을 고친 뒤 서버를 다시 시작하지 않고 새 값을 쓰고 싶을 때 사용
+def reload_secrets():
+    with _resources_lock:
+        _resources.clear()
+    return get_secrets()
+
+
+# 파일 대신 주어진 값을 secrets로 사용합니다 (부하 테스트에서 로컬 대역 서버를 가리킬 때)
+def use_secrets(secrets):
+    with _resources_lock:
+        _resources.clear()
+        _resources["secrets"] = secrets
+
+
+def get_openai_pool():
+    from core.key_pool import KeyPool
+
+    return _cached("openai_pool", lambda: KeyPool("openai", list(get_secrets()["api"]["keys"])))
+
+
+def get_openai_client(api_key=None):
+    api_key = api_key or get_secrets()["api"]["keys"][0]
+
+    def factory():
+        from openai import OpenAI
+
+        # base_url은 부하 테스트 등에서 로컬 대역 서버를 쓸 때만 지정합니다
+        # SDK가 같은 키로 다시 시도하면 키 묶음이 429를 늦게 알게 되므로, 재시도는 KeyPool.call이 다른 키로 합니다
+        return OpenAI(api_key=api_key, base_url=get_secrets()["api"].get("base_url"), max_retries=0)
+
+    return _cached(f"openai:{api_key}", factory)
+
+
+# fn(client)는 with_raw_response로 호출한 결과를 반환해야 합니다
+# 응답 헤더의 남은 한도를 키 묶음에 기록한 뒤 파싱된 결과를 돌려줍니다.
+def call_openai(fn):
+    def attempt(lease):
+        raw = fn(get_openai_client(lease["key"]))
+        lease["headers"] = raw.headers
+        return raw.parse()
+
+    return get_openai_pool().call(attempt)
+
+
+# [google] 아래 gemini_api_key1, gemini_api_key2, ... 를 모두 사용
+def get_gemini_pool():
+    from core.key_pool import KeyPool
+
+    def factory():
+        google = get_secrets()["google"]
+        keys = [google[name] for name in sorted(google) if name.startswith("gemini_api_key")]
+        return KeyPool("gemini", keys)
+
+    return _cached("gemini_pool", factory)
+
+
+def get_gemini_model(model_name=GEMINI_MODEL, api_key=None):
+    api_key = api_key or get_secrets()["google"]["gemini_api_key1"]
+
+    def factory():
+        import google.generativeai as genai
+
+        # genai.configure는 프로세스 전체에 키 하나만 설정하므로, 키마다 별도의 클라이언트를 만들어 모델에 연결합니다
+        # 공개 API로는 키별 클라이언트를 만들 수 없어 SDK 내부(_ClientManager, model._client)를 씁니다.
+        # 그래서 requirements.txt에 google-generativeai 버전을 고정해 두었고(0.8.6, 더 이상 갱신되지 않는 마지막 버전),
+        # 내부 구조가 달라지면 조용히 첫 번째 키만 쓰지 않도록 바로 오류를 냅니다.
+        try:
+            from google.generativeai.client import _ClientManager
+        except ImportError as e:
+            raise RuntimeError(GEMINI_SDK_MISMATCH) from e
+        manager = _ClientManager()
+        endpoint = get_secrets()["google"].get("api_endpoint")
+        if endpoint:
+            manager.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+        else:
+            manager.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name)
+        if not hasattr(model, "_client"):
+            raise RuntimeError(GEMINI_SDK_MISMATCH)
+        model._client = manager.get_default_client("generative")
+        return model
+
+    return _cached(f"gemini:{model_name}:{api_key}", factory)
+
+
+def call_gemini(model_name, fn):
+    return get_gemini_pool().call(lambda lease: fn(get_gemini_model(model_name, lease["key"])))
+
+
+def get_notion_settings_index():
+    def factory():
+        from core.notion_index import get_settings_index
+
+        notion = get_secrets()["notion"]
+        return get_settings_index(notion["api_key"], notion["database_id"], notion.get("api_url"))
+
+    return _cached("notion_index", factory)
+
+
+# [submissions]가 켜져 있을 때만 만들어지는 Notion 제출 기록 작업자 (아니면 None)
+def get_submission_sink():
+    from core.notion_client import get_notion_client
+    from core.submissions import get_submission_sink as factory
+
+    secrets = get_secrets()
+    notion = secrets["notion"]
+    return factory(secrets.get("submissions", {}), get_notion_client(notion["api_key"], notion.get("api_url")))
+
+
+def get_email_settings():
+    return get_secrets()["email"]
+
+
+def get_metrics():
+    from core.metrics import get_metrics as factory
+
+    return factory(get_secrets().get("metrics", {}))
+
+
+# 유료 모델을 부르기 전에 금칙어와 이미지 헤더를 확인하는 사전 검사기 ([screening] 설정 사용)
+def get_screener():
+    from core.screening import get_screener as factory
+
+    return factory(get_secrets().get("screening", {}))
+
+
+# 활동 코드와 학생별 토큰/이미지 사용량 기록기 ([usage] 설정 사용)
+def get_usage_meter():
+    from core.usage import get_usage_meter as factory
+
+    return factory(get_secrets().get("usage", {}))
+
+
+# 여러 프로세스/서버가 함께 쓰는 캐시 저장소 ([cache] backend 설정 사용, 기본은 프로세스 안의 메모리)
+def get_cache_backend():
+    from core.cache_backend import get_cache_backend as factory
+
+    return factory(get_secrets().get("cache", {}))
+
+
+# 같은 프롬프트에 거의 같은 학생 답이면 AI 답을 다시 쓰는 캐시 ([answer_cache] 설정 사용)
+def get_answer_cache():
+    from core.answer_cache import get_answer_cache as factory
+
+    return factory(get_secrets().get("answer_cache", {}), get_cache_backend())
+
+
+# 제공자/모델별 동시 호출 제한 대기열 ([limits] 설정 사용)
+def get_admission_queue(provider, model):
+    from core.admission import get_admission_queue as factory
+
+    return factory(get_secrets().get("limits", {}), provider, model)
+
+
+def _warm_up():
+    from core.digest import get_digest
+    from core.outbox import get_outbox
+
+    get_secrets()
+    get_metrics()
+    get_usage_meter()
+    get_notion_settings_index()
+
+    # 서버가 다시 시작되기 전에 보내지 못한 메일이 바로 이어서 발송되도록 작업자를 미리 띄웁니다
+    outbox = get_outbox(get_email_settings())
+    get_digest(get_email_settings(), outbox)
+    # 지난번에 Notion에 기록하지 못한 제출도 이어서 기록합니다
+    get_submission_sink()
+
+    get_openai_pool()
+    get_openai_client()
+    get_gemini_pool()
+    get_gemini_model()
+
+
+# 서버가 뜬 뒤 처음 실행되는 페이지에서 한 번 호출합니다
+# 첫 학생의 화면이 늦어지지 않도록 준비 작업은 백그라운드 스레드에서 합니다.
+def warm_up(background=True):
+    global _warm_up_started
+    with _resources_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    if background:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    else:
+        _warm_up()
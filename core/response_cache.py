@@ -0,0 +1,138 @@
+import contextlib
+import hashlib
+import pathlib
+import sqlite3
+import threading
+import time
+
+from core import DATA_DIR
+
+DEFAULT_RESPONSE_CACHE_PATH = DATA_DIR / "responses.sqlite3"
+MAX_BYTES = 200 * 1024 * 1024
+EVICT_BATCH = 100  # 한도를 넘었을 때 한 번에 살펴볼 오래된 응답 수
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access);
+-- 전체 크기를 트리거로 따로 들고 있어, 쓸 때마다 표 전체를 훑지 않고 한도를 확인합니다 (여러 프로세스가 써도 정확)
+CREATE TABLE IF NOT EXISTS responses_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS responses_total_insert AFTER INSERT ON responses
+BEGIN UPDATE responses_total SET bytes = bytes + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS responses_total_delete AFTER DELETE ON responses
+BEGIN UPDATE responses_total SET bytes = bytes - OLD.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS responses_total_update AFTER UPDATE OF size ON responses
+BEGIN UPDATE responses_total SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END;
+INSERT OR IGNORE INTO responses_total (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM responses;
+"""
+
+
+# 모델 이름, 프롬프트, 입력 바이트로 만든 내용 기반 캐시 키
+# 각 부분 앞에 길이를 붙여 서로 다른 조합이 같은 키가 되지 않게 합니다.
+def response_key(model_name, prompt, *payloads):
+    digest = hashlib.sha256()
+    for part in (model_name.encode(), prompt.encode(), *payloads):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# 유료 모델 응답을 디스크(SQLite)에 보관하는 캐시
+# 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 응답부터 지웁니다.
+# 파일은 한 서버의 프로세스들이 이미 함께 쓰므로, shared는 여러 서버가 함께 쓰는 저장소(Redis)일 때만 씁니다.
+class ResponseCache:
+    def __init__(self, path=DEFAULT_RESPONSE_CACHE_PATH, max_bytes=MAX_BYTES, shared=None):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.shared = shared if shared is not None and shared.wider_than("host") else None
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        if row is None and self.shared is not None:
+            # 다른 서버가 받은 응답이면 이 서버의 파일에도 넣어 둡니다
+            value = self.shared.get_text(f"response:{key}")
+            if value is not None:
+                self._store(key, value)
+                row = (value,)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.set_text(f"response:{key}", value)
+
+    def _store(self, key, value):
+        now = time.time()
+        size = len(value.encode())
+        with self._connect() as db:
+            # INSERT OR REPLACE는 삭제 트리거를 부르지 않으므로 UPSERT로 씁니다
+            db.execute(
+                "INSERT INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "created_at = excluded.created_at, last_access = excluded.last_access",
+                (key, value, size, now, now),
+            )
+            total = self._total(db)
+            # 한도를 넘었을 때만 가장 오래 사용하지 않은 응답부터 조금씩 읽어 한도 아래로 내려갈 때까지 삭제
+            while total > self.max_bytes:
+                rows = db.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT ?", (EVICT_BATCH,)).fetchall()
+                if not rows:
+                    break
+                for old_key, old_size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+
+    def _total(self, db):
+        return db.execute("SELECT bytes FROM responses_total WHERE id = 0").fetchone()[0]
+
+    def stats(self):
+        with self._connect() as db:
+            count, total = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], self._total(db)
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+# secrets.toml의 [cache] 설정(response_cache_mb, response_cache_path)으로 프로세스 전체가 공유하는 응답 캐시를 만듭니다
+def get_response_cache(cache_settings, shared=None):
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            max_mb = float(cache_settings.get("response_cache_mb", MAX_BYTES / 1024 / 1024))
+            _response_cache = ResponseCache(
+                path=cache_settings.get("response_cache_path", DEFAULT_RESPONSE_CACHE_PATH),
+                max_bytes=int(max_mb * 1024 * 1024),
+                shared=shared,
+            )
+        return _response_cache
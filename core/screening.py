@@ -0,0 +1,264 @@
+import struct
+import threading
+import time
+import unicodedata
+
+from core.metrics import get_metrics
+
+# 초등학생 활동에 어울리지 않는 표현 (secrets.toml의 [screening] blocklist로 통째로 바꾸거나 extra_terms로 더할 수 있음)
+DEFAULT_BLOCKLIST = [
+    # 욕설
+    "시발", "씨발", "씨바", "ㅅㅂ", "ㅆㅂ", "병신", "병신년아", "ㅂㅅ", "개새끼", "개새기", "좆", "존나", "ㅈㄴ", "미친놈", "미친년",
+    "fuck", "shit", "bitch", "bastard", "asshole", "motherfucker",
+    # 성적인 표현
+    "섹스", "야동", "성관계", "포르노", "sex", "porn", "nude", "hentai",
+    # 자해
+    "자살하", "죽고싶", "kill yourself", "suicide",
+]
+# 금칙어를 품고 있지만 평범한 낱말 ([screening] allowlist로 통째로 바꾸거나 allow_terms로 더할 수 있음)
+# 금칙어가 이 낱말 안에 통째로 들어 있을 때만 봐줍니다. "병신년아"처럼 더 긴 금칙어는 그대로 걸립니다.
+DEFAULT_ALLOWLIST = [
+    "시발점", "시발역", "시발택시", "시발자동차",  # 始發
+    "병신년",  # 丙申年
+    "보존나", "생존나", "공존나", "의존나",  # 보존나무, 생존나이 ...
+    "sex education", "sex ed", "sex chromosome",
+]
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000  # 이보다 큰 해상도는 압축 폭탄일 수 있으므로 PIL로 열지 않습니다
+MIN_EDGE = 32  # 픽셀, 이보다 작으면 분석할 내용이 없습니다
+
+TEXT_REJECTED = "⚠️ 학교 활동에 어울리지 않는 표현이 있어요. 내용을 고쳐서 다시 입력해 주세요."
+
+
+# 대소문자, 전각/반각, 한글 호환 자모를 한 가지 모양으로 맞춥니다
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+# 글자 사이에 기호나 띄어쓰기를 끼워 피하는 경우("ㅅ.ㅂ", "시 발")를 잡기 위해 기호를 빼고 한 글자씩 띄운 부분을 붙입니다
+# 두 글자 이상인 낱말끼리는 붙이지 않으므로 "물병 신발" 같은 평범한 글이 걸리지 않습니다.
+def _compact(text):
+    words = []
+    for word in text.split():
+        word = "".join(ch for ch in word if ch.isalnum())
+        if len(word) == 1 and words and words[-1][1]:
+            words[-1] = (words[-1][0] + word, True)
+        elif word:
+            words.append((word, len(word) == 1))
+    return " ".join(word for word, _ in words)
+
+
+# 여러 금칙어를 글을 한 번 훑어서 찾는 Aho-Corasick 자동자 (금칙어 수와 상관없이 글 길이에 비례하는 시간)
+class KeywordMatcher:
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for term in terms:
+            term = normalize(term).strip()
+            if not term:
+                continue
+            state = 0
+            for ch in term:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._output[state].append(term)
+
+        # 너비 우선으로 실패 링크를 잇고, 실패 링크 쪽 출력도 함께 모읍니다
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _scan(self, text):
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for term in self._output[state]:
+                yield term, end - len(term) + 1, end + 1
+
+    # 영어 낱말은 단어 단위로만 찾고("class" 속의 "ass" 제외), 한글 낱말은 어디서든 찾습니다
+    def matches(self, text):
+        for term, start, end in self._scan(text):
+            if not term.isascii():
+                yield term, start, end
+                continue
+            before = text[start - 1] if start > 0 else " "
+            after = text[end] if end < len(text) else " "
+            if not before.isalnum() and not after.isalnum():
+                yield term, start, end
+
+    # 처음 찾은 금칙어를 반환합니다 (없으면 None)
+    # 허용 낱말(allow) 안에 통째로 들어 있는 금칙어는 건너뛰고, 한글 금칙어는 기호와 띄어쓰기를 뺀 글에서도 찾습니다.
+    def find(self, text, allow=None):
+        text = normalize(text)
+        for candidate, hangul_only in ((text, False), (_compact(text), True)):
+            allowed = list(allow.matches(candidate)) if allow is not None else []
+            for term, start, end in self.matches(candidate):
+                if hangul_only and term.isascii():
+                    continue
+                if not any(a_start <= start and end <= a_end for _, a_start, a_end in allowed):
+                    return term
+        return None
+
+
+# 이미지 파일 앞부분(헤더)만 읽어 형식과 크기를 알아냅니다 (모르는 형식이거나 헤더가 깨졌으면 None)
+def image_header(data):
+    try:
+        if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", data[16:24])
+            return "png", width, height
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", data[6:10])
+            return "gif", width, height
+        if data.startswith(b"BM"):
+            width, height = struct.unpack("<ii", data[18:26])
+            return "bmp", abs(width), abs(height)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            chunk = data[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", data[26:30])
+                return "webp", width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                b0, b1, b2, b3 = data[21:25]
+                return "webp", 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+            if chunk == b"VP8X":
+                return "webp", 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+            return None
+        if data.startswith(b"\xff\xd8"):
+            return _jpeg_header(data)
+    except (struct.error, ValueError):
+        return None
+    return None
+
+
+# JPEG는 마커를 따라가다 SOF(프레임 시작) 마커에서 크기를 읽습니다
+def _jpeg_header(data):
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # 채움 바이트
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # 길이가 없는 마커
+            i += 2
+            continue
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return "jpeg", width, height
+        if marker in (0xD9, 0xDA):  # 이미지 끝/스캔 시작 전에 크기가 없으면 깨진 파일
+            return None
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+# 유료 모델을 부르기 전에 로컬에서 먼저 거르는 사전 검사
+# 금칙어와 이미지 헤더만 보므로 마이크로초 단위로 끝나고, 막은 횟수(= 아낀 모델 호출 수)를 종류별로 셉니다.
+class Screener:
+    def __init__(self, terms=DEFAULT_BLOCKLIST, allow_terms=DEFAULT_ALLOWLIST, max_image_bytes=MAX_IMAGE_BYTES,
+                 max_pixels=MAX_PIXELS, min_edge=MIN_EDGE, enabled=True):
+        self.matcher = KeywordMatcher(terms)
+        self.allow = KeywordMatcher(allow_terms)
+        self.max_image_bytes = max_image_bytes
+        self.max_pixels = max_pixels
+        self.min_edge = min_edge
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.checked = {"text": 0, "image": 0}
+        self.rejected = {"text": 0, "image": 0}
+        self.seconds = 0.0
+
+    def _count(self, kind, started, activity, rejected):
+        with self._lock:
+            self.checked[kind] += 1
+            self.seconds += time.perf_counter() - started
+            if rejected:
+                self.rejected[kind] += 1
+        if rejected:
+            get_metrics().increment("screening_rejected_total", kind=kind, activity=activity or "")
+
+    # 글 가운데 금칙어가 있으면 그 금칙어를, 없으면 None을 반환합니다
+    def check_text(self, activity, *texts):
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        found = None
+        for text in texts:
+            found = self.matcher.find(text or "", self.allow)
+            if found:
+                break
+        self._count("text", started, activity, found)
+        return found
+
+    # 분석할 수 없는 이미지면 학생에게 보여 줄 이유를, 괜찮으면 None을 반환합니다 (PIL로 열기 전에 호출)
+    def check_image(self, activity, data):
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        header = image_header(data)
+        if len(data) > self.max_image_bytes:
+            problem = f"파일이 너무 큽니다 (최대 {self.max_image_bytes // 1024 // 1024}MB)."
+        elif header is None:
+            problem = "지원하지 않거나 손상된 이미지 파일입니다."
+        elif min(header[1], header[2]) < self.min_edge:
+            problem = f"이미지가 너무 작습니다 (가로세로 {self.min_edge}픽셀 이상)."
+        elif header[1] * header[2] > self.max_pixels:
+            problem = "이미지 해상도가 너무 큽니다."
+        else:
+            problem = None
+        self._count("image", started, activity, problem)
+        return problem
+
+    def stats(self):
+        with self._lock:
+            checked = sum(self.checked.values())
+            return {
+                "checked": dict(self.checked),
+                "rejected": dict(self.rejected),
+                "calls_avoided": sum(self.rejected.values()),
+                "avg_microseconds": round(self.seconds / checked * 1e6, 1) if checked else None,
+            }
+
+
+_screener = None
+_screener_lock = threading.Lock()
+
+
+# secrets.toml의 [screening] 설정으로 모든 세션이 함께 쓰는 사전 검사기를 만듭니다
+#   [screening]
+#   enabled = true
+#   blocklist = ["...", ...]   # 기본 금칙어 목록을 통째로 바꿀 때
+#   extra_terms = ["...", ...] # 기본 목록에 더할 때
+#   allowlist = ["...", ...]   # 금칙어를 품은 평범한 낱말 목록을 통째로 바꿀 때
+#   allow_terms = ["...", ...] # 기본 허용 목록에 더할 때 (예: "시발점")
+#   max_image_mb = 20
+#   max_pixels = 50000000
+#   min_edge = 32
+def get_screener(screening_settings):
+    global _screener
+    with _screener_lock:
+        if _screener is None:
+            terms = list(screening_settings.get("blocklist", DEFAULT_BLOCKLIST)) + list(screening_settings.get("extra_terms", []))
+            allow_terms = list(screening_settings.get("allowlist", DEFAULT_ALLOWLIST)) + list(screening_settings.get("allow_terms", []))
+            _screener = Screener(
+                terms,
+                allow_terms,
+                max_image_bytes=int(float(screening_settings.get("max_image_mb", MAX_IMAGE_BYTES / 1024 / 1024)) * 1024 * 1024),
+                max_pixels=int(screening_settings.get("max_pixels", MAX_PIXELS)),
+                min_edge=int(screening_settings.get("min_edge", MIN_EDGE)),
+                enabled=bool(screening_settings.get("enabled", True)),
+            )
+        return _screener
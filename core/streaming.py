@@ -0,0 +1,77 @@
+import collections
+import threading
+import time
+
+# 최근 요청들의 첫 토큰 시간(TTFT)과 전체 시간 기록
+recent_timings = collections.deque(maxlen=500)
+_timings_lock = threading.Lock()
+
+
+# 모델이 보내는 글자 조각을 그대로 흘려보내면서 전체 글과 시간을 기록하는 반복자
+# st.write_stream(timed)로 화면에 점진적으로 보여 준 뒤 timed.text를 이메일에 사용합니다.
+class TimedStream:
+    def __init__(self, name, chunks, started=None):
+        self.name = name
+        self.started = started if started is not None else time.perf_counter()
+        self.ttft = None
+        self.total = None
+        self._chunks = chunks
+        self._parts = []
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self._parts.append(chunk)
+            yield chunk
+        self.total = time.perf_counter() - self.started
+        with _timings_lock:
+            recent_timings.append({"name": self.name, "ttft": self.ttft, "total": self.total, "chars": len(self.text)})
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+
+# OpenAI chat.completions 스트림에서 글자 조각만 꺼냅니다
+# usage 사전을 넘기면 마지막 조각의 토큰 사용량을 채웁니다 (stream_options={"include_usage": True}로 요청해야 함).
+def openai_chunks(stream, usage=None):
+    for chunk in stream:
+        if usage is not None and getattr(chunk, "usage", None):
+            usage["input_tokens"] = chunk.usage.prompt_tokens
+            usage["output_tokens"] = chunk.usage.completion_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# Gemini generate_content(stream=True) 응답에서 글자 조각만 꺼냅니다
+# 안전 필터 등으로 내용이 없는 조각은 chunk.text에서 ValueError가 나므로 건너뜁니다.
+# usage 사전을 넘기면 조각에 담긴 누적 토큰 사용량(usage_metadata)을 채웁니다.
+def gemini_chunks(response, usage=None):
+    for chunk in response:
+        metadata = getattr(chunk, "usage_metadata", None)
+        if usage is not None and metadata and metadata.prompt_token_count:
+            usage["input_tokens"] = metadata.prompt_token_count
+            usage["output_tokens"] = metadata.candidates_token_count
+        try:
+            yield chunk.text
+        except ValueError:
+            continue
+
+
+# 이름별 평균 TTFT와 전체 시간
+def timing_summary():
+    with _timings_lock:
+        timings = list(recent_timings)
+    summary = {}
+    for name in {t["name"] for t in timings}:
+        rows = [t for t in timings if t["name"] == name and t["ttft"] is not None]
+        if rows:
+            summary[name] = {
+                "count": len(rows),
+                "ttft_avg": sum(t["ttft"] for t in rows) / len(rows),
+                "total_avg": sum(t["total"] for t in rows) / len(rows),
+            }
+    return summary
@@ -0,0 +1,251 @@
+import contextlib
+import datetime
+import json
+import pathlib
+import random
+import sqlite3
+import threading
+import time
+
+from core import DATA_DIR
+from core.notion_client import NotionError, TokenBucket
+
+DEFAULT_SUBMISSIONS_PATH = DATA_DIR / "submissions.sqlite3"
+BATCH_SIZE = 10  # 이만큼 모이면 바로 보냅니다
+MAX_WAIT = 30  # 초 단위, 첫 제출 이후 이 시간이 지나면 모인 만큼 보냅니다
+RATE_PER_SECOND = 1  # 프롬프트 조회가 밀리지 않도록 Notion 한도(초당 3회)의 일부만 사용
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 5  # 초 단위
+BACKOFF_MAX = 600  # 초 단위
+KEEP_SENT_FOR = 7 * 24 * 3600  # 초 단위
+TEXT_CHUNK = 2000  # Notion rich_text 조각 하나의 최대 글자 수
+MAX_CHUNKS = 100  # rich_text 배열의 최대 길이
+CLAIM_LEASE = 15 * 60  # 초 단위, 'sending'으로 가져간 프로세스가 이 시간 안에 끝내지 못하면(종료 등) 다시 대기열로 돌립니다
+PERMANENT_STATUS = {400, 401, 403, 404}  # 데이터베이스 설정 문제라 다시 보내도 실패하는 응답
+
+# 제출 데이터베이스의 속성 이름 (교사가 만든 Notion 데이터베이스의 열 이름과 같아야 합니다)
+# [submissions.properties]에서 바꿀 수 있고, 이름을 빈 문자열로 두면 그 항목은 보내지 않습니다.
+PROPERTIES = {
+    "student_name": "학생 이름",  # 제목(title)
+    "setting_name": "활동 코드",  # 텍스트
+    "page_kind": "페이지",  # 선택(select)
+    "prompt": "프롬프트",  # 텍스트
+    "student_input": "학생 입력",  # 텍스트
+    "ai_output": "AI 결과",  # 텍스트
+    "image_ref": "이미지",  # 텍스트
+    "submitted_at": "제출 시각",  # 날짜
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    fields TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    notion_page_id TEXT,
+    last_error TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS submissions_due ON submissions (status, next_attempt_at);
+"""
+
+
+def _text(value):
+    value = str(value)
+    return [{"text": {"content": value[i:i + TEXT_CHUNK]}} for i in range(0, len(value), TEXT_CHUNK)][:MAX_CHUNKS]
+
+
+# 제출 내용을 Notion 페이지 속성으로 변환합니다 (비어 있는 항목은 건너뜀)
+def build_properties(fields, names=PROPERTIES):
+    properties = {}
+    for field, value in fields.items():
+        name = names.get(field)
+        if not name or value in (None, ""):
+            continue
+        if field == "student_name":
+            properties[name] = {"title": _text(value)}
+        elif field == "page_kind":
+            properties[name] = {"select": {"name": value}}
+        elif field == "submitted_at":
+            properties[name] = {"date": {"start": value}}
+        else:
+            properties[name] = {"rich_text": _text(value)}
+    return properties
+
+
+# 학생 제출 결과를 Notion 제출 데이터베이스에 쌓는 백그라운드 작업자
+# 학생 요청 중에는 로컬 SQLite 대기열에 넣기만 하고, 모이거나 시간이 지나면 속도를 제한해 차례로 페이지를 만듭니다.
+# 서버가 다시 시작되어도 보내지 못한 제출은 파일에 남아 있다가 이어서 기록됩니다.
+# 여러 프로세스가 같은 파일을 함께 써도 한 제출은 먼저 가져간(claim) 작업자 하나만 보냅니다.
+class SubmissionSink:
+    def __init__(self, client, database_id, path=DEFAULT_SUBMISSIONS_PATH, batch_size=BATCH_SIZE, max_wait=MAX_WAIT,
+                 rate=RATE_PER_SECOND, properties=None, max_attempts=MAX_ATTEMPTS):
+        self.client = client
+        self.database_id = database_id
+        self.path = pathlib.Path(path)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.limiter = TokenBucket(rate, 1)
+        self.properties = {**PROPERTIES, **(properties or {})}
+        self.max_attempts = max_attempts
+        self.batch_count = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            # claimed_at이 없던 이전 파일에 열을 더합니다
+            if "claimed_at" not in [row[1] for row in db.execute("PRAGMA table_info(submissions)")]:
+                db.execute("ALTER TABLE submissions ADD COLUMN claimed_at REAL")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # 제출 하나를 대기열에 넣고 id를 반환합니다 (Notion을 기다리지 않음)
+    def add(self, student_name, setting_name, page_kind, prompt, student_input="", ai_output="", image_ref=""):
+        now = time.time()
+        fields = {
+            "student_name": student_name,
+            "setting_name": setting_name,
+            "page_kind": page_kind,
+            "prompt": prompt,
+            "student_input": student_input,
+            "ai_output": ai_output,
+            "image_ref": image_ref,
+            "submitted_at": datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat(),
+        }
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO submissions (created_at, fields, next_attempt_at) VALUES (?, ?, ?)",
+                (now, json.dumps(fields, ensure_ascii=False), now),
+            )
+            pending = db.execute("SELECT COUNT(*) FROM submissions WHERE status = 'pending'").fetchone()[0]
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return cursor.lastrowid
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM submissions GROUP BY status").fetchall())
+            last_error = db.execute(
+                "SELECT last_error FROM submissions WHERE last_error IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "batches": self.batch_count,
+            "last_error": last_error[0] if last_error else None,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notion-submissions", daemon=True)
+            self._thread.start()
+        return self
+
+    def _send(self, db, row):
+        submission_id, fields, attempts = row
+        self.limiter.acquire()
+        try:
+            page = self.client.create_page(self.database_id, build_properties(json.loads(fields), self.properties))
+        except NotionError as e:
+            attempts += 1
+            permanent = e.status_code in PERMANENT_STATUS
+            status = "failed" if permanent or attempts >= self.max_attempts else "pending"
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.0)
+            db.execute("UPDATE submissions SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, claimed_at = NULL "
+                       "WHERE id = ?", (status, attempts, time.time() + delay, str(e), submission_id))
+            return
+        db.execute("UPDATE submissions SET status = 'sent', attempts = ?, sent_at = ?, notion_page_id = ?, last_error = NULL, "
+                   "claimed_at = NULL WHERE id = ?", (attempts + 1, time.time(), page.get("id"), submission_id))
+
+    # 보낼 때가 된 묶음이면 (행 목록, None)을, 아니면 ([], 다음에 확인할 때까지 기다릴 초)를 반환
+    # 고른 행은 같은 쓰기 트랜잭션(BEGIN IMMEDIATE) 안에서 'sending'으로 바꾸므로 다른 프로세스가 함께 가져가지 못합니다.
+    def _next_batch(self, db):
+        now = time.time()
+        db.commit()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("UPDATE submissions SET status = 'pending', claimed_at = NULL WHERE status = 'sending' AND claimed_at <= ?",
+                   (now - CLAIM_LEASE,))
+        count, oldest = db.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM submissions WHERE status = 'pending' AND next_attempt_at <= ?", (now,)
+        ).fetchone()
+        if count and (count >= self.batch_size or oldest <= now - self.max_wait):
+            rows = db.execute(
+                "SELECT id, fields, attempts FROM submissions WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?", (now, self.batch_size),
+            ).fetchall()
+            db.executemany("UPDATE submissions SET status = 'sending', claimed_at = ? WHERE id = ?",
+                           [(now, row[0]) for row in rows])
+            db.commit()
+            return rows, None
+        waits = [self.max_wait]
+        if count:
+            waits.append(oldest + self.max_wait - now)
+        retry_at = db.execute(
+            "SELECT MIN(next_attempt_at) FROM submissions WHERE status = 'pending' AND next_attempt_at > ?", (now,)
+        ).fetchone()[0]
+        if retry_at is not None:
+            waits.append(retry_at - now)
+        db.commit()
+        return [], max(0.5, min(waits))
+
+    def _run(self):
+        while True:
+            try:
+                with self._connect() as db:
+                    rows, wait = self._next_batch(db)
+                    for row in rows:
+                        self._send(db, row)
+                        db.commit()
+                    if rows:
+                        self.batch_count += 1
+                        continue
+                    db.execute("DELETE FROM submissions WHERE status = 'sent' AND sent_at < ?",
+                               (time.time() - KEEP_SENT_FOR,))
+            except sqlite3.Error:
+                wait = BACKOFF_BASE
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+# secrets.toml의 [submissions] 설정으로 제출 기록 작업자를 만듭니다 (enabled가 아니면 None)
+#   [submissions]
+#   enabled = true
+#   database_id = "..."       # 결과를 쌓을 Notion 데이터베이스 (설정 데이터베이스와 별도)
+#   batch_size = 10           # 이만큼 모이면 바로 기록
+#   max_wait_seconds = 30     # 첫 제출 이후 이 시간이 지나면 기록
+#   rate_per_second = 1       # 초당 최대 페이지 생성 수
+#   [submissions.properties]  # 데이터베이스 열 이름이 다를 때만 (예: student_name = "이름")
+def get_submission_sink(submission_settings, client):
+    global _sink
+    if not submission_settings.get("enabled", False) or not submission_settings.get("database_id"):
+        return None
+    with _sink_lock:
+        if _sink is None:
+            _sink = SubmissionSink(
+                client,
+                submission_settings["database_id"],
+                path=submission_settings.get("path", DEFAULT_SUBMISSIONS_PATH),
+                batch_size=int(submission_settings.get("batch_size", BATCH_SIZE)),
+                max_wait=float(submission_settings.get("max_wait_seconds", MAX_WAIT)),
+                rate=float(submission_settings.get("rate_per_second", RATE_PER_SECOND)),
+                properties=submission_settings.get("properties"),
+            ).start()
+        return _sink
@@ -0,0 +1,241 @@
+import contextlib
+import pathlib
+import sqlite3
+import threading
+import time
+
+from core import DATA_DIR
+from core.notion_client import QUOTA_FIELDS
+
+DEFAULT_USAGE_PATH = DATA_DIR / "usage.sqlite3"
+FLUSH_INTERVAL = 5  # 초 단위, 메모리에 모인 사용량을 파일에 쓰는 주기
+WARN_AT = 0.8  # 한도의 이 비율을 넘으면 경고
+KEEP_DAYS = 400  # 이보다 오래된 일별 기록은 지웁니다
+
+
+# 하루, 활동 코드, 학생마다 한 행만 두고 더해 가므로 학교 전체가 써도 파일이 작게 유지됩니다
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    student TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, activity, student)
+) WITHOUT ROWID;
+"""
+_COUNTERS = ("requests", "input_tokens", "output_tokens", "images")
+
+
+# 사용량 한도를 넘어 모델 호출을 막았을 때 발생하는 예외 (메시지는 학생에게 그대로 보여 줍니다)
+class QuotaExceeded(Exception):
+    pass
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+def _tokens(counts):
+    return counts["input_tokens"] + counts["output_tokens"]
+
+
+# 활동 코드와 학생별 토큰/이미지 사용량 기록기
+# 모델 응답의 usage 값을 메모리 합계에 바로 더하고(한도 확인용), 백그라운드 스레드가 주기적으로 SQLite에 모아 씁니다.
+# 서버가 다시 시작되면 오늘 기록을 파일에서 다시 읽어 이어서 셉니다.
+class UsageMeter:
+    def __init__(self, path=DEFAULT_USAGE_PATH, flush_interval=FLUSH_INTERVAL, warn_at=WARN_AT, default_quotas=None):
+        self.path = pathlib.Path(path)
+        self.flush_interval = flush_interval
+        self.warn_at = warn_at
+        self.default_quotas = dict(default_quotas or {})
+        self.flush_count = 0
+        self._day = None
+        self._totals = {}  # (활동 코드, 학생) -> 오늘 합계
+        self._activity_totals = {}  # 활동 코드 -> 오늘 합계
+        self._pending = {}  # (날짜, 활동 코드, 학생) -> 아직 파일에 쓰지 않은 증가분
+        self._lock = threading.Lock()
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # 날짜가 바뀌었으면 메모리 합계를 오늘 것으로 바꿉니다 (self._lock을 잡은 상태에서 호출)
+    def _roll_day(self):
+        today = _today()
+        if self._day == today:
+            return today
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT activity, student, requests, input_tokens, output_tokens, images FROM usage WHERE day = ?", (today,)
+            ).fetchall()
+        self._day = today
+        self._totals, self._activity_totals = {}, {}
+        for activity, student, *values in rows:
+            self._add(activity, student, dict(zip(_COUNTERS, values)))
+        # 아직 쓰지 않은 오늘 증가분도 합계에 넣습니다
+        for (day, activity, student), counts in self._pending.items():
+            if day == today:
+                self._add(activity, student, counts)
+        return today
+
+    def _add(self, activity, student, counts):
+        for totals in (self._totals.setdefault((activity, student), dict.fromkeys(_COUNTERS, 0)),
+                       self._activity_totals.setdefault(activity, dict.fromkeys(_COUNTERS, 0))):
+            for field in _COUNTERS:
+                totals[field] += counts.get(field, 0)
+
+    # 모델 호출 한 번의 사용량(metrics.stage의 usage 사전: input_tokens, output_tokens, images)을 더합니다
+    def record(self, activity, student, usage):
+        counts = {
+            "requests": 1,
+            "input_tokens": int(usage.get("input_tokens") or 0),
+            "output_tokens": int(usage.get("output_tokens") or 0),
+            "images": int(usage.get("images") or 0),
+        }
+        activity, student = activity or "", student or ""
+        with self._lock:
+            day = self._roll_day()
+            self._add(activity, student, counts)
+            pending = self._pending.setdefault((day, activity, student), dict.fromkeys(_COUNTERS, 0))
+            for field in _COUNTERS:
+                pending[field] += counts[field]
+
+    # 오늘 사용량 (student를 주면 그 학생의 것만)
+    def totals(self, activity, student=None):
+        with self._lock:
+            self._roll_day()
+            if student is None:
+                counts = self._activity_totals.get(activity or "")
+            else:
+                counts = self._totals.get((activity or "", student or ""))
+            return dict(counts) if counts else dict.fromkeys(_COUNTERS, 0)
+
+    # 한도를 확인해 넘었으면 QuotaExceeded를 내고, 거의 다 썼으면 경고 문구를, 아니면 None을 반환합니다
+    # quotas는 Notion 설정 행의 한도(QUOTA_FIELDS)이고, 비어 있는 항목은 [usage]의 기본 한도를 씁니다.
+    # images에는 이번에 만들 이미지 수를 넘겨 여러 장을 만들다 한도를 넘지 않게 합니다.
+    # student가 None이면 활동 코드 한도만 확인합니다 (교사용 일괄 분석).
+    def enforce(self, activity, student, quotas=None, images=0):
+        quotas = {**self.default_quotas, **{k: v for k, v in (quotas or {}).items() if v is not None}}
+        activity_counts = self.totals(activity)
+        checks = [
+            ("token_quota", _tokens(activity_counts), 0, "이 활동 코드의 오늘 AI 사용량이"),
+            ("image_quota", activity_counts["images"], images, "이 활동 코드의 오늘 이미지 생성 수가"),
+        ]
+        if student is not None:
+            student_counts = self.totals(activity, student)
+            checks += [
+                ("student_token_quota", _tokens(student_counts), 0, "오늘 내 AI 사용량이"),
+                ("student_image_quota", student_counts["images"], images, "오늘 내 이미지 생성 수가"),
+            ]
+        warning = None
+        for field, used, wanted, label in checks:
+            quota = quotas.get(field)
+            if not quota:
+                continue
+            if used >= quota or (wanted and used + wanted > quota):
+                raise QuotaExceeded(f"⛔ {label} 한도({quota:,})에 도달했습니다. 선생님께 알려 주세요.")
+            if warning is None and used + wanted >= quota * self.warn_at:
+                warning = f"⚠️ {label} 한도({quota:,})의 {(used + wanted) / quota:.0%}에 이르렀습니다."
+        return warning
+
+    # 날짜별 사용량 목록 (교사용 대시보드). by_student가 False면 활동 코드별로 합칩니다.
+    def report(self, since_day=None, by_student=False):
+        self.flush()
+        group = "activity, student" if by_student else "activity"
+        with self._connect() as db:
+            rows = db.execute(
+                f"SELECT {group}, COUNT(DISTINCT student), SUM(requests), SUM(input_tokens), SUM(output_tokens), SUM(images) "
+                f"FROM usage WHERE day >= ? GROUP BY {group} ORDER BY {group}", (since_day or "",),
+            ).fetchall()
+        columns = (["activity", "student"] if by_student else ["activity"]) + ["students", *_COUNTERS]
+        return [dict(zip(columns, row)) for row in rows]
+
+    # 모인 증가분을 한 번의 트랜잭션으로 씁니다
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    "INSERT INTO usage (day, activity, student, requests, input_tokens, output_tokens, images) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day, activity, student) DO UPDATE SET "
+                    "requests = requests + excluded.requests, input_tokens = input_tokens + excluded.input_tokens, "
+                    "output_tokens = output_tokens + excluded.output_tokens, images = images + excluded.images",
+                    [(*key, *(counts[field] for field in _COUNTERS)) for key, counts in pending.items()],
+                )
+        except sqlite3.Error:
+            # 쓰지 못한 증가분은 다음 주기에 다시 씁니다
+            with self._lock:
+                for key, counts in pending.items():
+                    target = self._pending.setdefault(key, dict.fromkeys(_COUNTERS, 0))
+                    for field in _COUNTERS:
+                        target[field] += counts[field]
+            raise
+        self.flush_count += 1
+        return len(pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "activities_today": len(self._activity_totals),
+                "students_today": len(self._totals),
+                "pending_rows": len(self._pending),
+                "flushes": self.flush_count,
+            }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="usage-meter", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        last_cleanup = 0
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.monotonic() - last_cleanup > 24 * 3600:
+                    cutoff = time.strftime("%Y-%m-%d", time.localtime(time.time() - KEEP_DAYS * 24 * 3600))
+                    with self._connect() as db:
+                        db.execute("DELETE FROM usage WHERE day < ?", (cutoff,))
+                    last_cleanup = time.monotonic()
+            except sqlite3.Error:
+                pass
+
+
+_meter = None
+_meter_lock = threading.Lock()
+
+
+# secrets.toml의 [usage] 설정으로 모든 세션이 함께 쓰는 사용량 기록기를 만듭니다
+#   [usage]
+#   path = ".data/usage.sqlite3"
+#   warn_at = 0.8              # 한도의 이 비율부터 경고
+#   token_quota = 200000       # Notion 설정 행에 한도가 없을 때 쓰는 기본값 (QUOTA_FIELDS, 하루 기준)
+def get_usage_meter(usage_settings):
+    global _meter
+    with _meter_lock:
+        if _meter is None:
+            _meter = UsageMeter(
+                path=usage_settings.get("path", DEFAULT_USAGE_PATH),
+                flush_interval=float(usage_settings.get("flush_interval", FLUSH_INTERVAL)),
+                warn_at=float(usage_settings.get("warn_at", WARN_AT)),
+                default_quotas={field: int(usage_settings[field]) for field in QUOTA_FIELDS if usage_settings.get(field)},
+            ).start()
+        return _meter
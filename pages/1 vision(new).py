@@ -1,13 +1,17 @@
 import streamlit as st
-import google.generativeai as genai
-import requests
-import pathlib
-import toml
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from PIL import Image, UnidentifiedImageError
-import io
+import hashlib
+import time
+from PIL import UnidentifiedImageError
+from core.admission import AdmissionTimeout
+from core.images import MAX_IMAGES, image_options, prepare_images
+from core.ledger import current_session_id, ledger
+from core.mail import deliver_result
+from core.notion_client import NOTION_CONFIG_ERROR, NotionError
+from core.notion_index import activity_quotas, lookup_activity
+from core.resources import call_gemini, get_admission_queue, get_cache_backend, get_metrics, get_notion_settings_index, get_screener, get_secrets, get_submission_sink, get_usage_meter, warm_up
+from core.response_cache import get_response_cache, response_key
+from core.streaming import TimedStream, gemini_chunks
+from core.usage import QuotaExceeded
 
 # 페이지 설정 - 아이콘과 제목 설정
 st.set_page_config(
@@ -56,82 +60,100 @@ hide_menu_style = """
 st.markdown(hide_menu_style, unsafe_allow_html=True)
 st.markdown(page_bg_css, unsafe_allow_html=True)
 
-# secrets.toml 파일 경로
-secrets_path = pathlib.Path(__file__).parent.parent / ".streamlit/secrets.toml"
-
-# secrets.toml 파일 읽기
-with open(secrets_path, "r") as f:
-    secrets = toml.load(f)
-
-# Gemini API 키 설정
-gemini_api_key1 = secrets["google"]["gemini_api_key1"]
-genai.configure(api_key=gemini_api_key1)
-
-# Notion API 설정
-NOTION_API_KEY = secrets["notion"]["api_key"]
-NOTION_DATABASE_ID = secrets["notion"]["database_id"]
-
-# Notion에서 프롬프트와 교사 이메일 가져오기
-def get_prompt_and_teacher_email_from_notion(setting_name):
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
-    }
-    data = {
-        "filter": {
-            "property": "setting_name",
-            "rich_text": {
-                "equals": setting_name
-            }
-        }
-    }
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        results = response.json().get("results")
-        if results:
-            for result in results:
-                page_text = result["properties"]["page"]["rich_text"][0]["text"]["content"]
-                if "vision" in page_text:
-                    prompt = result["properties"]["prompt"]["rich_text"][0]["text"]["content"]
-                    teacher_email = result["properties"]["email"]["rich_text"][0]["plain_text"]
-                    return prompt, teacher_email
-    return None, None
+# 프로세스 전체에서 한 번만 준비하는 secrets와 Notion 설정 색인 (AI 클라이언트는 키별로 필요할 때 생성)
+warm_up()
+secrets = get_secrets()
+VISION_MODEL = 'gemini-1.5-flash'
+# 한 번에 함께 보내는 최대 이미지 수 ([vision] max_images)
+max_images = int(secrets.get("vision", {}).get("max_images", MAX_IMAGES))
+settings_index = get_notion_settings_index()
 
-# 이메일 전송 기능
-def send_email_to_teacher(student_name, teacher_email, prompt, image_data, ai_response):
-    msg = MIMEMultipart()
-    msg["From"] = secrets["email"]["address"]
-    msg["To"] = teacher_email
-    msg["Subject"] = f"{student_name} 학생의 AI 생성 활동 결과"
+# 단계별 소요 시간과 토큰 사용량 기록 (교사용 대시보드와 Prometheus 파일에서 확인)
+metrics = get_metrics()
+
+# 모든 세션이 함께 쓰는 Gemini 동시 호출 제한
+vision_queue = get_admission_queue("gemini", VISION_MODEL)
+
+# 유료 호출 전에 금칙어와 이미지를 먼저 확인하는 사전 검사 (모든 세션 공유)
+screener = get_screener()
+
+# 같은 파일은 한 번만 검사합니다 (위젯을 건드릴 때마다 페이지가 다시 실행되므로 내용 해시로 결과를 세션에 기억)
+def screen_image(data):
+    checks = st.session_state.setdefault("image_checks", {})
+    digest = hashlib.sha256(data).hexdigest()
+    if digest not in checks:
+        checks[digest] = screener.check_image(st.session_state.setting_name, data)
+    return checks[digest]
 
-    body = f"""
-    학생 이름: {student_name}
+# 활동 코드와 학생별 사용량 기록과 하루 한도 (Notion 설정 행의 token_quota 등)
+meter = get_usage_meter()
 
-    사용된 프롬프트:
-    {prompt}
+# 한도를 넘었으면 QuotaExceeded를 내고, 거의 다 썼으면 경고를 보여 줍니다
+def check_quota(student_name):
+    warning = meter.enforce(st.session_state.setting_name, student_name,
+                            activity_quotas(settings_index, st.session_state.setting_name, "vision"))
+    if warning:
+        st.warning(warning)
 
-    AI 생성 결과:
-    {ai_response}
-    """
-    msg.attach(MIMEText(body, "plain"))
+# 차례를 기다리는 동안 대기 순서와 예상 시간을 보여 줍니다
+def show_queue_position(placeholder):
+    def on_wait(position, wait):
+        placeholder.info(f"⏳ 요청이 많아 차례를 기다리고 있어요. 내 순서: {position}번째 · 예상 대기 약 {wait:.0f}초")
+    return on_wait
 
-    # 이미지 첨부
-    img = MIMEText(image_data, "base64", "utf-8")
-    img.add_header("Content-Disposition", "attachment", filename="image.png")
-    msg.attach(img)
+# 서버 프로세스가 여럿일 때 활동 코드와 분석 결과를 함께 쓰는 캐시 저장소 ([cache] backend)
+shared_cache = get_cache_backend()
+
+# 같은 이미지와 프롬프트의 분석 결과를 디스크에 보관해 유료 호출을 건너뜁니다
+response_cache = get_response_cache(secrets.get("cache", {}), shared_cache)
+
+# 프롬프트와 이미지를 한 번의 Gemini 요청 내용으로 만듭니다 (여러 장이면 순서를 알 수 있게 번호를 붙임)
+def vision_contents(prompt, prepared_images):
+    contents = [prompt]
+    for i, prepared in enumerate(prepared_images, start=1):
+        if len(prepared_images) > 1:
+            contents.append(f"[이미지 {i}]")
+        contents.append({"mime_type": prepared.mime_type, "data": prepared.data})
+    return contents
+
+# 이메일 전송 기능
+def send_email_to_teacher(student_name, teacher_email, prompt, prepared_images, ai_response):
+    fields = [
+        ("사용된 프롬프트", prompt),
+        ("AI 생성 결과", ai_response),
+    ]
+    # 전처리된 이미지를 모두 한 메일에 그대로 첨부
+    attachments = []
+    for i, prepared in enumerate(prepared_images, start=1):
+        extension = prepared.mime_type.split("/")[-1]
+        filename = f"image{i}.{extension}" if len(prepared_images) > 1 else f"image.{extension}"
+        attachments.append((filename, prepared.data, prepared.mime_type))
 
-    # 이메일 전송
+    # 이메일은 발송 대기열(또는 요약 메일 버퍼)에 넣기만 하고, 실제 발송은 백그라운드 작업자가 맡습니다
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(secrets["email"]["address"], secrets["email"]["password"])
-            server.send_message(msg)
+        with metrics.stage("email_queue", st.session_state.setting_name):
+            deliver_result(secrets["email"], teacher_email, st.session_state.setting_name, student_name,
+                           f"{student_name} 학생의 AI 생성 활동 결과", fields, attachments)
         return True  # 이메일 전송 성공 시 True 반환
     except Exception as e:
         st.error(f"이메일 전송에 실패했습니다: {e}")
         return False  # 이메일 전송 실패 시 False 반환
 
+# 결과를 Notion 제출 데이터베이스에도 기록 ([submissions]가 켜져 있을 때, 로컬 대기열에 넣기만 함)
+submissions = get_submission_sink()
+
+def save_submission(student_name, prompt, prepared_images, ai_response):
+    if submissions is None:
+        return
+    image_ref = ", ".join(
+        f"{prepared.width}x{prepared.height} sha256:{hashlib.sha256(prepared.data).hexdigest()[:16]}"
+        for prepared in prepared_images
+    )
+    try:
+        submissions.add(student_name, st.session_state.setting_name, "vision", prompt, ai_output=ai_response, image_ref=image_ref)
+    except Exception:
+        pass  # 기록 실패가 학생 화면이나 이메일을 막지 않도록 합니다
+
 # 학생용 UI
 st.header('🎓 학생용: AI 교육 활동 도구')
 
@@ -140,7 +162,7 @@ st.markdown("""
     1. **학생 이름 입력**: 본인의 이름을 입력하세요.
     2. **활동 코드 입력**: 교사가 제공한 활동 코드를 입력하세요.
     3. **프롬프트 가져오기**: 활동 코드에 해당하는 프롬프트를 불러옵니다.
-    4. **이미지 업로드**: 교육 활동에 사용할 이미지를 업로드하거나 카메라로 촬영하세요.
+    4. **이미지 업로드**: 교육 활동에 사용할 이미지를 업로드하거나 카메라로 촬영하세요. 여러 장을 함께 올릴 수 있습니다.
     5. **AI 활동 수행**: AI가 제공된 프롬프트와 이미지를 바탕으로 창의적인 교육 활동을 도와줍니다.
 """)
 
@@ -154,49 +176,121 @@ setting_name = st.text_input("🔑 활동 코드 입력")
 
 if st.button("📄 프롬프트 가져오기", key="get_prompt"):
     with st.spinner('🔍 프롬프트를 불러오는 중입니다...'):
-        prompt, teacher_email = get_prompt_and_teacher_email_from_notion(setting_name)
-        if prompt and teacher_email:
-            st.session_state.prompt = prompt
-            st.session_state.teacher_email = teacher_email
-            st.success("✅ 프롬프트를 성공적으로 불러왔습니다.")
+        try:
+            # 모든 세션이 공유하는 설정 색인에서 먼저 찾고, 없으면 공용 Notion 클라이언트로 조회합니다
+            with metrics.stage("notion_lookup", setting_name):
+                prompt, teacher_email = lookup_activity(settings_index, setting_name, "vision", shared_cache)
+        except NotionError as e:
+            if e.retryable:
+                # 잠시 요청이 몰려 재시도 후에도 실패한 경우 (활동 코드 문제가 아님)
+                st.error("⚠️ 지금 접속이 많아 프롬프트를 불러오지 못했습니다. 잠시 후 다시 시도하세요.")
+            else:
+                st.error(NOTION_CONFIG_ERROR)  # API 키나 데이터베이스 id 문제 (접속이 많아서가 아님)
         else:
-            st.error("⚠️ 활동 코드를 다시 확인하세요.")  # 코드 불러오기 실패 시 오류 메시지
+            if prompt and teacher_email:
+                st.session_state.prompt = prompt
+                st.session_state.teacher_email = teacher_email
+                st.session_state.setting_name = setting_name
+                st.success("✅ 프롬프트를 성공적으로 불러왔습니다.")
+            else:
+                st.error("⚠️ 활동 코드를 다시 확인하세요.")  # 코드 불러오기 실패 시 오류 메시지
 
 if "prompt" in st.session_state and st.session_state.prompt:
     st.write("**프롬프트:** " + st.session_state.prompt)
 
     # 이미지 업로드 또는 카메라 촬영
     st.write("📸 이미지를 업로드하거나 카메라로 촬영하여 프롬프트를 처리하세요.")
-    image = st.file_uploader("이미지 업로드", type=["jpg", "jpeg", "png"])
-
-    if image:
-        st.image(image, caption='선택된 이미지', use_column_width=True)
+    images = st.file_uploader(f"이미지 업로드 (최대 {max_images}장)", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
 
+    # 지원하지 않는 형식, 너무 크거나 작은 사진은 PIL로 열기 전에 바로 돌려보냅니다
+    image_problems = [
+        f"{image.name}: {problem}" for image in images or []
+        if (problem := screen_image(image.getvalue()))
+    ]
+    if images and len(images) > max_images:
+        st.error(f"❌ 이미지는 한 번에 {max_images}장까지 올릴 수 있습니다. 몇 장을 빼 주세요.")
+    elif image_problems:
+        st.error("❌ " + " / ".join(image_problems) + " 다른 파일을 업로드해 주세요.")
+    elif images:
         try:
-            with st.spinner('🧠 AI가 이미지를 분석하여 창의적인 교육 활동을 도와줍니다...'):
-                # 이미지 바이트 문자열로 변환
-                img_bytes = image.read()
-
-                # bytes 타입의 이미지 데이터를 PIL.Image.Image 객체로 변환
-                img = Image.open(io.BytesIO(img_bytes))
+            # 방향 보정, 크기 축소, 재인코딩을 여러 장 동시에 한 번만 하고 미리보기, Gemini 호출, 이메일 첨부에 함께 사용
+            started = time.perf_counter()
+            with metrics.stage("image_prepare", st.session_state.setting_name):
+                prepared_images = prepare_images([image.getvalue() for image in images], **image_options(secrets.get("vision", {})))
+            prepare_seconds = time.perf_counter() - started
+            if len(prepared_images) == 1:
+                st.image(prepared_images[0].data, caption='선택된 이미지', use_column_width=True)
+            else:
+                for i, (column, prepared) in enumerate(zip(st.columns(len(prepared_images)), prepared_images), start=1):
+                    column.image(prepared.data, caption=f'이미지 {i}', use_column_width=True)
+            saved_kb = sum(prepared.original_bytes - len(prepared.data) for prepared in prepared_images) / 1024
+            st.caption(f"이미지 최적화: {saved_kb:,.0f}KB 절약, {prepare_seconds * 1000:.0f}ms")
+            image_data = [prepared.data for prepared in prepared_images]
 
-                model = genai.GenerativeModel('gemini-1.5-flash')
-
-                # Generate content
-                response = model.generate_content([
-                    st.session_state.prompt, img
-                ])
+            with st.spinner('🧠 AI가 이미지를 분석하여 창의적인 교육 활동을 도와줍니다...'):
+                # 다시 실행(rerun)되어도 이번 세션에서 이미 분석한 사진이면 기록해 둔 결과를 그대로 보여 줍니다
+                submission_key = ledger.key(current_session_id(), st.session_state.setting_name, "vision", st.session_state.prompt, student_name, *image_data)
+                ai_response_text = ledger.result(submission_key)
+                if ai_response_text is not None:
+                    st.markdown(ai_response_text)
+                else:
+                    cache_key = response_key(VISION_MODEL, st.session_state.prompt, *image_data)
+                    ai_response_text = response_cache.get(cache_key)
+                    if ai_response_text is None:
+                        queue_notice = st.empty()
+                        try:
+                            check_quota(student_name)
+                            # 한 반이 한꺼번에 올리면 정해진 수만큼만 동시에 호출하고, 나머지는 차례를 기다립니다
+                            with vision_queue.slot(st.session_state.setting_name, show_queue_position(queue_notice), "gemini", VISION_MODEL):
+                                queue_notice.empty()
+                                with metrics.stage("model", st.session_state.setting_name, "gemini", VISION_MODEL) as usage:
+                                    # Generate content (생성되는 글자를 바로 보여 줌, 여러 Gemini 키에 나눠 요청)
+                                    # 이미지가 여러 장이어도 한 번의 요청으로 함께 보냅니다
+                                    started = time.perf_counter()
+                                    contents = vision_contents(st.session_state.prompt, prepared_images)
+                                    response = call_gemini(VISION_MODEL, lambda model: model.generate_content(contents, stream=True))
 
-                # Resolve the response
-                response.resolve()
+                                    timed = TimedStream("vision", gemini_chunks(response, usage), started)
+                                    st.write_stream(timed)
+                                    st.caption(f"첫 글자 {timed.ttft or 0:.1f}초 · 전체 {timed.total:.1f}초")
+                                    usage["ttft"] = timed.ttft
+                                meter.record(st.session_state.setting_name, student_name, usage)
 
-                ai_response_text = response.text
-                st.markdown(ai_response_text)
+                            ai_response_text = timed.text
+                            if ai_response_text.strip():
+                                response_cache.set(cache_key, ai_response_text)
+                            else:
+                                # 빈 응답(안전 필터 차단 등)은 실패로 보고 기록하거나 교사에게 보내지 않습니다
+                                ai_response_text = None
+                                st.error("⚠️ AI가 빈 응답을 보냈습니다. 잠시 후 다시 시도하세요.")
+                        except AdmissionTimeout:
+                            queue_notice.empty()
+                            st.error("⚠️ 지금 요청이 너무 많습니다. 잠시 후 다시 시도하세요.")
+                        except QuotaExceeded as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            # 실패는 metrics.stage가 기록하고, 답이 없으니 제출 기록과 이메일은 남기지 않습니다
+                            queue_notice.empty()
+                            st.error(f"❌ AI 분석에 실패했습니다. 잠시 후 다시 시도하세요. ({e})")
+                    else:
+                        metrics.record_stage("model", st.session_state.setting_name, 0.0, provider="gemini",
+                                             model=VISION_MODEL, usage={"cached": True})
+                        st.markdown(ai_response_text)
+                    if ai_response_text:
+                        ledger.record(submission_key, ai_response_text)
 
-                # 결과와 이미지를 교사에게 이메일로 전송
-                if send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, img_bytes, ai_response_text):
-                    st.success("📧 교사에게 이메일로 결과가 전송되었습니다.")
+                # 결과와 이미지를 교사에게 이메일로 전송 (같은 제출은 한 번만)
+                if ai_response_text is not None:
+                    if not ledger.should_deliver(submission_key):
+                        st.success("📧 이 결과는 이미 교사에게 보냈습니다.")
+                    elif send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, prepared_images, ai_response_text):
+                        ledger.mark_delivered(submission_key)
+                        st.success("📧 결과를 교사에게 이메일로 보냅니다.")
+                        save_submission(student_name, st.session_state.prompt, prepared_images, ai_response_text)
         except UnidentifiedImageError:
             st.error("❌ 업로드된 파일이 유효한 이미지 파일이 아닙니다. 다른 파일을 업로드해 주세요.")
+        except Exception as e:
+            # 잘린 JPEG처럼 열리기는 해도 읽다가 실패하는 사진(OSError 등)
+            st.error(f"❌ 이미지를 처리하지 못했습니다. 다른 파일을 업로드해 주세요. ({e})")
 else:
     st.info("프롬프트를 업로드하세요.")
@@ -1,9 +1,16 @@
 import streamlit as st
-from openai import OpenAI
-import requests
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
+from core.admission import AdmissionTimeout
+from core.answer_cache import cache_policy
+from core.conversation import chat_options, fit_messages, transcript_text
+from core.ledger import current_session_id, ledger
+from core.mail import deliver_result
+from core.notion_client import NOTION_CONFIG_ERROR, NotionError
+from core.notion_index import activity_answer_cache, activity_quotas, lookup_activity
+from core.resources import call_openai, get_admission_queue, get_answer_cache, get_cache_backend, get_metrics, get_notion_settings_index, get_screener, get_secrets, get_submission_sink, get_usage_meter, warm_up
+from core.screening import TEXT_REJECTED
+from core.streaming import TimedStream, openai_chunks
+from core.usage import QuotaExceeded
 
 # 페이지 설정 - 아이콘과 제목 설정
 st.set_page_config(
@@ -52,79 +59,95 @@ hide_menu_style = """
 st.markdown(hide_menu_style, unsafe_allow_html=True)
 st.markdown(page_bg_css, unsafe_allow_html=True)
 
-# OpenAI API 클라이언트 초기화
-client = OpenAI(api_key=st.secrets["api"]["keys"][0])
-
-# Notion API를 통해 프롬프트와 교사 이메일 가져오기
-NOTION_API_URL = "https://api.notion.com/v1/databases/{database_id}/query"
-NOTION_API_KEY = st.secrets["notion"]["api_key"]
-DATABASE_ID = st.secrets["notion"]["database_id"]
-headers = {
-    "Authorization": f"Bearer {NOTION_API_KEY}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
-
-def fetch_prompt_and_email_from_notion(setting_name):
-    query_payload = {
-        "filter": {
-            "property": "setting_name",
-            "rich_text": {
-                "equals": setting_name
-            }
-        }
-    }
-    response = requests.post(NOTION_API_URL.format(database_id=DATABASE_ID), headers=headers, json=query_payload)
-    data = response.json()
-
-    if "results" in data and len(data["results"]) > 0:
-        for result in data["results"]:
-            if ("page" in result["properties"]
-                and "rich_text" in result["properties"]["page"]
-                and len(result["properties"]["page"]["rich_text"]) > 0
-                and "text" in result["properties"]["page"]["rich_text"][0]["text"]["content"].lower()):
-                
-                prompt = result["properties"]["prompt"]["rich_text"][0]["text"]["content"]
-                
-                # email 필드에서 plain_text 속성을 가져오기
-                teacher_email = result["properties"]["email"]["rich_text"][0]["plain_text"]
-                
-                return prompt, teacher_email
-    return None, None
+# 프로세스 전체에서 한 번만 준비하는 secrets와 Notion 설정 색인 (AI 클라이언트는 키별로 필요할 때 생성)
+warm_up()
+secrets = get_secrets()
+settings_index = get_notion_settings_index()
+
+# 단계별 소요 시간과 토큰 사용량 기록 (교사용 대시보드와 Prometheus 파일에서 확인)
+metrics = get_metrics()
+
+# 모든 세션이 함께 쓰는 gpt-4o-mini 동시 호출 제한
+text_queue = get_admission_queue("openai", "gpt-4o-mini")
+
+# 유료 호출 전에 학생 글에 금칙어가 있는지 먼저 확인하는 사전 검사 (모든 세션 공유)
+screener = get_screener()
+
+# 서버 프로세스가 여럿일 때 활동 코드와 재사용할 AI 답을 함께 쓰는 캐시 저장소 ([cache] backend)
+shared_cache = get_cache_backend()
+
+# 같은 프롬프트에 거의 같은 답을 낸 학생에게 AI 답을 다시 쓰는 캐시 ([answer_cache] enabled일 때만 사용)
+answer_cache = get_answer_cache()
+
+# 활동 코드와 학생별 사용량 기록과 하루 한도 (Notion 설정 행의 token_quota 등)
+meter = get_usage_meter()
+
+# 한도를 넘었으면 QuotaExceeded를 내고, 거의 다 썼으면 경고를 보여 줍니다
+def check_quota(student_name):
+    warning = meter.enforce(st.session_state.setting_name, student_name,
+                            activity_quotas(settings_index, st.session_state.setting_name, "text"))
+    if warning:
+        st.warning(warning)
+
+# 대화 모드의 토큰 예산 (secrets.toml의 [chat] 설정)
+chat = chat_options(secrets.get("chat", {}))
+
+# 차례를 기다리는 동안 대기 순서와 예상 시간을 보여 줍니다
+def show_queue_position(placeholder):
+    def on_wait(position, wait):
+        placeholder.info(f"⏳ 요청이 많아 차례를 기다리고 있어요. 내 순서: {position}번째 · 예상 대기 약 {wait:.0f}초")
+    return on_wait
 
 def send_email_to_teacher(student_name, teacher_email, prompt, student_answer, ai_answer):
     if not teacher_email:
         st.warning("교사 이메일이 설정되어 있지 않습니다.")
         return False  # 이메일 전송 실패
 
-    msg = MIMEMultipart()
-    msg["From"] = st.secrets["email"]["address"]
-    msg["To"] = teacher_email
-    msg["Subject"] = f"{student_name} 학생의 AI 생성 활동 결과"
-
-    body = f"""
-    학생 이름: {student_name}
-    
-    사용된 프롬프트:
-    {prompt}
-
-    학생의 입력:
-    {student_answer}
+    fields = [
+        ("사용된 프롬프트", prompt),
+        ("학생의 입력", student_answer),
+        ("AI가 생성한 대화", ai_answer),
+    ]
+    # 이메일은 발송 대기열(또는 요약 메일 버퍼)에 넣기만 하고, 실제 발송은 백그라운드 작업자가 맡습니다
+    try:
+        with metrics.stage("email_queue", st.session_state.setting_name):
+            deliver_result(secrets["email"], teacher_email, st.session_state.setting_name, student_name,
+                           f"{student_name} 학생의 AI 생성 활동 결과", fields)
+        return True  # 이메일 전송 성공
+    except Exception as e:
+        st.error(f"이메일 전송에 실패했습니다: {e}")
+        return False  # 이메일 전송 실패
 
-    AI가 생성한 대화:
-    {ai_answer}
-    """
-    msg.attach(MIMEText(body, "plain"))
+# 대화 모드에서는 대화가 끝났을 때 전체 기록을 한 번만 보냅니다
+def send_transcript_to_teacher(student_name, teacher_email, prompt, transcript):
+    if not teacher_email:
+        st.warning("교사 이메일이 설정되어 있지 않습니다.")
+        return False  # 이메일 전송 실패
 
+    fields = [
+        ("사용된 프롬프트", prompt),
+        ("대화 기록", transcript),
+    ]
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(st.secrets["email"]["address"], st.secrets["email"]["password"])
-            server.send_message(msg)
+        with metrics.stage("email_queue", st.session_state.setting_name):
+            deliver_result(secrets["email"], teacher_email, st.session_state.setting_name, student_name,
+                           f"{student_name} 학생의 AI 대화 기록", fields)
         return True  # 이메일 전송 성공
     except Exception as e:
         st.error(f"이메일 전송에 실패했습니다: {e}")
         return False  # 이메일 전송 실패
 
+# 결과를 Notion 제출 데이터베이스에도 기록 ([submissions]가 켜져 있을 때, 로컬 대기열에 넣기만 함)
+submissions = get_submission_sink()
+
+def save_submission(student_name, prompt, student_answer, ai_answer):
+    if submissions is None:
+        return
+    try:
+        submissions.add(student_name, st.session_state.setting_name, "text", prompt, student_answer, ai_answer)
+    except Exception:
+        pass  # 기록 실패가 학생 화면이나 이메일을 막지 않도록 합니다
+
 # 학생용 UI
 st.header('🎓 학생용: 인공지능 대화 생성 도구')
 
@@ -134,7 +157,7 @@ st.markdown("""
     2. **코드 입력**: 수업과 관련된 코드를 입력하세요.
     3. **프롬프트 가져오기**: 코드를 입력한 후 '프롬프트 가져오기' 버튼을 클릭하면, 관련된 프롬프트를 불러옵니다.
     4. **활동 입력**: 제공된 프롬프트를 기반으로 자신의 활동을 작성하세요.
-    5. **AI 대화 생성**: 작성한 활동을 바탕으로 AI가 관련된 대화를 생성합니다.
+    5. **AI 대화 생성**: 작성한 활동을 바탕으로 AI가 관련된 대화를 생성합니다. 'AI와 대화하기'를 고르면 AI와 이어서 대화할 수 있고, 대화를 마치면 전체 기록이 교사에게 한 번 전달됩니다.
     6. **결과 확인**: AI가 생성한 대화를 확인하고 필요시 저장하세요.
 """)
 
@@ -148,37 +171,200 @@ setting_name = st.text_input("🔑 활동 코드 입력")
 
 if st.button("📄 프롬프트 가져오기", key="get_prompt"):
     with st.spinner("🔍 프롬프트를 불러오는 중..."):
-        prompt, teacher_email = fetch_prompt_and_email_from_notion(setting_name)
-        if prompt:
-            st.session_state.prompt = prompt
-            st.session_state.teacher_email = teacher_email
+        try:
+            # 모든 세션이 공유하는 설정 색인에서 먼저 찾고, 없으면 공용 Notion 클라이언트로 조회합니다
+            with metrics.stage("notion_lookup", setting_name):
+                prompt, teacher_email = lookup_activity(settings_index, setting_name, "text", shared_cache)
+        except NotionError as e:
+            if e.retryable:
+                # 잠시 요청이 몰려 재시도 후에도 실패한 경우 (활동 코드 문제가 아님)
+                st.error("⚠️ 지금 접속이 많아 프롬프트를 불러오지 못했습니다. 잠시 후 다시 시도하세요.")
+            else:
+                st.error(NOTION_CONFIG_ERROR)  # API 키나 데이터베이스 id 문제 (접속이 많아서가 아님)
         else:
-            st.error("활동 코드를 다시 확인하세요.")  # 코드 불러오기 실패 시 오류 메시지
+            if prompt:
+                st.session_state.prompt = prompt
+                st.session_state.teacher_email = teacher_email
+                st.session_state.setting_name = setting_name
+            else:
+                st.error("활동 코드를 다시 확인하세요.")  # 코드 불러오기 실패 시 오류 메시지
 
 if "prompt" in st.session_state and st.session_state.prompt:
     st.success("✅ 프롬프트를 성공적으로 불러왔습니다.")
     st.write("**프롬프트:** " + st.session_state.prompt)
 
-    student_answer = st.text_area("📝 활동 입력", value=st.session_state.get("student_answer", ""))
-
-    if st.button("🤖 AI 대화 생성", key="generate_answer"):
-        if student_answer:
-            with st.spinner("💬 AI가 대화를 생성하는 중..."):
-                st.session_state.student_answer = student_answer
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": st.session_state.prompt},
-                        {"role": "user", "content": student_answer}
-                    ]
-                )
-
-                st.session_state.ai_answer = response.choices[0].message.content.strip()
-                st.write("💡 **AI 생성 대화:** " + st.session_state.ai_answer)
-
-                if send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, student_answer, st.session_state.ai_answer):
-                    st.success("📧 교사에게 이메일로 결과가 전송되었습니다.")
+    mode = st.radio("활동 방식", ["한 번 답 받기", "AI와 대화하기"], horizontal=True)
+
+    if mode == "한 번 답 받기":
+        student_answer = st.text_area("📝 활동 입력", value=st.session_state.get("student_answer", ""))
+
+        if st.button("🤖 AI 대화 생성", key="generate_answer"):
+            # 어울리지 않는 표현이 있으면 모델을 부르지 않고 바로 돌려보냅니다
+            if student_answer and screener.check_text(st.session_state.setting_name, student_answer):
+                st.error(TEXT_REJECTED)
+            elif student_answer:
+                with st.spinner("💬 AI가 대화를 생성하는 중..."):
+                    st.session_state.student_answer = student_answer
+                    # 같은 내용으로 다시 누르면 이번 세션에서 받은 답을 다시 보여 주고, 새로 호출하거나 메일을 또 보내지 않습니다
+                    submission_key = ledger.key(current_session_id(), st.session_state.setting_name, "text", st.session_state.prompt, student_name, student_answer)
+                    ai_answer = ledger.result(submission_key)
+                    # 비슷한 답 재사용이 켜진 활동이면 다른 학생이 띄어쓰기나 문장 부호만 다른 답으로 받은 AI 답을 다시 씁니다
+                    cache_on, cache_ttl = cache_policy(secrets.get("answer_cache", {}),
+                                                       activity_answer_cache(settings_index, st.session_state.setting_name, "text"))
+                    reused = answer_cache.get(st.session_state.setting_name, st.session_state.prompt, student_answer) if cache_on and ai_answer is None else None
+                    if ai_answer is not None:
+                        st.write("💡 **AI 생성 대화:**")
+                        st.markdown(ai_answer)
+                        st.caption("같은 내용이라 이전에 받은 답을 다시 보여 줍니다.")
+                    elif reused is not None:
+                        ai_answer, _ = reused
+                        metrics.record_stage("model", st.session_state.setting_name, 0.0, provider="openai",
+                                             model="gpt-4o-mini", usage={"cached": True})
+                        ledger.record(submission_key, ai_answer)
+                        st.write("💡 **AI 생성 대화:**")
+                        st.markdown(ai_answer)
+                    else:
+                        queue_notice = st.empty()
+                        try:
+                            check_quota(student_name)
+                            # 한 반이 한꺼번에 누르면 정해진 수만큼만 동시에 호출하고, 나머지는 차례를 기다립니다
+                            with text_queue.slot(st.session_state.setting_name, show_queue_position(queue_notice), "openai", "gpt-4o-mini"):
+                                queue_notice.empty()
+                                started = time.perf_counter()
+                                with metrics.stage("model", st.session_state.setting_name, "openai", "gpt-4o-mini") as usage:
+                                    # 여러 OpenAI 키 중 여유 있는 키로 요청 (429를 받으면 다른 키로 다시 시도)
+                                    stream = call_openai(lambda client: client.chat.completions.with_raw_response.create(
+                                        model="gpt-4o-mini",
+                                        messages=[
+                                            {"role": "system", "content": st.session_state.prompt},
+                                            {"role": "user", "content": student_answer}
+                                        ],
+                                        stream=True,
+                                        stream_options={"include_usage": True},
+                                    ))
+
+                                    # 생성되는 글자를 바로 보여 주고, 다 받은 글은 이메일에 사용
+                                    st.write("💡 **AI 생성 대화:**")
+                                    timed = TimedStream("text", openai_chunks(stream, usage), started)
+                                    st.write_stream(timed)
+                                    usage["ttft"] = timed.ttft
+                                meter.record(st.session_state.setting_name, student_name, usage)
+                        except AdmissionTimeout:
+                            queue_notice.empty()
+                            st.error("⚠️ 지금 요청이 너무 많습니다. 잠시 후 다시 시도하세요.")
+                        except QuotaExceeded as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            queue_notice.empty()
+                            st.error(f"❌ AI 답을 받지 못했습니다. 잠시 후 다시 시도하세요. ({e})")
+                        else:
+                            ai_answer = timed.text.strip()
+                            if ai_answer:
+                                ledger.record(submission_key, ai_answer)
+                                if cache_on:
+                                    answer_cache.set(st.session_state.setting_name, st.session_state.prompt, student_answer, ai_answer, cache_ttl)
+                                st.caption(f"첫 글자 {timed.ttft or 0:.1f}초 · 전체 {timed.total:.1f}초")
+                            else:
+                                # 빈 응답은 실패로 보고 기록하거나 교사에게 보내지 않습니다
+                                ai_answer = None
+                                st.error("⚠️ AI가 빈 응답을 보냈습니다. 잠시 후 다시 시도하세요.")
+
+                    if ai_answer is not None:
+                        st.session_state.ai_answer = ai_answer
+                        if not ledger.should_deliver(submission_key):
+                            st.success("📧 이 결과는 이미 교사에게 보냈습니다.")
+                        elif send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, student_answer, ai_answer):
+                            ledger.mark_delivered(submission_key)
+                            st.success("📧 결과를 교사에게 이메일로 보냅니다.")
+                            save_submission(student_name, st.session_state.prompt, student_answer, ai_answer)
+            else:
+                st.error("⚠️ 활동을 입력하세요.")
+    else:
+        # 대화 기록은 세션에 보관하고, 활동 코드나 프롬프트가 바뀌면 새 대화로 시작합니다
+        chat_activity = (st.session_state.setting_name, st.session_state.prompt)
+        if st.session_state.get("chat_activity") != chat_activity:
+            st.session_state.chat_activity = chat_activity
+            st.session_state.chat_turns = []
+            st.session_state.chat_sent = False
+        turns = st.session_state.chat_turns
+
+        for turn in turns:
+            with st.chat_message(turn["role"]):
+                st.markdown(turn["content"])
+
+        asked = sum(1 for turn in turns if turn["role"] == "user")
+        if st.session_state.chat_sent:
+            st.success("📧 대화 기록을 교사에게 보냈습니다.")
+            if st.button("🔄 새 대화 시작", key="new_chat"):
+                st.session_state.chat_turns = []
+                st.session_state.chat_sent = False
+                st.rerun()
         else:
-            st.error("⚠️ 활동을 입력하세요.")
+            if asked >= chat["max_turns"]:
+                st.info(f"질문은 {chat['max_turns']}번까지 할 수 있습니다. 대화를 마치고 교사에게 보내세요.")
+            question = st.chat_input("AI에게 할 말을 입력하세요", disabled=not student_name or asked >= chat["max_turns"])
+            if question and screener.check_text(st.session_state.setting_name, question):
+                st.error(TEXT_REJECTED)
+            elif question:
+                turns.append({"role": "user", "content": question})
+                with st.chat_message("user"):
+                    st.markdown(question)
+                # 최근 대화는 그대로, 오래된 대화는 줄여서 토큰 예산 안에 맞춥니다
+                messages, condensed = fit_messages(st.session_state.prompt, turns, chat["budget"], chat["summary_budget"])
+                queue_notice = st.empty()
+                try:
+                    check_quota(student_name)
+                    with text_queue.slot(st.session_state.setting_name, show_queue_position(queue_notice), "openai", "gpt-4o-mini"):
+                        queue_notice.empty()
+                        started = time.perf_counter()
+                        with metrics.stage("model", st.session_state.setting_name, "openai", "gpt-4o-mini") as usage:
+                            stream = call_openai(lambda client: client.chat.completions.with_raw_response.create(
+                                model="gpt-4o-mini",
+                                messages=messages,
+                                max_tokens=chat["reply_tokens"],
+                                stream=True,
+                                stream_options={"include_usage": True},
+                            ))
+                            with st.chat_message("assistant"):
+                                timed = TimedStream("chat", openai_chunks(stream, usage), started)
+                                st.write_stream(timed)
+                            usage["ttft"] = timed.ttft
+                            usage["condensed_turns"] = condensed
+                        meter.record(st.session_state.setting_name, student_name, usage)
+                except AdmissionTimeout:
+                    queue_notice.empty()
+                    turns.pop()  # 답을 받지 못한 질문은 기록에서 뺍니다
+                    st.error("⚠️ 지금 요청이 너무 많습니다. 잠시 후 다시 시도하세요.")
+                except QuotaExceeded as e:
+                    turns.pop()
+                    st.error(str(e))
+                except Exception as e:
+                    queue_notice.empty()
+                    turns.pop()
+                    st.error(f"❌ AI 답을 받지 못했습니다. 잠시 후 다시 시도하세요. ({e})")
+                else:
+                    reply = timed.text.strip()
+                    if reply:
+                        turns.append({"role": "assistant", "content": reply})
+                        asked += 1
+                        if condensed:
+                            st.caption(f"앞선 대화 {condensed}개 메시지는 줄여서 AI에게 전달했습니다.")
+                    else:
+                        turns.pop()
+                        st.error("⚠️ AI가 빈 응답을 보냈습니다. 잠시 후 다시 시도하세요.")
+
+            # 대화가 끝나면 전체 기록을 한 번만 교사에게 보냅니다
+            if st.button("📧 대화 마치고 교사에게 보내기", key="send_chat", disabled=not asked or not student_name):
+                transcript = transcript_text(turns, student_name)
+                student_inputs = "\n\n".join(turn["content"] for turn in turns if turn["role"] == "user")
+                submission_key = ledger.key(current_session_id(), st.session_state.setting_name, "chat", st.session_state.prompt, student_name, transcript)
+                if not ledger.should_deliver(submission_key):
+                    st.session_state.chat_sent = True
+                    st.rerun()
+                elif send_transcript_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, transcript):
+                    ledger.mark_delivered(submission_key)
+                    save_submission(student_name, st.session_state.prompt, student_inputs, transcript)
+                    st.session_state.chat_sent = True
+                    st.rerun()
 else:
     st.info("프롬프트를 업로드하세요.")
@@ -1,11 +1,16 @@
 import streamlit as st
-from openai import OpenAI
-import requests
-import pathlib
-import toml
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import base64
+import concurrent.futures
+from core.admission import AdmissionTimeout
+from core.image_store import generation_key, get_image_store
+from core.ledger import current_session_id, ledger
+from core.mail import deliver_result
+from core.notion_client import NOTION_CONFIG_ERROR, NotionError
+from core.notion_index import activity_quotas, lookup_activity
+from core.resources import call_openai, get_admission_queue, get_cache_backend, get_metrics, get_notion_settings_index, get_screener, get_secrets, get_submission_sink, get_usage_meter, warm_up
+from core.screening import TEXT_REJECTED
+from core.singleflight import get_flight
+from core.usage import QuotaExceeded
 
 # 페이지 설정 - 아이콘과 제목 설정
 st.set_page_config(
@@ -54,75 +59,143 @@ hide_menu_style = """
 st.markdown(hide_menu_style, unsafe_allow_html=True)
 st.markdown(page_bg_css, unsafe_allow_html=True)
 
-# secrets.toml 파일 경로
-secrets_path = pathlib.Path(__file__).parent.parent / ".streamlit/secrets.toml"
-
-# secrets.toml 파일 읽기
-with open(secrets_path, "r") as f:
-    secrets = toml.load(f)
-
-# OpenAI API 클라이언트 초기화
-client = OpenAI(api_key=secrets["api"]["keys"][0])  # 첫 번째 API 키 사용
-
-# Notion API 설정
-NOTION_API_KEY = secrets["notion"]["api_key"]
-NOTION_DATABASE_ID = secrets["notion"]["database_id"]
-
-# Notion에서 프롬프트와 교사 이메일 가져오기
-def get_prompt_and_teacher_email_from_notion(setting_name):
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
-    }
-    data = {
-        "filter": {
-            "property": "setting_name",
-            "rich_text": {
-                "equals": setting_name
-            }
-        }
-    }
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        results = response.json().get("results")
-        if results:
-            for result in results:
-                page_text = result["properties"]["page"]["rich_text"][0]["text"]["content"]
-                if "image" in page_text:
-                    prompt = result["properties"]["prompt"]["rich_text"][0]["text"]["content"]
-                    teacher_email = result["properties"]["email"]["rich_text"][0]["plain_text"]
-                    return prompt, teacher_email
-    return None, None
+# 프로세스 전체에서 한 번만 준비하는 secrets와 Notion 설정 색인 (AI 클라이언트는 키별로 필요할 때 생성)
+warm_up()
+secrets = get_secrets()
+settings_index = get_notion_settings_index()
+
+# 단계별 소요 시간과 토큰 사용량 기록 (교사용 대시보드와 Prometheus 파일에서 확인)
+metrics = get_metrics()
+
+# 모든 세션이 함께 쓰는 DALL-E 3 동시 호출 제한
+image_queue = get_admission_queue("openai", "dall-e-3")
+
+# 유료 호출 전에 프롬프트와 형용사 조합을 먼저 확인하는 사전 검사 (모든 세션 공유)
+screener = get_screener()
+
+# 활동 코드와 학생별 사용량 기록과 하루 한도 (Notion 설정 행의 token_quota, image_quota 등)
+meter = get_usage_meter()
+
+# 한도를 넘었으면 QuotaExceeded를 내고, 거의 다 썼으면 경고를 보여 줍니다
+def check_quota(student_name, images=0):
+    warning = meter.enforce(st.session_state.setting_name, student_name,
+                            activity_quotas(settings_index, st.session_state.setting_name, "image"), images)
+    if warning:
+        st.warning(warning)
+
+# 차례를 기다리는 동안 대기 순서와 예상 시간을 보여 줍니다
+def show_queue_position(placeholder):
+    def on_wait(position, wait):
+        placeholder.info(f"⏳ 요청이 많아 차례를 기다리고 있어요. 내 순서: {position}번째 · 예상 대기 약 {wait:.0f}초")
+    return on_wait
+
+# 한 번에 만들 수 있는 이미지 수 기본값 ([images] max_variants로 변경, 1이면 여러 장 만들기를 숨김)
+MAX_VARIANTS = 4
+
+# 주제와 형용사로 이미지 한 장을 만들고 저장소의 digest를 반환합니다
+# 여러 장을 동시에 만들 때는 작업자 스레드에서 실행되므로 st.session_state 대신 인자로 값을 받습니다.
+def create_image(prompt, concept, setting_name, student_name, variant=0, on_wait=None):
+    combined_prompt = f"{prompt} {concept}"
+
+    # 같은 주제와 형용사 조합(과 순번)으로 이미 만든 이미지가 있으면 다시 생성하지 않습니다
+    request_key = generation_key("dall-e-3", combined_prompt, "1024x1024", "standard", variant)
+    image_digest = image_store.lookup(request_key)
+    if image_digest is not None:
+        metrics.record_stage("model", setting_name, 0.0, provider="openai", model="dall-e-3", usage={"cached": True})
+        return image_digest
+
+    def generate_image():
+        # 한 반이 한꺼번에 누르면 정해진 수만큼만 동시에 생성하고, 나머지는 차례를 기다립니다
+        with image_queue.slot(setting_name, on_wait, "openai", "dall-e-3"):
+            with metrics.stage("model", setting_name, "openai", "dall-e-3") as usage:
+                # 여러 OpenAI 키 중 여유 있는 키로 요청 (429를 받으면 다른 키로 다시 시도)
+                response = call_openai(lambda client: client.images.with_raw_response.generate(
+                    model="dall-e-3",
+                    prompt=combined_prompt,
+                    size="1024x1024",
+                    quality="standard",
+                    n=1,
+                    response_format="b64_json",
+                ))
+                usage["images"] = len(response.data)
+            # 동시에 같은 조합을 요청한 학생들은 결과를 함께 받으므로, 실제로 생성을 요청한 학생에게만 기록합니다
+            meter.record(setting_name, student_name, usage)
+        digest = image_store.put(base64.b64decode(response.data[0].b64_json))
+        image_store.remember(request_key, digest)
+        return digest
+
+    # 같은 조합을 다른 학생이 동시에 요청하고 있으면 그 결과를 함께 받습니다
+    if secrets.get("images", {}).get("coalesce", True):
+        return get_flight("image").do(request_key, generate_image)
+    return generate_image()
+
+# 여러 장을 만들 때의 (이름, 형용사 조합, 순번) 목록
+# 형용사를 두 개 골랐으면 두 형용사 조합, 첫 번째만, 두 번째만 순서로 만들고, 그 뒤로는 같은 조합을 다시 생성합니다.
+def variant_concepts(adjectives, count):
+    concepts = [" ".join(adjectives)] + (list(adjectives) if len(adjectives) > 1 else [])
+    variants = []
+    for i in range(count):
+        concept, repeat = concepts[i % len(concepts)], i // len(concepts)
+        label = f"{i + 1}. {concept}" + (f" (다시 {repeat})" if repeat else "")
+        variants.append((label, concept, repeat))
+    return variants
+
+# 서버 프로세스가 여럿일 때 활동 코드와 생성한 이미지를 함께 쓰는 캐시 저장소 ([cache] backend)
+shared_cache = get_cache_backend()
+
+# 생성된 이미지를 내용 해시로 보관하는 로컬 저장소 (만료되는 URL 대신 사용)
+image_store = get_image_store(secrets.get("images", {}), shared_cache)
+
+# 이 세션 화면에 걸려 있는 이미지는 저장소를 정리할 때 지우지 않도록 고정합니다
+def pin_session_images():
+    digests = set(st.session_state.get("image_history", []))
+    digests.update(digest for _, _, digest in st.session_state.get("image_variants", []))
+    if st.session_state.get("image_digest"):
+        digests.add(st.session_state.image_digest)
+    image_store.pin(current_session_id(), digests)
+
+# 저장소에서 이미 지워진 이미지는 세션과 제출 기록부에서도 지워, 없는 이미지를 보여 주거나 보내지 않게 합니다
+def forget_image(digest, submission_key=None):
+    if st.session_state.get("image_digest") == digest:
+        del st.session_state.image_digest
+    if "image_history" in st.session_state:
+        st.session_state.image_history = [item for item in st.session_state.image_history if item != digest]
+    if "image_variants" in st.session_state:
+        st.session_state.image_variants = [item for item in st.session_state.image_variants if item[2] != digest]
+    if submission_key is not None:
+        ledger.forget(submission_key)
+    pin_session_images()
+
+pin_session_images()
 
 # 이메일 전송 기능
-def send_email_to_teacher(student_name, teacher_email, prompt, adjectives, image_url):
-    msg = MIMEMultipart()
-    msg["From"] = secrets["email"]["address"]
-    msg["To"] = teacher_email
-    msg["Subject"] = f"{student_name} 학생의 이미지 생성 결과"
-
-    body = f"""
-    학생 이름: {student_name}
-    주제: {prompt}
-    형용사: {adjectives}
-
-    생성된 이미지 URL:
-    {image_url}
-    """
-    msg.attach(MIMEText(body, "plain"))
-
-    # 이메일 전송
+def send_email_to_teacher(student_name, teacher_email, prompt, adjectives, image_bytes):
+    fields = [
+        ("주제", prompt),
+        ("형용사", adjectives),
+    ]
+    attachments = [("generated_image.png", image_bytes, "image/png")]
+    # 이메일은 발송 대기열(또는 요약 메일 버퍼)에 넣기만 하고, 실제 발송은 백그라운드 작업자가 맡습니다
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(secrets["email"]["address"], secrets["email"]["password"])
-            server.send_message(msg)
+        with metrics.stage("email_queue", st.session_state.setting_name):
+            deliver_result(secrets["email"], teacher_email, st.session_state.setting_name, student_name,
+                           f"{student_name} 학생의 이미지 생성 결과", fields, attachments)
         return True  # 이메일 전송 성공 시 True 반환
     except Exception as e:
         st.error(f"이메일 전송에 실패했습니다: {e}")
         return False  # 이메일 전송 실패 시 False 반환
 
+# 결과를 Notion 제출 데이터베이스에도 기록 ([submissions]가 켜져 있을 때, 로컬 대기열에 넣기만 함)
+submissions = get_submission_sink()
+
+def save_submission(student_name, prompt, adjectives, image_digest):
+    if submissions is None:
+        return
+    try:
+        submissions.add(student_name, st.session_state.setting_name, "image", prompt, adjectives, image_ref=f"sha256:{image_digest}")
+    except Exception:
+        pass  # 기록 실패가 학생 화면이나 이메일을 막지 않도록 합니다
+
 # 학생용 UI
 st.header('🎨 학생용: 이미지 생성 도구')
 
@@ -147,13 +220,24 @@ setting_name = st.text_input("🔑 코드 입력")
 
 if st.button("📄 프롬프트 가져오기", key="get_prompt"):
     with st.spinner("🔍 프롬프트를 불러오는 중..."):
-        prompt, teacher_email = get_prompt_and_teacher_email_from_notion(setting_name)
-        if prompt and teacher_email:
-            st.session_state.prompt = prompt
-            st.session_state.teacher_email = teacher_email
-            st.success("✅ 프롬프트를 성공적으로 불러왔습니다.")
+        try:
+            # 모든 세션이 공유하는 설정 색인에서 먼저 찾고, 없으면 공용 Notion 클라이언트로 조회합니다
+            with metrics.stage("notion_lookup", setting_name):
+                prompt, teacher_email = lookup_activity(settings_index, setting_name, "image", shared_cache)
+        except NotionError as e:
+            if e.retryable:
+                # 잠시 요청이 몰려 재시도 후에도 실패한 경우 (활동 코드 문제가 아님)
+                st.error("⚠️ 지금 접속이 많아 프롬프트를 불러오지 못했습니다. 잠시 후 다시 시도하세요.")
+            else:
+                st.error(NOTION_CONFIG_ERROR)  # API 키나 데이터베이스 id 문제 (접속이 많아서가 아님)
         else:
-            st.error("⚠️ 해당 코드에 대한 프롬프트를 찾을 수 없습니다.")
+            if prompt and teacher_email:
+                st.session_state.prompt = prompt
+                st.session_state.teacher_email = teacher_email
+                st.session_state.setting_name = setting_name
+                st.success("✅ 프롬프트를 성공적으로 불러왔습니다.")
+            else:
+                st.error("⚠️ 해당 코드에 대한 프롬프트를 찾을 수 없습니다.")
 
 if "prompt" in st.session_state and st.session_state.prompt:
     st.write("**프롬프트:** " + st.session_state.prompt)
@@ -199,28 +283,146 @@ if "prompt" in st.session_state and st.session_state.prompt:
     else:
         combined_concept = " ".join(selected_adjectives)
 
+        # 여러 장을 한 번에 만들어 비교할 수 있습니다 (형용사 조합을 바꾸거나 같은 조합을 다시 생성)
+        max_variants = int(secrets.get("images", {}).get("max_variants", MAX_VARIANTS))
+        variant_count = st.slider("🖼️ 한 번에 만들 이미지 수", 1, max_variants, 1) if max_variants > 1 else 1
+
         if st.button("🖼️ 이미지 생성", key="generate_image"):
-            if combined_concept:
+            # 어울리지 않는 조합이면 DALL-E를 부르지 않고 바로 돌려보냅니다
+            if combined_concept and screener.check_text(st.session_state.setting_name, st.session_state.prompt, combined_concept):
+                st.error(TEXT_REJECTED)
+            elif combined_concept and variant_count == 1:
                 with st.spinner("🖼️ 이미지를 생성하는 중..."):
-                    combined_prompt = f"{st.session_state.prompt} {combined_concept}"
-                    response = client.images.generate(
-                        model="dall-e-3",
-                        prompt=combined_prompt,
-                        size="1024x1024",
-                        quality="standard",
-                        n=1,
-                    )
-
-                    image_url = response.data[0].url
-                    st.session_state.image_url = image_url
-                    st.image(image_url, caption="Generated Image", use_column_width=True)
-                    st.success("✅ 이미지가 성공적으로 생성되었습니다!")
-                    st.download_button(label="💾 이미지 다운로드", data=image_url, file_name="generated_image.png")
-
-                    # 이메일로 결과 전송
-                    if send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, combined_concept, image_url):
-                        st.success("📧 교사에게 이메일로 결과가 전송되었습니다.")
+                    st.session_state.pop("image_variants", None)
+                    # 같은 형용사로 다시 누르면 이번 세션에서 만든 이미지를 다시 보여 주고, 메일을 또 보내지 않습니다
+                    submission_key = ledger.key(current_session_id(), st.session_state.setting_name, "image", st.session_state.prompt, student_name, combined_concept)
+                    image_digest = ledger.result(submission_key)
+                    image_bytes = image_store.get(image_digest) if image_digest is not None else None
+                    if image_digest is not None and image_bytes is None:
+                        # 보관 기간이나 용량 한도로 지워진 이미지면 기록을 지우고 다시 만듭니다
+                        forget_image(image_digest, submission_key)
+                        image_digest = None
+                    if image_digest is None:
+                        queue_notice = st.empty()
+                        try:
+                            check_quota(student_name, 1)
+                            image_digest = create_image(st.session_state.prompt, combined_concept, st.session_state.setting_name, student_name,
+                                                        on_wait=show_queue_position(queue_notice))
+                            image_bytes = image_store.get(image_digest)
+                            if image_bytes is None:
+                                st.error("⚠️ 만든 이미지를 저장하지 못했습니다. 다시 시도하세요.")
+                                image_digest = None
+                            else:
+                                ledger.record(submission_key, image_digest)
+                        except AdmissionTimeout:
+                            st.error("⚠️ 지금 요청이 너무 많습니다. 잠시 후 다시 시도하세요.")
+                        except QuotaExceeded as e:
+                            st.error(str(e))
+                        queue_notice.empty()
+
+                    if image_digest is not None:
+                        st.session_state.image_digest = image_digest
+                        history = st.session_state.setdefault("image_history", [])
+                        if image_digest not in history:
+                            history.append(image_digest)
+                        pin_session_images()
+                        st.image(image_bytes, caption="Generated Image", use_column_width=True)
+                        st.success("✅ 이미지가 성공적으로 생성되었습니다!")
+                        st.download_button(label="💾 이미지 다운로드", data=image_bytes, file_name="generated_image.png", mime="image/png")
+
+                        # 이메일로 결과 전송 (같은 제출은 한 번만)
+                        if not ledger.should_deliver(submission_key):
+                            st.success("📧 이 결과는 이미 교사에게 보냈습니다.")
+                        elif send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, combined_concept, image_bytes):
+                            ledger.mark_delivered(submission_key)
+                            st.success("📧 결과를 교사에게 이메일로 보냅니다.")
+                            save_submission(student_name, st.session_state.prompt, combined_concept, image_digest)
+            elif combined_concept:
+                # 만들 장수만큼 이미지 한도가 남아 있는지 먼저 확인합니다
+                try:
+                    check_quota(student_name, variant_count)
+                except QuotaExceeded as e:
+                    st.error(str(e))
+                else:
+                    with st.spinner(f"🖼️ 이미지 {variant_count}장을 동시에 생성하는 중..."):
+                        variants = variant_concepts(selected_adjectives, variant_count)
+                        columns = st.columns(2)
+                        cells = [columns[i % 2].empty() for i in range(len(variants))]
+                        for cell in cells:
+                            cell.info("⏳ 생성 중...")
+
+                        # 작업자 스레드에서는 st 함수를 부르지 않으므로, 필요한 값을 미리 꺼내 넘깁니다
+                        # 동시에 보내는 요청 수는 DALL-E 동시 호출 제한(image_queue)이 정합니다.
+                        prompt, activity = st.session_state.prompt, st.session_state.setting_name
+                        finished = [None] * len(variants)
+                        with concurrent.futures.ThreadPoolExecutor(max_workers=len(variants)) as pool:
+                            futures = {
+                                pool.submit(create_image, prompt, concept, activity, student_name, variant): i
+                                for i, (label, concept, variant) in enumerate(variants)
+                            }
+                            # 끝나는 순서대로 칸을 채웁니다
+                            for future in concurrent.futures.as_completed(futures):
+                                i = futures[future]
+                                label, concept, _ = variants[i]
+                                try:
+                                    image_digest = future.result()
+                                except AdmissionTimeout:
+                                    cells[i].error(f"⚠️ {label}: 요청이 많아 만들지 못했습니다.")
+                                    continue
+                                except Exception as e:
+                                    cells[i].error(f"❌ {label}: 이미지 생성에 실패했습니다. ({e})")
+                                    continue
+                                image_bytes = image_store.get(image_digest)
+                                if image_bytes is None:
+                                    cells[i].error(f"⚠️ {label}: 만든 이미지를 저장하지 못했습니다.")
+                                    continue
+                                cells[i].image(image_bytes, caption=label, use_column_width=True)
+                                finished[i] = (label, concept, image_digest)
+
+                        st.session_state.image_variants = [item for item in finished if item]
+                        st.session_state.setdefault("image_history", []).extend(digest for _, _, digest in st.session_state.image_variants)
+                        st.session_state.pop("variant_sent", None)
+                        pin_session_images()
             else:
                 st.error("⚠️ 최소한 하나의 형용사를 선택하세요.")
+
+    # 여러 장을 만들었으면 하나를 골라 교사에게 보냅니다
+    variants = st.session_state.get("image_variants")
+    if variants:
+        st.subheader("교사에게 보낼 이미지 고르기")
+        labels = [label for label, _, _ in variants]
+        chosen_label = st.radio("마음에 드는 이미지", labels, horizontal=True)
+        _, chosen_concept, chosen_digest = variants[labels.index(chosen_label)]
+        chosen_bytes = image_store.get(chosen_digest)
+        submission_key = ledger.key(current_session_id(), st.session_state.setting_name, "image", st.session_state.prompt, student_name, chosen_digest)
+        if chosen_bytes is None:
+            # 보관 기간이나 용량 한도로 지워진 이미지는 목록에서 빼고 보내지 않습니다
+            forget_image(chosen_digest, submission_key)
+            st.error("⚠️ 이 이미지는 보관 기간이 지나 지워졌습니다. 다른 이미지를 고르거나 다시 만들어 주세요.")
+        else:
+            st.image(chosen_bytes, caption=chosen_label, use_column_width=True)
+            st.download_button(label="💾 이미지 다운로드", data=chosen_bytes, file_name="generated_image.png", mime="image/png")
+            if st.session_state.get("variant_sent") == chosen_digest:
+                st.success("📧 이 이미지를 교사에게 보냈습니다.")
+            elif st.button("📧 선택한 이미지 보내기", key="send_variant"):
+                if not ledger.should_deliver(submission_key):
+                    st.session_state.variant_sent = chosen_digest
+                    st.success("📧 이 이미지는 이미 교사에게 보냈습니다.")
+                elif send_email_to_teacher(student_name, st.session_state.teacher_email, st.session_state.prompt, chosen_concept, chosen_bytes):
+                    ledger.mark_delivered(submission_key)
+                    st.session_state.image_digest = chosen_digest
+                    st.session_state.variant_sent = chosen_digest
+                    st.success("📧 결과를 교사에게 이메일로 보냅니다.")
+                    save_submission(student_name, st.session_state.prompt, chosen_concept, chosen_digest)
+
+    # 이번 접속에서 만든 이미지 (저장소의 썸네일로 표시)
+    history = st.session_state.get("image_history", [])
+    if len(history) > 1:
+        st.subheader("내가 만든 이미지")
+        columns = st.columns(4)
+        for i, digest in enumerate(reversed(history[-8:])):
+            thumbnail = image_store.thumbnail(digest)
+            if thumbnail:
+                columns[i % 4].image(thumbnail)
 else:
     st.info("프롬프트를 업로드하세요.")
@@ -0,0 +1,137 @@
+import streamlit as st
+import time
+from core.admission import admission_stats
+from core.cache import activity_cache
+from core.ledger import ledger
+from core.metrics import price_table, summarize_log
+from core.outbox import get_outbox
+from core.resources import get_answer_cache, get_cache_backend, get_gemini_pool, get_metrics, get_openai_pool, get_screener, get_secrets, get_submission_sink, get_usage_meter, warm_up
+from core.singleflight import flight_stats
+from core.streaming import timing_summary
+
+# 페이지 설정 - 아이콘과 제목 설정
+st.set_page_config(
+    page_title="교사용 사용 현황",
+    page_icon="📊",
+)
+
+# Streamlit의 기본 메뉴와 푸터 숨기기
+hide_menu_style = """
+    <style>
+    #MainMenu {visibility: hidden; }
+    footer {visibility: hidden;}
+    header {visibility: hidden;}
+    </style>
+"""
+st.markdown(hide_menu_style, unsafe_allow_html=True)
+
+warm_up()
+secrets = get_secrets()
+metrics = get_metrics()
+
+STAGE_NAMES = {
+    "notion_lookup": "프롬프트 조회",
+    "queue_wait": "차례 대기",
+    "model": "AI 생성",
+    "email_queue": "메일 접수",
+    "email_send": "메일 발송",
+}
+
+st.header("📊 교사용: 활동별 사용 현황")
+
+# secrets.toml의 [admin] password로 보호합니다
+password = secrets.get("admin", {}).get("password")
+if not password:
+    st.error("관리자 비밀번호([admin] password)가 설정되어 있지 않습니다.")
+    st.stop()
+
+if not st.session_state.get("teacher_unlocked"):
+    entered = st.text_input("🔒 관리자 비밀번호", type="password")
+    if st.button("확인", key="unlock"):
+        if entered == password:
+            st.session_state.teacher_unlocked = True
+            st.rerun()
+        else:
+            st.error("비밀번호가 맞지 않습니다.")
+    st.stop()
+
+period = st.radio("기간", ["오늘", "최근 7일", "전체"], horizontal=True)
+since = {
+    "오늘": time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1)),
+    "최근 7일": time.time() // 60 * 60 - 7 * 24 * 3600,  # 분 단위로 맞춰 다시 실행될 때 지난 요약을 재사용
+    "전체": None,
+}[period]
+code_filter = st.text_input("🔑 활동 코드로 찾기 (비워 두면 전체)")
+
+summary = summarize_log(metrics.log_path, since, price_table(secrets.get("metrics", {})))
+rows = []
+for activity, item in sorted(summary.items()):
+    if code_filter and code_filter not in activity:
+        continue
+    row = {"활동 코드": activity or "(공용)"}
+    model = item["stages"].get("model", {})
+    row["AI 요청 수"] = model.get("count", 0)
+    row["캐시 재사용"] = item["cached"]
+    row["오류"] = item["errors"]
+    for stage, label in STAGE_NAMES.items():
+        timing = item["stages"].get(stage)
+        row[f"{label} 평균(초)"] = round(timing["avg"], 2) if timing else None
+        row[f"{label} p95(초)"] = round(timing["p95"], 2) if timing else None
+    row["첫 글자 평균(초)"] = round(item["ttft_avg"], 2) if item["ttft_avg"] is not None else None
+    row["입력 토큰"] = item["input_tokens"]
+    row["출력 토큰"] = item["output_tokens"]
+    row["생성 이미지"] = item["images"]
+    row["예상 비용(USD)"] = round(item["cost"], 4)
+    rows.append(row)
+
+if rows:
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    total_cost = sum(row["예상 비용(USD)"] for row in rows)
+    st.caption(f"예상 비용 합계: ${total_cost:,.4f} (단가는 [metrics.prices]에서 조정)")
+else:
+    st.info("아직 기록된 사용 내역이 없습니다.")
+
+# 활동 코드와 학생별 사용량 (한도는 Notion 설정 행의 token_quota, image_quota, student_token_quota, student_image_quota)
+st.subheader("활동 코드별 사용량")
+meter = get_usage_meter()
+since_day = time.strftime("%Y-%m-%d", time.localtime(since)) if since else None
+usage_rows = [row for row in meter.report(since_day) if not code_filter or code_filter in row["activity"]]
+if usage_rows:
+    st.dataframe(
+        [{"활동 코드": row["activity"] or "(공용)", "학생 수": row["students"], "AI 요청 수": row["requests"],
+          "입력 토큰": row["input_tokens"], "출력 토큰": row["output_tokens"], "생성 이미지": row["images"]}
+         for row in usage_rows],
+        use_container_width=True, hide_index=True,
+    )
+    with st.expander("학생별 사용량"):
+        st.dataframe(
+            [{"활동 코드": row["activity"] or "(공용)", "학생 이름": row["student"] or "(이름 없음)", "AI 요청 수": row["requests"],
+              "입력 토큰": row["input_tokens"], "출력 토큰": row["output_tokens"], "생성 이미지": row["images"]}
+             for row in meter.report(since_day, by_student=True) if not code_filter or code_filter in row["activity"]],
+            use_container_width=True, hide_index=True,
+        )
+else:
+    st.info("아직 기록된 사용량이 없습니다.")
+
+# 서버 안의 캐시, 키 묶음, 메일 대기열 상태 (이 프로세스가 시작된 뒤의 값)
+with st.expander("서버 상태"):
+    st.write("**메일 발송 대기열**", get_outbox(secrets["email"]).stats())
+    if get_submission_sink() is not None:
+        st.write("**Notion 제출 기록**", get_submission_sink().stats())
+    st.write("**활동 코드 캐시**", activity_cache.stats())
+    st.write("**공유 캐시 저장소**", get_cache_backend().stats())
+    if secrets.get("answer_cache", {}).get("enabled", False):
+        st.write("**비슷한 답 재사용**", get_answer_cache().stats())
+    st.write("**동시 요청 합치기**", flight_stats())
+    st.write("**중복 제출 방지**", ledger.stats())
+    st.write("**사전 검사**", get_screener().stats())
+    st.write("**사용량 기록**", meter.stats())
+    st.write("**모델별 동시 호출 제한**", admission_stats())
+    st.write("**첫 글자 시간**", timing_summary())
+    st.write("**OpenAI 키**", get_openai_pool().stats())
+    st.write("**Gemini 키**", get_gemini_pool().stats())
+
+with st.expander("Prometheus 지표"):
+    prometheus_text = metrics.prometheus_text()
+    st.code(prometheus_text, language="text")
+    st.download_button("💾 지표 파일 다운로드", data=prometheus_text, file_name="metrics.prom", mime="text/plain")
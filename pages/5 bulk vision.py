@@ -0,0 +1,214 @@
+import streamlit as st
+from PIL import UnidentifiedImageError
+from core.batch import MAX_ATTEMPTS, MAX_FILES, MAX_TOTAL_BYTES, WORKERS, read_uploads, report_csv, report_zip, run_batch
+from core.images import image_options, prepare_image
+from core.messages import build_batch_message
+from core.notion_client import NOTION_CONFIG_ERROR, NotionError
+from core.notion_index import activity_quotas, lookup_activity
+from core.outbox import get_outbox
+from core.resources import call_gemini, get_admission_queue, get_cache_backend, get_metrics, get_notion_settings_index, get_screener, get_secrets, get_usage_meter, warm_up
+from core.response_cache import get_response_cache, response_key
+from core.usage import QuotaExceeded
+
+# 페이지 설정 - 아이콘과 제목 설정
+st.set_page_config(
+    page_title="교사용 이미지 일괄 분석",
+    page_icon="🗂️",
+)
+
+# Streamlit의 기본 메뉴와 푸터 숨기기
+hide_menu_style = """
+    <style>
+    #MainMenu {visibility: hidden; }
+    footer {visibility: hidden;}
+    header {visibility: hidden;}
+    </style>
+"""
+st.markdown(hide_menu_style, unsafe_allow_html=True)
+
+warm_up()
+secrets = get_secrets()
+VISION_MODEL = 'gemini-1.5-flash'
+settings_index = get_notion_settings_index()
+# 서버 프로세스가 여럿일 때 활동 코드와 분석 결과를 함께 쓰는 캐시 저장소 ([cache] backend)
+shared_cache = get_cache_backend()
+metrics = get_metrics()
+response_cache = get_response_cache(secrets.get("cache", {}), shared_cache)
+
+# 학생 페이지와 같은 Gemini 동시 호출 제한을 사용하므로, 일괄 분석 중에도 다른 반 학생이 오래 기다리지 않습니다
+vision_queue = get_admission_queue("gemini", VISION_MODEL)
+
+# 분석할 수 없는 사진은 PIL로 열거나 Gemini를 부르기 전에 헤더만 보고 걸러 냅니다
+screener = get_screener()
+
+# 일괄 분석의 사용량은 학생 이름 대신 교사 몫으로 활동 코드에 기록하고, 활동 코드의 하루 한도를 지킵니다
+meter = get_usage_meter()
+BATCH_STUDENT = "(교사 일괄 분석)"
+
+# secrets.toml의 [batch] 설정 (workers, max_attempts, max_files, max_total_mb)
+batch_settings = secrets.get("batch", {})
+
+st.header("🗂️ 교사용: 이미지 일괄 분석")
+
+# secrets.toml의 [admin] password로 보호합니다
+password = secrets.get("admin", {}).get("password")
+if not password:
+    st.error("관리자 비밀번호([admin] password)가 설정되어 있지 않습니다.")
+    st.stop()
+
+if not st.session_state.get("teacher_unlocked"):
+    entered = st.text_input("🔒 관리자 비밀번호", type="password")
+    if st.button("확인", key="unlock"):
+        if entered == password:
+            st.session_state.teacher_unlocked = True
+            st.rerun()
+        else:
+            st.error("비밀번호가 맞지 않습니다.")
+    st.stop()
+
+st.markdown("""
+    **안내:** 학생들의 사진을 한 번에 올려 같은 이미지 분석 활동 프롬프트로 분석합니다.
+    1. **활동 코드 입력**: 이미지 분석 활동의 코드를 입력하고 프롬프트를 불러오세요.
+    2. **사진 올리기**: 사진 여러 장이나 사진을 묶은 zip 파일을 올리세요. 파일 이름이 학생 이름으로 사용됩니다.
+    3. **일괄 분석**: 분석이 끝나면 CSV/ZIP 보고서를 내려받을 수 있고, 요약 메일 한 통이 교사에게 발송됩니다.
+""")
+
+setting_name = st.text_input("🔑 활동 코드 입력")
+
+if st.button("📄 프롬프트 가져오기", key="get_prompt"):
+    with st.spinner("🔍 프롬프트를 불러오는 중..."):
+        try:
+            with metrics.stage("notion_lookup", setting_name):
+                prompt, teacher_email = lookup_activity(settings_index, setting_name, "vision", shared_cache)
+        except NotionError as e:
+            if e.retryable:
+                st.error("⚠️ 지금 접속이 많아 프롬프트를 불러오지 못했습니다. 잠시 후 다시 시도하세요.")
+            else:
+                st.error(NOTION_CONFIG_ERROR)  # API 키나 데이터베이스 id 문제 (접속이 많아서가 아님)
+        else:
+            if prompt and teacher_email:
+                # 학생 페이지의 st.session_state.prompt와 섞이지 않도록 따로 보관
+                st.session_state.batch_prompt = prompt
+                st.session_state.batch_teacher_email = teacher_email
+                st.session_state.batch_setting_name = setting_name
+                st.session_state.pop("batch_results", None)
+            else:
+                st.error("⚠️ 활동 코드를 다시 확인하세요.")
+
+
+# 이미지 한 장 분석 (스레드 풀의 작업자 스레드에서 실행되므로 st 함수를 부르지 않습니다)
+def analyze_image(filename, data, prompt, activity, options, quotas):
+    problem = screener.check_image(activity, data)
+    if problem:
+        raise ValueError(problem)
+    try:
+        prepared = prepare_image(data, **options)
+    except UnidentifiedImageError:
+        raise ValueError("유효한 이미지 파일이 아닙니다.")
+    cache_key = response_key(VISION_MODEL, prompt, prepared.data)
+    text = response_cache.get(cache_key)
+    if text is not None:
+        metrics.record_stage("model", activity, 0.0, provider="gemini", model=VISION_MODEL, usage={"cached": True})
+        return {"text": text}
+
+    # 한도를 넘으면 QuotaExceeded로 남은 사진을 분석하지 않습니다 (다시 시도하지 않음)
+    meter.enforce(activity, None, quotas)
+    with vision_queue.slot(activity, provider="gemini", model=VISION_MODEL):
+        with metrics.stage("model", activity, "gemini", VISION_MODEL) as usage:
+            response = call_gemini(VISION_MODEL, lambda model: model.generate_content([
+                prompt,
+                {"mime_type": prepared.mime_type, "data": prepared.data},
+            ]))
+            # 안전 필터로 막힌 응답은 response.text에서 ValueError가 나며, 다시 시도하지 않습니다
+            text = response.text
+            if response.usage_metadata:
+                usage["input_tokens"] = response.usage_metadata.prompt_token_count
+                usage["output_tokens"] = response.usage_metadata.candidates_token_count
+        meter.record(activity, BATCH_STUDENT, usage)
+    if text:
+        response_cache.set(cache_key, text)
+    return {"text": text}
+
+
+if st.session_state.get("batch_prompt"):
+    st.success(f"✅ 활동 코드 **{st.session_state.batch_setting_name}**의 프롬프트를 불러왔습니다.")
+    st.write("**프롬프트:** " + st.session_state.batch_prompt)
+
+    max_files = int(batch_settings.get("max_files", MAX_FILES))
+    uploads = st.file_uploader(
+        f"사진 또는 zip 파일 올리기 (최대 {max_files}장)",
+        type=["jpg", "jpeg", "png", "webp", "zip"],
+        accept_multiple_files=True,
+    )
+
+    if st.button("🧠 일괄 분석 시작", key="run_batch", disabled=not uploads):
+        images, skipped = read_uploads(
+            [(upload.name, upload.getvalue()) for upload in uploads],
+            max_files=max_files,
+            max_total_bytes=int(float(batch_settings.get("max_total_mb", MAX_TOTAL_BYTES / 1024 / 1024)) * 1024 * 1024),
+        )
+        for name, reason in skipped:
+            st.warning(f"⚠️ {name}: {reason}")
+
+        if images:
+            prompt = st.session_state.batch_prompt
+            activity = st.session_state.batch_setting_name
+            options = image_options(secrets.get("vision", {}))
+            quotas = activity_quotas(settings_index, activity, "vision")
+            # 한도를 이미 넘었으면 분석도 요약 메일도 하지 않고 멈춥니다 (거의 다 쓴 경우에만 경고하고 계속)
+            try:
+                quota_warning = meter.enforce(activity, None, quotas)
+            except QuotaExceeded as e:
+                st.error(str(e))
+                st.stop()
+            if quota_warning:
+                st.warning(quota_warning)
+            progress = st.progress(0.0, text=f"0 / {len(images)}장 분석 완료")
+            log = st.container()
+
+            def on_progress(done, total, result):
+                progress.progress(done / total, text=f"{done} / {total}장 분석 완료")
+                if result["status"] == "ok":
+                    log.write(f"✅ {result['student_name']} ({result['seconds']}초)")
+                else:
+                    log.write(f"❌ {result['student_name']}: {result['error']}")
+
+            results = run_batch(
+                images,
+                lambda filename, data: analyze_image(filename, data, prompt, activity, options, quotas),
+                workers=int(batch_settings.get("workers", WORKERS)),
+                max_attempts=int(batch_settings.get("max_attempts", MAX_ATTEMPTS)),
+                no_retry=(ValueError, QuotaExceeded),
+                on_progress=on_progress,
+            )
+            st.session_state.batch_results = results
+
+            # 결과 전체를 요약 메일 한 통으로 교사에게 보냅니다
+            try:
+                with metrics.stage("email_queue", activity):
+                    get_outbox(secrets["email"]).enqueue(build_batch_message(
+                        secrets["email"]["address"], st.session_state.batch_teacher_email, activity,
+                        results, report_csv(results),
+                    ))
+                st.success("📧 요약 결과를 교사에게 이메일로 보냅니다.")
+            except Exception as e:
+                st.error(f"이메일 전송에 실패했습니다: {e}")
+        else:
+            st.error("⚠️ 분석할 이미지가 없습니다.")
+
+    # 다운로드 버튼을 누르면 페이지가 다시 실행되므로 결과는 세션에 보관합니다
+    results = st.session_state.get("batch_results")
+    if results:
+        succeeded = sum(1 for result in results if result["status"] == "ok")
+        st.subheader(f"분석 결과 ({succeeded}/{len(results)}장 완료)")
+        st.dataframe(
+            [{"학생 이름": r["student_name"], "상태": "완료" if r["status"] == "ok" else "실패",
+              "AI 분석 결과": r["text"] or r["error"]} for r in results],
+            use_container_width=True, hide_index=True,
+        )
+        activity = st.session_state.batch_setting_name
+        col1, col2 = st.columns(2)
+        col1.download_button("💾 CSV 보고서", data=report_csv(results), file_name=f"{activity}_report.csv", mime="text/csv")
+        col2.download_button("💾 ZIP 보고서", data=report_zip(results), file_name=f"{activity}_report.zip", mime="application/zip")
+else:
+    st.info("활동 코드를 입력하고 프롬프트를 불러오세요.")
@@ -0,0 +1,27 @@
+import pathlib
+import sys
+import time
+
+import pytest
+
+ROOT = pathlib.Path(__file__).parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+
+# 테스트 중 기록되는 지표가 앱의 .data 폴더 대신 임시 폴더에 쌓이도록 먼저 만들어 둡니다
+@pytest.fixture(autouse=True, scope="session")
+def metrics_in_tmp(tmp_path_factory):
+    from core.metrics import get_metrics
+
+    path = tmp_path_factory.mktemp("metrics")
+    return get_metrics({"log_path": str(path / "metrics.jsonl"), "prometheus_path": str(path / "metrics.prom")})
+
+
+# 백그라운드 스레드가 처리할 때까지 조건을 기다립니다
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from core.admission import AdmissionQueue, AdmissionTimeout
+
+
+def test_limits_concurrent_calls():
+    queue = AdmissionQueue("test", 2)
+    tickets = [queue.enter("A") for _ in range(3)]
+    assert [ticket.admitted.is_set() for ticket in tickets] == [True, True, False]
+    assert queue.stats()["running"] == 2 and queue.stats()["waiting"] == 1
+    queue.leave(tickets[0])
+    assert tickets[2].admitted.is_set()
+
+
+def test_activities_are_admitted_in_turn():
+    queue = AdmissionQueue("test", 1)
+    first = queue.enter("A")
+    # 한 반(A)이 먼저 몰려 와도 뒤에 온 B, C 학생이 A 학생들 사이사이에 들어갑니다
+    waiting = [(queue.enter(name), f"{name}{i}") for name, i in
+               [("A", 1), ("A", 2), ("A", 3), ("B", 1), ("C", 1), ("B", 2)]]
+    assert queue.position(waiting[3][0]) == 2  # A1 다음
+    assert queue.position(waiting[4][0]) == 3  # A1, B1 다음
+
+    order = []
+    current = first
+    for _ in waiting:
+        queue.leave(current)
+        current, name = next((ticket, name) for ticket, name in waiting
+                             if ticket.admitted.is_set() and name not in order)
+        order.append(name)
+    assert order == ["A1", "B1", "C1", "A2", "B2", "A3"]
+
+
+def test_leaving_while_waiting_gives_up_the_place():
+    queue = AdmissionQueue("test", 1)
+    running = queue.enter("A")
+    gave_up = queue.enter("B")
+    next_one = queue.enter("C")
+    queue.leave(gave_up)
+    queue.leave(running)
+    assert next_one.admitted.is_set() and not gave_up.admitted.is_set()
+    assert queue.stats()["running"] == 1 and queue.stats()["waiting"] == 0
+
+
+def test_slot_times_out_and_reports_position():
+    queue = AdmissionQueue("test", 1, max_wait=1.2)
+    positions = []
+    with queue.slot("A"):
+        with pytest.raises(AdmissionTimeout):
+            with queue.slot("B", on_wait=lambda position, wait: positions.append((position, wait))):
+                pass
+    assert positions and positions[0][0] == 1
+    stats = queue.stats()
+    assert (stats["running"], stats["waiting"], stats["timeouts"]) == (0, 0, 1)
+
+
+def test_slot_admits_waiters_when_a_call_finishes():
+    queue = AdmissionQueue("test", 1)
+    entered = []
+    release = threading.Event()
+
+    def student(name):
+        with queue.slot(name):
+            entered.append(name)
+            release.wait(5)
+
+    threads = [threading.Thread(target=student, args=(name,)) for name in ("A", "B")]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(entered) == ["A", "B"]
+    assert queue.stats()["running"] == 0 and queue.stats()["admitted"] == 2
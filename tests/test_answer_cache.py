@@ -0,0 +1,72 @@
+import time
+
+from core.answer_cache import AnswerCache, MinHasher, cache_policy, normalize_answer, similarity
+from core.cache_backend import SQLiteBackend
+
+ANSWER = "바다에서 친구들과 모래성을 쌓고 조개껍데기를 주웠어요"
+
+
+def test_normalize_answer_ignores_spacing_case_and_punctuation():
+    assert normalize_answer("바다 에서!  ABC.") == normalize_answer("바다에서abc")
+    assert normalize_answer(" ?! ") == ""
+
+
+def test_minhash_similarity_tracks_overlap():
+    hasher = MinHasher()
+    same = hasher.signature(normalize_answer(ANSWER))
+    assert similarity(same, hasher.signature(normalize_answer(ANSWER))) == 1.0
+    close = hasher.signature(normalize_answer(ANSWER + "요"))
+    far = hasher.signature(normalize_answer("산에 올라가서 도시락을 먹었습니다"))
+    assert similarity(same, close) > 0.8
+    assert similarity(same, far) < 0.2
+
+
+def test_exact_hit_after_normalizing():
+    cache = AnswerCache()
+    cache.set("ACT", "프롬프트", ANSWER, "AI 답")
+    assert cache.get("ACT", "프롬프트", ANSWER.replace(" ", "") + "!") == ("AI 답", "exact")
+    assert cache.get("ACT", "다른 프롬프트", ANSWER) is None
+    assert cache.get("OTHER", "프롬프트", ANSWER) is None
+    assert cache.stats()["hits"] == {"exact": 1, "similar": 0}
+
+
+def test_similar_hit_only_with_minhash():
+    plain, fuzzy = AnswerCache(), AnswerCache(minhash=True)
+    for cache in (plain, fuzzy):
+        cache.set("ACT", "프롬프트", ANSWER, "AI 답")
+    assert plain.get("ACT", "프롬프트", ANSWER + "요") is None
+    assert fuzzy.get("ACT", "프롬프트", ANSWER + "요") == ("AI 답", "similar")
+    assert fuzzy.get("ACT", "프롬프트", "산에 올라가서 도시락을 먹었습니다") is None
+
+
+def test_entries_expire_and_can_be_invalidated():
+    cache = AnswerCache(minhash=True)
+    cache.set("ACT", "프롬프트", ANSWER, "AI 답", ttl=0.05)
+    cache.set("ACT", "프롬프트", "다른 답을 적었어요", "AI 답 2")
+    time.sleep(0.1)
+    assert cache.get("ACT", "프롬프트", ANSWER) is None
+    assert cache.get("ACT", "프롬프트", ANSWER + "요") is None
+    assert cache.invalidate("ACT") == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_oldest_entry_is_evicted():
+    cache = AnswerCache(maxsize=2)
+    for i in range(3):
+        cache.set("ACT", "프롬프트", f"답 {i}", f"AI {i}")
+    assert cache.get("ACT", "프롬프트", "답 0") is None
+    assert cache.get("ACT", "프롬프트", "답 2") == ("AI 2", "exact")
+
+
+def test_exact_answers_are_shared_between_processes(tmp_path):
+    path = tmp_path / "shared.sqlite3"
+    first, second = AnswerCache(shared=SQLiteBackend(path)), AnswerCache(shared=SQLiteBackend(path))
+    first.set("ACT", "프롬프트", ANSWER, "AI 답")
+    assert second.get("ACT", "프롬프트", ANSWER) == ("AI 답", "exact")
+
+
+def test_cache_policy():
+    assert cache_policy({}, {}) == (False, 0)
+    assert cache_policy({"enabled": True}, {}) == (True, 3600.0)
+    assert cache_policy({"enabled": True}, {"enabled": False}) == (False, 0)
+    assert cache_policy({"enabled": True, "ttl_minutes": 10}, {"ttl_minutes": 5}) == (True, 300.0)
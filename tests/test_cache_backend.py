@@ -0,0 +1,137 @@
+import socket
+import threading
+import time
+
+import pytest
+from conftest import wait_until
+from fakes import FakeRedis
+
+from core import cache_backend
+from core.cache_backend import CacheBackend, MemoryBackend, RedisBackend, RedisError, SQLiteBackend, _RedisConnection
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis().start()
+    yield fake
+    fake.stop()
+
+
+def _connect(redis):
+    return _RedisConnection("127.0.0.1", int(redis.url.rsplit(":", 1)[1].split("/")[0]))
+
+
+def test_reply_types(redis):
+    connection = _connect(redis)
+    try:
+        assert connection.command("PING") == "PONG"
+        assert connection.command("SET", "k", b"\x00bytes\r\n") == "OK"
+        assert connection.command("GET", "k") == b"\x00bytes\r\n"
+        assert connection.command("GET", "missing") is None
+        assert connection.command("MGET", "k", "missing") == [b"\x00bytes\r\n", None]
+        assert connection.command("DEL", "k", "missing") == 1
+        with pytest.raises(RedisError, match="unknown command"):
+            connection.command("BOGUS")
+        # 오류 응답 뒤에도 같은 연결을 계속 쓸 수 있습니다
+        assert connection.command("GET", "k") is None
+    finally:
+        connection.close()
+
+
+def test_get_set_delete_with_ttl(redis):
+    backend = RedisBackend(redis.url, prefix="t:")
+    backend.set_text("a", "가나다")
+    backend.set("b", b"short", ttl=0.05)
+    assert backend.get_text("a") == "가나다"
+    assert b"t:a" in redis.data
+    time.sleep(0.1)
+    assert backend.get("b") is None
+    backend.delete("a")
+    assert backend.get("a") is None
+    assert backend.stats()["pooled_connections"] == 1
+
+
+def test_reconnects_after_server_drops_pooled_connection(redis):
+    backend = RedisBackend(redis.url)
+    backend.set("k", b"v")
+    assert redis.stats()["connections"] == 1
+    redis.drop_connections()
+    assert wait_until(lambda: redis.stats()["connections"] == 0)
+    assert backend.get("k") == b"v"
+    assert backend.stats()["errors"] == 0
+    assert backend.get("k") == b"v"
+
+
+def test_error_reply_does_not_mark_server_down(redis):
+    backend = RedisBackend(redis.url)
+    assert backend._execute("BOGUS") is None
+    backend.set("k", b"v")
+    assert backend.get("k") == b"v"
+    assert backend.stats()["errors"] == 1
+
+
+def test_unreachable_server_is_skipped_for_a_while():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    backend = RedisBackend(f"redis://127.0.0.1:{port}/0", timeout=0.5)
+    assert backend.get("k") is None
+    assert backend.get("k") is None
+    assert backend.stats()["errors"] == 1  # 두 번째는 연결을 시도하지 않습니다
+
+
+def test_failed_auth_closes_the_socket():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    closed = []
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            conn.recv(1024)
+            conn.sendall(b"-WRONGPASS invalid password\r\n")
+            conn.settimeout(5)
+            closed.append(conn.recv(1024) == b"")
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    with server, pytest.raises(RedisError) as failure:
+        _RedisConnection("127.0.0.1", server.getsockname()[1], password="wrong")
+    thread.join(5)  # failure의 traceback이 연결 객체를 붙잡고 있어도 소켓은 이미 닫혀 있어야 합니다
+    assert closed == [True]
+    assert "WRONGPASS" in str(failure.value)
+
+
+def test_backend_must_implement_get_set_delete():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+    backend = MemoryBackend()
+    backend.set_text("k", "값")
+    assert backend.get_text("k") == "값"
+
+
+def test_sqlite_backend_is_shared_between_processes(tmp_path):
+    path = tmp_path / "shared.sqlite3"
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    first.set_json("a", {"이름": "값"})
+    assert second.get_json("a") == {"이름": "값"}
+    first.set("old", b"12345", ttl=0)
+    assert second.get("old") is None
+    second.delete("a")
+    assert first.get("a") is None
+
+
+def test_sqlite_backend_prunes_least_recently_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_backend, "PRUNE_EVERY", 1)
+    backend = SQLiteBackend(tmp_path / "shared.sqlite3", max_bytes=12)
+    backend.set("a", b"12345")
+    backend.set("b", b"123456")
+    assert backend.get("a") == b"12345"  # a를 최근에 읽었으므로 b가 먼저 지워집니다
+    backend.set("c", b"12")
+    assert backend.get("b") is None
+    assert backend.get("a") == b"12345" and backend.get("c") == b"12"
@@ -0,0 +1,70 @@
+from core.conversation import _summary_message, count_tokens, fit_messages, message_tokens
+
+PROMPT = "너는 초등학생의 글쓰기를 돕는 선생님이야."
+
+
+def _turns(count, text="오늘 배운 내용을 정리해 주세요. " * 5):
+    turns = []
+    for i in range(count):
+        turns.append({"role": "user", "content": f"질문 {i}: {text}"})
+        turns.append({"role": "assistant", "content": f"답 {i}: {text}"})
+    turns.append({"role": "user", "content": "마지막 질문"})
+    return turns
+
+
+def _total(messages):
+    return sum(message_tokens(message) for message in messages)
+
+
+def test_short_history_is_sent_as_is():
+    turns = _turns(1)
+    messages, condensed = fit_messages(PROMPT, turns, budget=3000)
+    assert condensed == 0
+    assert messages == [{"role": "system", "content": PROMPT}] + turns
+
+
+def test_long_history_is_condensed_under_budget():
+    turns = _turns(30)
+    messages, condensed = fit_messages(PROMPT, turns, budget=600, summary_budget=150)
+    assert condensed > 0
+    assert _total(messages) <= 600
+    assert messages[0] == {"role": "system", "content": PROMPT}
+    assert messages[1]["role"] == "system" and messages[1]["content"].startswith(f"(앞선 대화 {condensed}개")
+    assert messages[-1] == turns[-1]
+    assert messages[2:] == turns[condensed:]
+
+
+def test_leading_answer_is_dropped_with_its_question():
+    question = {"role": "user", "content": "긴 질문 " * 200}
+    answer = {"role": "assistant", "content": "짧은 답"}
+    latest = {"role": "user", "content": "다음 질문"}
+    budget = message_tokens({"role": "system", "content": PROMPT}) + 2 * (message_tokens(answer) + message_tokens(latest))
+    messages, condensed = fit_messages(PROMPT, [question, answer, latest], budget=budget, summary_budget=10)
+    assert condensed == 2
+    assert messages[-1] == latest
+    assert answer not in messages
+    assert [message["role"] for message in messages if message["role"] != "system"] == ["user"]
+
+
+def test_question_larger_than_budget_is_still_sent():
+    latest = {"role": "user", "content": "아주 긴 질문 " * 500}
+    turns = _turns(3)[:-1] + [latest]
+    messages, condensed = fit_messages(PROMPT, turns, budget=200, summary_budget=50)
+    assert messages[0] == {"role": "system", "content": PROMPT}
+    assert messages[-1] == latest
+    assert condensed == len(turns) - 1
+
+
+def test_system_prompt_is_always_first():
+    for count in (0, 1, 5, 40):
+        messages, _ = fit_messages(PROMPT, _turns(count), budget=300, summary_budget=80)
+        assert messages[0] == {"role": "system", "content": PROMPT}
+
+
+def test_summary_keeps_newest_lines_within_budget():
+    turns = _turns(20)[:-1]
+    summary = _summary_message(turns, 120, "gpt-4o-mini")
+    assert count_tokens(summary["content"]) + 4 <= 120
+    assert summary["content"].splitlines()[-1].startswith("- AI: 답 19")
+    assert all(len(line) <= 80 + len("- 학생: …") for line in summary["content"].splitlines()[1:])
+    assert _summary_message(turns, 5, "gpt-4o-mini") is None
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+
+from core.digest import DigestBuffer
+
+
+# 요약 메일을 보내지 않고 대기열에 들어온 메일만 기록합니다 (넣는 데 시간이 걸리는 것처럼 잠시 멈춤)
+class RecordingOutbox:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def enqueue(self, msg):
+        time.sleep(self.delay)
+        with self.lock:
+            self.messages.append(msg)
+
+
+def _buffer(tmp_path, outbox, **kwargs):
+    return DigestBuffer(outbox, "tools@example.com", path=tmp_path / "digest.sqlite3", **kwargs)
+
+
+def test_group_is_sent_when_full(tmp_path):
+    outbox = RecordingOutbox()
+    digest = _buffer(tmp_path, outbox, max_items=3)
+    for name in ("가", "나", "다"):
+        digest.add("teacher@example.com", "ACT", name, [("AI 결과", f"{name}의 결과")], [("a.png", b"png", "image/png")])
+    assert digest.pending() == 0
+    assert [msg["Subject"] for msg in outbox.messages] == ["[ACT] 학생 활동 결과 모음 (3건)"]
+
+
+def test_flush_sends_groups_older_than_max_wait(tmp_path):
+    outbox = RecordingOutbox()
+    digest = _buffer(tmp_path, outbox, max_wait=60)
+    digest.add("a@example.com", "ACT", "가", [("AI 결과", "결과")])
+    digest.add("b@example.com", "ACT", "나", [("AI 결과", "결과")])
+    assert digest.flush() == 0
+    assert digest.flush(all_groups=True) == 2
+    assert sorted(msg["To"] for msg in outbox.messages) == ["a@example.com", "b@example.com"]
+
+
+def test_two_processes_flushing_together_send_one_digest(tmp_path):
+    outbox = RecordingOutbox(delay=0.05)
+    first, second = _buffer(tmp_path, outbox), _buffer(tmp_path, outbox)
+    for i in range(5):
+        first.add("teacher@example.com", "ACT", f"학생{i}", [("AI 결과", "결과")])
+    barrier = threading.Barrier(2)
+
+    def flush(digest):
+        barrier.wait()
+        try:
+            digest.flush(all_groups=True)
+        except sqlite3.Error:
+            pass
+
+    threads = [threading.Thread(target=flush, args=(digest,)) for digest in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(outbox.messages) == 1
+    assert first.pending() == 0
+
+
+def test_failed_enqueue_keeps_items(tmp_path):
+    class BrokenOutbox:
+        def enqueue(self, msg):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    digest = _buffer(tmp_path, BrokenOutbox())
+    digest.add("teacher@example.com", "ACT", "가", [("AI 결과", "결과")], [("a.png", b"png", "image/png")])
+    try:
+        digest.flush(all_groups=True)
+    except sqlite3.Error:
+        pass
+    assert digest.pending() == 1
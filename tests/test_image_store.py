@@ -0,0 +1,78 @@
+import io
+
+from PIL import Image
+
+from core.image_store import ImageStore, generation_key
+
+
+COLORS = ("red", "green", "blue", "white")
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_put_is_content_addressed_and_remembers_generations(tmp_path):
+    store = ImageStore(tmp_path)
+    digest = store.put(_png("red"))
+    assert store.put(_png("red")) == digest
+    assert store.get(digest) == _png("red")
+    assert store.thumbnail(digest)
+
+    key = generation_key("dall-e-3", "고양이 밝은", "1024x1024", "standard")
+    assert store.lookup(key) is None
+    store.remember(key, digest)
+    assert store.lookup(key) == digest
+    assert store.stats()["dedup_hits"] == 1
+
+
+def test_size_limit_removes_least_recently_used(tmp_path):
+    size = max(len(_png(color)) for color in COLORS)
+    store = ImageStore(tmp_path, max_bytes=size * 2)
+    red, green = store.put(_png("red")), store.put(_png("green"))
+    blue = store.put(_png("blue"))
+    assert store.get(red) is None and store.get(green) and store.get(blue)
+
+
+def test_pinned_images_survive_pruning(tmp_path):
+    size = max(len(_png(color)) for color in COLORS)
+    store = ImageStore(tmp_path, max_bytes=size * 2)
+    red = store.put(_png("red"))
+    store.pin("session-1", {red})
+    green = store.put(_png("green"))
+    blue = store.put(_png("blue"))
+    assert store.get(red) is not None
+    assert store.get(green) is None and store.get(blue) is not None
+
+    # 고정이 풀리면 다시 정리 대상이 됩니다
+    store.pin("session-1", set())
+    store.put(_png("white"))
+    assert store.get(red) is None
+
+
+def test_pins_expire(tmp_path):
+    store = ImageStore(tmp_path, retention_days=0)
+    digest = store.put(_png("red"))
+    store.pin("session-1", {digest}, ttl=0)
+    store.prune()
+    assert store.get(digest) is None
+
+
+def test_put_only_prunes_when_over_the_size_limit(tmp_path):
+    store = ImageStore(tmp_path, retention_days=0)
+    old = store.put(_png("red"))
+    store.put(_png("green"))  # 한도 아래이므로 저장할 때는 정리하지 않습니다
+    assert store.get(old) is not None
+    store.prune()  # 보관 기간 정리는 주기적으로 돕니다
+    assert store.stats()["images"] == 0 and store.stats()["bytes"] == 0
+
+
+def test_tracked_size_matches_stored_images(tmp_path):
+    store = ImageStore(tmp_path)
+    sizes = [len(_png(color)) for color in COLORS]
+    for color in COLORS:
+        store.put(_png(color))
+    store.put(_png("red"))
+    assert store.stats() == {"images": 4, "bytes": sum(sizes), "max_bytes": store.max_bytes, "dedup_hits": 0}
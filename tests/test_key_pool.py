@@ -0,0 +1,86 @@
+import pytest
+
+from core.key_pool import KeyPool
+from fakes import FakeOpenAI, Injector
+
+
+class FakeError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+def test_picks_least_loaded_key():
+    pool = KeyPool("test", ["key-a", "key-b"])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first, second} == {"key-a", "key-b"}
+    pool.release(first)
+    assert pool.acquire() == first
+
+
+def test_rate_limited_key_cools_down():
+    pool = KeyPool("test", ["key-a", "key-b"], cooldown=60)
+    key = pool.acquire()
+    pool.release(key, error=FakeError(429))
+    other = ({"key-a", "key-b"} - {key}).pop()
+    for _ in range(3):
+        leased = pool.acquire()
+        assert leased == other
+        pool.release(leased)
+    assert [entry["rate_limited"] for entry in pool.stats()].count(1) == 1
+
+
+def test_exhausted_quota_header_cools_down():
+    pool = KeyPool("test", ["key-a", "key-b"])
+    key = pool.acquire()
+    pool.release(key, headers={"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"})
+    cooling = {entry["key"]: entry["cooling_down"] for entry in pool.stats()}
+    assert cooling[f"…{key[-4:]}"] > 350
+
+
+def test_call_fails_over_to_another_key():
+    pool = KeyPool("test", ["key-a", "key-b"])
+    used = []
+
+    def fn(lease):
+        used.append(lease["key"])
+        if len(used) == 1:
+            raise FakeError(429, retry_after="30")
+        return "ok"
+
+    assert pool.call(fn) == "ok"
+    assert len(set(used)) == 2
+
+
+def test_call_does_not_retry_client_errors():
+    pool = KeyPool("test", ["key-a", "key-b"])
+    calls = []
+
+    def fn(lease):
+        calls.append(lease["key"])
+        raise FakeError(400)
+
+    with pytest.raises(FakeError):
+        pool.call(fn)
+    assert len(calls) == 1
+
+
+# SDK가 같은 키로 몰래 다시 시도하지 않아야 키마다 429가 한 번씩 기록됩니다
+def test_call_openai_sends_one_request_per_key():
+    from core import resources
+
+    openai = FakeOpenAI(injector=Injector(error_rate=1.0)).start()
+    resources.use_secrets({"api": {"keys": ["sk-fake-0", "sk-fake-1"], "base_url": f"{openai.url}/v1"}})
+    try:
+        with pytest.raises(Exception) as raised:
+            resources.call_openai(lambda client: client.chat.completions.with_raw_response.create(
+                model="gpt-4o-mini", messages=[{"role": "user", "content": "안녕"}],
+            ))
+        assert getattr(raised.value, "status_code", None) == 429
+        assert openai.requests == 2
+        assert [entry["rate_limited"] for entry in resources.get_openai_pool().stats()] == [1, 1]
+    finally:
+        resources.use_secrets({})
+        openai.stop()
@@ -0,0 +1,49 @@
+from core.ledger import SubmissionLedger
+
+
+def test_key_depends_on_session_activity_and_content():
+    ledger = SubmissionLedger()
+    key = ledger.key("s1", "ACT", "vision", "프롬프트", "민수", b"\x89PNG")
+    assert key == ledger.key("s1", "ACT", "vision", "프롬프트", "민수", b"\x89PNG")
+    assert key != ledger.key("s2", "ACT", "vision", "프롬프트", "민수", b"\x89PNG")
+    assert key != ledger.key("s1", "OTHER", "vision", "프롬프트", "민수", b"\x89PNG")
+    # 경계를 옮겨도 같은 키가 되지 않습니다
+    assert ledger.key("s1", "ACT", "ab", "c") != ledger.key("s1", "ACT", "a", "bc")
+
+
+def test_recorded_result_is_reused_and_counted():
+    ledger = SubmissionLedger()
+    key = ledger.key("s1", "ACT", "text", "안녕")
+    assert ledger.result(key) is None
+    ledger.record(key, "답")
+    assert ledger.result(key) == "답"
+    assert ledger.stats() == {"entries": 1, "suppressed": {"analysis": 1, "delivery": 0}}
+
+
+def test_delivery_happens_once():
+    ledger = SubmissionLedger()
+    key = ledger.key("s1", "ACT", "text", "안녕")
+    assert ledger.should_deliver(key)
+    assert ledger.should_deliver(key)  # 보내기 전까지는 계속 True
+    ledger.mark_delivered(key)
+    assert not ledger.should_deliver(key)
+    assert ledger.stats()["suppressed"]["delivery"] == 1
+
+
+def test_forget_clears_result_and_delivery():
+    ledger = SubmissionLedger()
+    key = ledger.key("s1", "ACT", "image", "고양이")
+    ledger.record(key, "digest")
+    ledger.mark_delivered(key)
+    ledger.forget(key)
+    assert ledger.result(key) is None
+    assert ledger.should_deliver(key)
+
+
+def test_entries_expire():
+    ledger = SubmissionLedger(ttl=0)
+    key = ledger.key("s1", "ACT", "text", "안녕")
+    ledger.record(key, "답")
+    ledger.mark_delivered(key)
+    assert ledger.result(key) is None
+    assert ledger.should_deliver(key)
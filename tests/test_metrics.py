@@ -0,0 +1,55 @@
+import json
+import os
+
+from core.metrics import _tails, summarize_log
+
+
+def _write(path, *events, partial=""):
+    with open(path, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps({"type": "stage", "ok": True, **event}, ensure_ascii=False) + "\n")
+        f.write(partial)
+
+
+def test_summary_reads_only_new_lines(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    _write(path, {"ts": 100, "activity": "A", "stage": "model", "seconds": 1.0, "model": "gpt-4o-mini",
+                  "input_tokens": 1_000_000, "output_tokens": 0})
+    first = summarize_log(path, prices={"gpt-4o-mini": {"input": 0.15}})
+    assert first["A"]["stages"]["model"]["count"] == 1
+    assert first["A"]["cost"] == 0.15
+
+    # 쓰는 중인 마지막 줄은 완성될 때까지 건너뜁니다
+    _write(path, {"ts": 200, "activity": "A", "stage": "model", "seconds": 3.0}, partial='{"type": "stage", "ts"')
+    second = summarize_log(path)
+    assert second["A"]["stages"]["model"]["count"] == 2
+    offset = _tails[path].offset
+    assert offset < os.path.getsize(path)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(': 300, "activity": "B", "stage": "model", "seconds": 2.0}\n')
+    third = summarize_log(path)
+    assert set(third) == {"A", "B"}
+    assert _tails[path].offset == os.path.getsize(path)
+
+
+def test_since_filters_and_repeated_calls_reuse_summary(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    _write(path,
+           {"ts": 100, "activity": "A", "stage": "model", "seconds": 1.0, "ok": False},
+           {"ts": 200, "activity": "A", "stage": "model", "seconds": 2.0, "cached": True, "ttft": 0.5})
+    recent = summarize_log(path, since=150)
+    assert recent["A"]["errors"] == 0 and recent["A"]["cached"] == 1 and recent["A"]["ttft_avg"] == 0.5
+    recent["A"]["errors"] = 99  # 돌려받은 요약을 고쳐도 보관된 요약은 그대로입니다
+    assert summarize_log(path, since=150)["A"]["errors"] == 0
+    assert summarize_log(path)["A"]["errors"] == 1
+
+
+def test_rotated_log_is_read_from_the_start(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    _write(path, *[{"ts": i, "activity": "old", "stage": "model", "seconds": 1.0} for i in range(5)])
+    assert "old" in summarize_log(path)
+    os.replace(path, tmp_path / "metrics.jsonl.1")
+    _write(path, {"ts": 10, "activity": "new", "stage": "model", "seconds": 1.0})
+    assert set(summarize_log(path)) == {"new"}
+    assert summarize_log(tmp_path / "missing.jsonl") == {}
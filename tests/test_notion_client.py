@@ -0,0 +1,51 @@
+import pytest
+from fakes import FakeNotion, Injector
+
+from core.notion_client import NotionClient, NotionError
+
+
+@pytest.fixture
+def notion():
+    server = FakeNotion(["CODE1"]).start()
+    yield server
+    server.stop()
+
+
+def _client(notion, **kwargs):
+    return NotionClient("secret", base_url=notion.url + "/v1", rate=100, burst=100, **kwargs)
+
+
+def test_finds_activity_prompt_and_teacher(notion):
+    prompt, email = _client(notion).find_activity("db", "CODE1", "text")
+    assert prompt == "CODE1 text 활동 프롬프트입니다."
+    assert email == "teacher@example.com"
+    assert _client(notion).find_activity("db", "NOPE", "text") == (None, None)
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_configuration_errors_fail_at_once_and_are_not_retryable(notion, status):
+    notion.injector = Injector(error_rate=1.0, error_status=status)
+    client = _client(notion)
+    with pytest.raises(NotionError) as raised:
+        client.find_activity("db", "CODE1", "text")
+    assert raised.value.status_code == status
+    assert not raised.value.retryable
+    assert client.request_count == 1
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_exhausted_retries_are_retryable(notion, status, monkeypatch):
+    monkeypatch.setattr("core.notion_client.BACKOFF_BASE", 0.01)
+    notion.injector = Injector(error_rate=1.0, error_status=status)
+    client = _client(notion, max_retries=1)
+    with pytest.raises(NotionError) as raised:
+        client.find_activity("db", "CODE1", "text")
+    assert raised.value.retryable
+    assert client.request_count == 2
+
+
+def test_connection_failure_is_retryable():
+    client = NotionClient("secret", base_url="http://127.0.0.1:9/v1", max_retries=0)
+    with pytest.raises(NotionError) as raised:
+        client.find_activity("db", "CODE1", "text")
+    assert raised.value.status_code is None and raised.value.retryable
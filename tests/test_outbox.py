@@ -0,0 +1,99 @@
+import sqlite3
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from conftest import wait_until
+from core import outbox as outbox_module
+from core.outbox import EmailOutbox
+from fakes import FakeSMTP, Injector
+
+
+def _message(to="teacher@example.com"):
+    msg = EmailMessage()
+    msg["From"] = "tools@example.com"
+    msg["To"] = to
+    msg["Subject"] = "결과"
+    msg.set_content("내용")
+    return msg
+
+
+@pytest.fixture
+def smtp():
+    server = FakeSMTP().start()
+    yield server
+    server.stop()
+
+
+def _outbox(tmp_path, smtp, **kwargs):
+    return EmailOutbox("tools@example.com", "", path=tmp_path / "outbox.sqlite3", smtp_host="127.0.0.1",
+                       smtp_port=smtp.port, use_ssl=False, **kwargs)
+
+
+def test_sends_queued_mail_over_one_connection(tmp_path, smtp):
+    outbox = _outbox(tmp_path, smtp).start()
+    for _ in range(3):
+        outbox.enqueue(_message())
+    assert wait_until(lambda: outbox.stats()["sent"] == 3)
+    assert smtp.messages == 3
+    assert outbox.stats()["smtp_connections"] == 1
+
+
+def test_mail_queued_before_restart_is_sent(tmp_path, smtp):
+    _outbox(tmp_path, smtp).enqueue(_message())
+    restarted = _outbox(tmp_path, smtp).start()
+    assert wait_until(lambda: restarted.stats()["sent"] == 1)
+
+
+def test_temporary_failure_is_retried_with_backoff(tmp_path, smtp, monkeypatch):
+    monkeypatch.setattr(outbox_module, "BACKOFF_BASE", 0.05)
+    smtp.injector = Injector(error_rate=1.0)
+    outbox = _outbox(tmp_path, smtp).start()
+    message_id = outbox.enqueue(_message())
+
+    def attempt():
+        with sqlite3.connect(outbox.path) as db:
+            return db.execute("SELECT attempts, last_error FROM outbox WHERE id = ?", (message_id,)).fetchone()
+
+    assert wait_until(lambda: attempt()[0] >= 1)
+    assert attempt()[1]
+
+    smtp.injector = Injector()
+    assert wait_until(lambda: outbox.stats()["sent"] == 1)
+    assert outbox.stats()["smtp_connections"] >= 2  # 실패한 뒤에는 연결을 새로 만듭니다
+
+
+def test_gives_up_after_max_attempts(tmp_path, smtp, monkeypatch):
+    monkeypatch.setattr(outbox_module, "BACKOFF_BASE", 0.01)
+    smtp.injector = Injector(error_rate=1.0)
+    outbox = _outbox(tmp_path, smtp, max_attempts=2).start()
+    outbox.enqueue(_message())
+    assert wait_until(lambda: outbox.stats()["failed"] == 1)
+    assert smtp.errors == 2
+    assert outbox.stats()["pending"] == 0
+
+
+def test_two_workers_on_one_file_send_each_mail_once(tmp_path, smtp):
+    smtp.injector = Injector(latency=0.005)
+    first, second = _outbox(tmp_path, smtp), _outbox(tmp_path, smtp)
+    for _ in range(20):
+        first.enqueue(_message())
+    first.start()
+    second.start()
+    assert wait_until(lambda: first.stats()["sent"] == 20)
+    time.sleep(0.3)
+    assert smtp.messages == 20
+
+
+def test_mail_left_sending_by_a_dead_worker_is_requeued(tmp_path, smtp):
+    outbox = _outbox(tmp_path, smtp)
+    message_id = outbox.enqueue(_message())
+    fresh_id = outbox.enqueue(_message())
+    with sqlite3.connect(outbox.path) as db:
+        db.execute("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                   (time.time() - outbox_module.CLAIM_LEASE - 1, message_id))
+        db.execute("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?", (time.time(), fresh_id))
+    outbox.start()
+    assert wait_until(lambda: outbox.stats()["sent"] == 1)
+    assert outbox.stats()["sending"] == 1  # 아직 임대 시간이 남은 메일은 다른 작업자 몫으로 둡니다
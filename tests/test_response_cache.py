@@ -0,0 +1,54 @@
+import sqlite3
+
+from core.response_cache import ResponseCache, response_key
+
+
+def _sum(cache):
+    with sqlite3.connect(cache.path) as db:
+        return db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+def test_response_key_separates_parts():
+    assert response_key("m", "ab", b"c") == response_key("m", "ab", b"c")
+    assert response_key("m", "ab", b"c") != response_key("m", "a", b"bc")
+
+
+def test_get_and_set(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    assert cache.get("k") is None
+    cache.set("k", "분석 결과")
+    assert cache.get("k") == "분석 결과"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_tracked_total_matches_after_overwrites(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 20)
+    cache.set("a", "z" * 5)  # 덮어쓰면 크기 차이만큼만 바뀝니다
+    assert cache.stats()["bytes"] == _sum(cache) == 25
+    assert cache.stats()["entries"] == 2
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3", max_bytes=30)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    cache.set("c", "x" * 10)
+    assert cache.get("a")  # a를 최근에 썼으므로 b가 먼저 지워집니다
+    cache.set("d", "x" * 10)
+    assert cache.get("b") is None
+    assert all(cache.get(key) for key in ("a", "c", "d"))
+    assert cache.stats()["bytes"] == _sum(cache) == 30
+
+
+def test_existing_file_without_total_is_counted_on_open(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                   "created_at REAL NOT NULL, last_access REAL NOT NULL)")
+        db.execute("INSERT INTO responses VALUES ('old', 'abc', 3, 0, 0)")
+    cache = ResponseCache(path)
+    assert cache.stats()["bytes"] == 3
+    cache.set("new", "abcd")
+    assert cache.stats()["bytes"] == _sum(cache) == 7
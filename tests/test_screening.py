@@ -0,0 +1,65 @@
+import io
+
+import pytest
+from PIL import Image
+
+from core.screening import KeywordMatcher, Screener, image_header, normalize
+
+
+@pytest.mark.parametrize("text", [
+    "시발점에서 출발했어요",
+    "기차 시발역",
+    "병신년 역사",
+    "보존나무를 심었어요",
+    "Sex education 수업",
+    "물병 신발",
+    "class assignment",
+    "",
+])
+def test_ordinary_text_passes(text):
+    assert Screener().check_text("ACT", text) is None
+
+
+@pytest.mark.parametrize("text, term", [
+    ("시발", "시발"),
+    ("시 발", "시발"),
+    ("ㅅ.ㅂ", "ㅅㅂ"),
+    ("FUCK this", "fuck"),
+    ("존나 좋아", "존나"),
+    ("이 병신년아", "병신년아"),
+    ("시발 점수", "시발"),
+    ("sex", "sex"),
+])
+def test_blocked_text_is_rejected(text, term):
+    screener = Screener()
+    assert screener.check_text("ACT", text) == normalize(term)
+    assert screener.stats()["rejected"]["text"] == 1
+
+
+def test_allow_terms_only_cover_terms_inside_them():
+    matcher = KeywordMatcher(["나쁜말"])
+    allow = KeywordMatcher(["나쁜말꽃"])
+    assert matcher.find("나쁜말꽃이 피었다", allow) is None
+    assert matcher.find("나쁜말꽃 그리고 나쁜말", allow) == "나쁜말"
+    assert matcher.find("나 쁜 말", allow) == "나쁜말"
+
+
+def _image(size, format):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("format, kind", [("PNG", "png"), ("JPEG", "jpeg"), ("GIF", "gif"), ("BMP", "bmp"), ("WEBP", "webp")])
+def test_image_header_reads_size(format, kind):
+    assert image_header(_image((120, 45), format)) == (kind, 120, 45)
+
+
+def test_check_image_rejects_before_decoding():
+    screener = Screener(max_image_bytes=10_000, max_pixels=100_000)
+    assert screener.check_image("ACT", _image((200, 100), "PNG")) is None
+    assert "손상된" in screener.check_image("ACT", b"not an image")
+    assert "작습니다" in screener.check_image("ACT", _image((10, 100), "PNG"))
+    assert "해상도" in screener.check_image("ACT", _image((400, 400), "PNG"))
+    assert "큽니다" in screener.check_image("ACT", b"\x89PNG" + b"\0" * 20_000)
+    assert screener.stats()["rejected"]["image"] == 4
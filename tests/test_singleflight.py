@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from core.cache import activity_cache, cached_activity_lookup
+from core.singleflight import SingleFlight
+
+
+def _run_together(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "결과"
+
+    def worker():
+        results.append(flight.do("key", fn))
+
+    threading.Timer(0.2, release.set).start()
+    _run_together(8, worker)
+    assert calls == [1]
+    assert results == ["결과"] * 8
+    assert flight.stats() == {"executed": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight("test")
+    errors = []
+
+    def fn():
+        time.sleep(0.2)
+        raise RuntimeError("Notion 오류")
+
+    def worker():
+        try:
+            flight.do("key", fn)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    _run_together(4, worker)
+    assert errors == ["Notion 오류"] * 4
+    # 실패한 결과는 남기지 않으므로 다음 요청은 다시 실행합니다
+    assert flight.do("key", lambda: "다시") == "다시"
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["executed"] == 2
+
+
+@pytest.fixture
+def empty_activity_cache():
+    activity_cache.clear()
+    yield
+    activity_cache.clear()
+
+
+def test_activity_lookup_fetches_once_and_skips_unknown_codes(empty_activity_cache):
+    fetched = []
+
+    def fetch(name):
+        fetched.append(name)
+        time.sleep(0.1)
+        return ("프롬프트", "teacher@example.com") if name == "CODE1" else (None, None)
+
+    _run_together(5, lambda: cached_activity_lookup("CODE1", "text", fetch))
+    assert fetched == ["CODE1"]
+    assert cached_activity_lookup("CODE1", "text", fetch) == ("프롬프트", "teacher@example.com")
+    assert fetched == ["CODE1"]
+
+    assert cached_activity_lookup("NEW", "text", fetch) == (None, None)
+    assert cached_activity_lookup("NEW", "text", fetch) == (None, None)
+    assert fetched == ["CODE1", "NEW", "NEW"]
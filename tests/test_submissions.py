@@ -0,0 +1,66 @@
+import sqlite3
+import time
+
+import pytest
+from conftest import wait_until
+from fakes import FakeNotion, Injector
+
+from core import submissions as submissions_module
+from core.notion_client import NotionClient
+from core.submissions import SubmissionSink, build_properties
+
+
+@pytest.fixture
+def notion():
+    server = FakeNotion(["CODE1"]).start()
+    yield server
+    server.stop()
+
+
+def _sink(tmp_path, notion, **kwargs):
+    client = NotionClient("secret", base_url=notion.url + "/v1", rate=100, burst=100)
+    return SubmissionSink(client, "db-1", path=tmp_path / "submissions.sqlite3", rate=100, **kwargs)
+
+
+def _add(sink, name="민수"):
+    return sink.add(name, "CODE1", "text", "프롬프트", student_input="입력", ai_output="결과")
+
+
+def test_build_properties_skips_empty_fields_and_splits_long_text():
+    properties = build_properties({"student_name": "민수", "page_kind": "text", "ai_output": "가" * 4500, "image_ref": ""})
+    assert properties["학생 이름"] == {"title": [{"text": {"content": "민수"}}]}
+    assert properties["페이지"] == {"select": {"name": "text"}}
+    assert [len(part["text"]["content"]) for part in properties["AI 결과"]["rich_text"]] == [2000, 2000, 500]
+    assert "이미지" not in properties
+
+
+def test_full_batch_is_sent_right_away(tmp_path, notion):
+    sink = _sink(tmp_path, notion, batch_size=3, max_wait=60).start()
+    for i in range(3):
+        _add(sink, f"학생{i}")
+    assert wait_until(lambda: sink.stats()["sent"] == 3)
+    assert [page["parent"] for page in notion.pages] == [{"database_id": "db-1"}] * 3
+
+
+def test_two_workers_on_one_file_create_each_page_once(tmp_path, notion):
+    notion.injector = Injector(latency=0.005)
+    first = _sink(tmp_path, notion, batch_size=5, max_wait=0)
+    second = _sink(tmp_path, notion, batch_size=5, max_wait=0)
+    for i in range(20):
+        _add(first, f"학생{i}")
+    first.start()
+    second.start()
+    assert wait_until(lambda: first.stats()["sent"] == 20)
+    time.sleep(0.3)
+    assert len(notion.pages) == 20
+
+
+def test_submission_left_sending_by_a_dead_worker_is_requeued(tmp_path, notion):
+    sink = _sink(tmp_path, notion, batch_size=1, max_wait=0)
+    submission_id = _add(sink)
+    with sqlite3.connect(sink.path) as db:
+        db.execute("UPDATE submissions SET status = 'sending', claimed_at = ? WHERE id = ?",
+                   (time.time() - submissions_module.CLAIM_LEASE - 1, submission_id))
+    sink.start()
+    assert wait_until(lambda: sink.stats()["sent"] == 1)
+    assert len(notion.pages) == 1